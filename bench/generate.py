@@ -0,0 +1,103 @@
+"""
+Synthetic beer_data.json-shaped datasets for benchmarking.
+
+    python bench/generate.py --ratings 100000 --users 3 --output /tmp/beer_data.json
+
+Breweries, styles and beers are drawn from Zipf-like distributions, so a few
+of each are very popular and most are rare; --skew 0 makes them uniform.
+"""
+import argparse
+import bisect
+import itertools
+import json
+import random
+
+def _zipfWeights(count, skew):
+    return [1 / (rank ** skew) for rank in range(1, count + 1)]
+
+class _WeightedPicker:
+    def __init__(self, items, skew, rng):
+        self.items = items
+        self.cumulative = list(itertools.accumulate(_zipfWeights(len(items), skew)))
+        self.rng = rng
+
+    def pick(self):
+        target = self.rng.random() * self.cumulative[-1]
+        return self.items[bisect.bisect_left(self.cumulative, target)]
+
+def generateDataset(ratings = 1000, users = 1, breweries = 100, styles = 20, beers_per_brewery = 10, rerate_fraction = 0.1, skew = 1.1, seed = 0):
+    """
+    Build { user_name: { 'styles': [...], 'breweries': { brewery_name: [...beer objects] } } }
+    with `ratings` beer objects spread across `users` users
+    """
+    rng = random.Random(seed)
+
+    style_names = [f'Style {i}' for i in range(styles)]
+    brewery_names = [f'Brewery {i}' for i in range(breweries)]
+    brewery_picker = _WeightedPicker(brewery_names, skew, rng)
+    style_picker = _WeightedPicker(style_names, skew, rng)
+
+    # Each brewery's catalogue, with a fixed style and a "true" quality per beer
+    catalogues = {
+        brewery_name: [
+            (f'{brewery_name} Beer {j}', style_picker.pick(), rng.uniform(4, 9.5))
+            for j in range(beers_per_brewery)
+        ]
+        for brewery_name in brewery_names
+    }
+
+    data = {}
+    for user_index in range(users):
+        user_ratings = ratings // users + (1 if user_index < ratings % users else 0)
+        user_bias = rng.gauss(0, 0.5)
+
+        user_breweries = {}
+        rated = []
+        for _ in range(user_ratings):
+            if len(rated) > 0 and rng.random() < rerate_fraction:
+                brewery_name, beer_name, style_name, quality = rng.choice(rated)
+            else:
+                brewery_name = brewery_picker.pick()
+                beer_name, style_name, quality = rng.choice(catalogues[brewery_name])
+                rated.append((brewery_name, beer_name, style_name, quality))
+
+            rating = min(10, max(1, round(quality + user_bias + rng.gauss(0, 0.7), 1)))
+            user_breweries.setdefault(brewery_name, []).append({
+                'name': beer_name,
+                'brewery': brewery_name,
+                'style': style_name,
+                'rating': rating
+            })
+
+        data[f'User {user_index}'] = {'styles': list(style_names), 'breweries': user_breweries}
+
+    return data
+
+def main():
+    parser = argparse.ArgumentParser(description = __doc__, formatter_class = argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--ratings', type = int, default = 1000)
+    parser.add_argument('--users', type = int, default = 1)
+    parser.add_argument('--breweries', type = int, default = 100)
+    parser.add_argument('--styles', type = int, default = 20)
+    parser.add_argument('--beers-per-brewery', type = int, default = 10)
+    parser.add_argument('--rerate-fraction', type = float, default = 0.1)
+    parser.add_argument('--skew', type = float, default = 1.1)
+    parser.add_argument('--seed', type = int, default = 0)
+    parser.add_argument('--output', required = True)
+    args = parser.parse_args()
+
+    data = generateDataset(
+        ratings = args.ratings,
+        users = args.users,
+        breweries = args.breweries,
+        styles = args.styles,
+        beers_per_brewery = args.beers_per_brewery,
+        rerate_fraction = args.rerate_fraction,
+        skew = args.skew,
+        seed = args.seed
+    )
+    with open(args.output, 'w') as f:
+        json.dump(data, f)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,190 @@
+"""
+Benchmark harness for loading, saving, rating, re-rating and ranking.
+
+    python bench/run.py --sizes 100,1000,10000
+    python bench/run.py --sizes 100,1000,10000,100000,1000000 --save-baseline bench/baselines/main.json
+    python bench/run.py --compare bench/baselines/main.json
+
+Every phase runs against a synthetic dataset (see generate.py) in a scratch
+data directory, and reports wall time, peak traced memory and ops/sec. Peak
+memory comes from a second, tracemalloc-instrumented run so tracing doesn't
+skew the timings.
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+# Import cost is tracked by startup.py; keep it out of the first ranking phase
+import numpy
+
+from generate import generateDataset
+from src.user import User
+from src.ratings import BeerRater
+from src.journal import RERATE
+from src.utils import open_beer_data, open_user_data, saveFile, saveUserChanges
+from src.storage import JsonStorage
+from src.binary_snapshot import BinarySnapshot, writeBinarySnapshot
+from src.recommend import Recommender
+
+DEFAULT_SIZES = [100, 1000, 10000]
+
+# A phase is slower than its baseline when it takes this much longer
+REGRESSION_THRESHOLD = 1.2
+
+NEW_RATINGS = 100
+
+# Size of the leaderboard timed by the top_breweries phase
+TOP_K = 10
+
+def _measure(function, ops):
+    start = time.perf_counter()
+    function()
+    seconds = time.perf_counter() - start
+
+    tracemalloc.start()
+    function()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        'seconds': round(seconds, 6),
+        'peak_mb': round(peak / 2 ** 20, 3),
+        'ops_per_sec': round(ops / seconds, 1) if seconds > 0 else None
+    }
+
+def benchmarkSize(size, users, seed):
+    data = generateDataset(
+        ratings = size,
+        users = users,
+        breweries = max(20, size // 100),
+        seed = seed
+    )
+    user_name = next(iter(data))
+    user_ratings = sum(len(beers) for beers in data[user_name]['breweries'].values())
+    rng = random.Random(seed)
+
+    results = {}
+    with tempfile.TemporaryDirectory() as directory:
+        os.makedirs(os.path.join(directory, 'data'))
+        previous_directory = os.getcwd()
+        os.chdir(directory)
+
+        try:
+            results['save'] = _measure(lambda: saveFile(data), size)
+            results['load_all'] = _measure(open_beer_data, size)
+            results['stream_users'] = _measure(lambda: sum(1 for _ in JsonStorage().iterUsers()), size)
+            results['load_user'] = _measure(lambda: User(user_name, open_user_data(user_name)), user_ratings)
+            results['save_binary'] = _measure(lambda: writeBinarySnapshot(data.items()), size)
+            results['load_user_binary'] = _measure(lambda: BinarySnapshot().buildUser(user_name), user_ratings)
+
+            user = User(user_name, open_user_data(user_name))
+            brewery_names = list(user.breweries.keys())
+            style_names = list(user.styles.keys())
+
+            def rate():
+                for i in range(NEW_RATINGS):
+                    user._save_new_beer(f'New Beer {i}', rng.choice(brewery_names), rng.choice(style_names), round(rng.uniform(1, 10), 1))
+                saveUserChanges(user)
+
+            def rerate():
+                for _ in range(NEW_RATINGS):
+                    beer = rng.choice(user.breweries[rng.choice(brewery_names)].beers)
+                    user._save_new_beer(beer.name, beer.brewery_name, beer.style_name, round(rng.uniform(1, 10), 1), event_type = RERATE)
+                saveUserChanges(user)
+
+            results['rate'] = _measure(rate, NEW_RATINGS)
+            results['rerate'] = _measure(rerate, NEW_RATINGS)
+
+            results['rank_breweries'] = _measure(user.rankBreweries, len(user.beer_store))
+            results['top_breweries'] = _measure(lambda: user.topBreweries(TOP_K), len(user.beer_store))
+            with contextlib.redirect_stdout(io.StringIO()):
+                results['rank_styles'] = _measure(user.getStyleRatings, len(user.styles))
+
+            style_ratings = user.style_stats.getRatings(style_names[0])
+            all_user_ratings = [rating for style_name in style_names for rating in user.style_stats.getRatings(style_name)]
+            raw_ratings = [round(rng.uniform(1, 10), 1) for _ in range(1000)]
+            rater = BeerRater()
+            results['scale'] = _measure(
+                lambda: [rater.scale(rating, style_ratings, all_user_ratings = all_user_ratings) for rating in raw_ratings],
+                len(raw_ratings)
+            )
+            results['scale_batch'] = _measure(
+                lambda: rater.scale_batch(raw_ratings, style_ratings, all_user_ratings = all_user_ratings),
+                len(raw_ratings)
+            )
+
+            all_users = [User(name, data[name]) for name in data]
+
+            def buildRecommender():
+                recommender = Recommender()
+                for other in all_users:
+                    recommender.matrix.syncUser(other)
+                recommender.matrix.reindex()
+                return recommender
+
+            recommender = buildRecommender()
+            results['build_recommender'] = _measure(buildRecommender, size)
+            results['recommend'] = _measure(lambda: recommender.recommend(all_users[0], limit = TOP_K), len(all_users))
+
+        finally:
+            os.chdir(previous_directory)
+
+    return results
+
+def compareToBaseline(results, baseline):
+    regressions = []
+    for size in results:
+        for phase in results[size]:
+            if size not in baseline or phase not in baseline[size]:
+                continue
+
+            ratio = results[size][phase]['seconds'] / max(baseline[size][phase]['seconds'], 1e-9)
+            marker = '  REGRESSION' if ratio > REGRESSION_THRESHOLD else ''
+            print(f'{size:>8} {phase:<15} {ratio:>6.2f}x baseline{marker}')
+            if marker:
+                regressions.append((size, phase))
+
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description = __doc__, formatter_class = argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', default = ','.join(str(size) for size in DEFAULT_SIZES), help = 'comma separated rating counts')
+    parser.add_argument('--users', type = int, default = 1)
+    parser.add_argument('--seed', type = int, default = 0)
+    parser.add_argument('--output', help = 'write results as JSON to this path')
+    parser.add_argument('--save-baseline', help = 'write results as a baseline to this path')
+    parser.add_argument('--compare', help = 'compare against a saved baseline; exits non-zero on regressions')
+    args = parser.parse_args()
+
+    results = {}
+    for size in [int(size) for size in args.sizes.split(',')]:
+        results[str(size)] = benchmarkSize(size, args.users, args.seed)
+        for phase, result in results[str(size)].items():
+            print(f"{size:>8} {phase:<15} {result['seconds'] * 1000:>10.2f} ms {result['peak_mb']:>9.2f} MB {result['ops_per_sec'] or 0:>12.1f} ops/s")
+
+    for path in (args.output, args.save_baseline):
+        if path:
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok = True)
+            with open(path, 'w') as f:
+                json.dump(results, f, indent = 2)
+
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compareToBaseline(results, json.load(f))
+
+        if len(regressions) > 0:
+            sys.exit(1)
+
+if __name__ == '__main__':
+    main()
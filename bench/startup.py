@@ -0,0 +1,86 @@
+"""
+Startup-time benchmark: measures how long the app's modules take to import in
+a fresh interpreter, and which heavy dependencies get pulled in along the way.
+
+    python bench/startup.py [--runs 20] [--output bench/results/startup.json]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+HEAVY_MODULES = ['numpy', 'simple_term_menu']
+
+# Each scenario is what one kind of launch imports and does before any real work
+SCENARIOS = {
+    'import src.user': 'import src.user',
+    'import cli': 'import cli',
+    'load user': (
+        'from src.storage import getStorage\n'
+        'from src.user import User\n'
+        'storage = getStorage()\n'
+        'names = storage.getUserNames()\n'
+        'user = User(names[0], storage.loadUser(names[0])) if names else None\n'
+    ),
+    'load user and rank': (
+        'from src.storage import getStorage\n'
+        'from src.user import User\n'
+        'storage = getStorage()\n'
+        'names = storage.getUserNames()\n'
+        'user = User(names[0], storage.loadUser(names[0])) if names else None\n'
+        'user.rankBreweries() if user else None\n'
+    ),
+}
+
+PROBE = '''
+import json, sys, time
+start = time.perf_counter()
+exec(compile(sys.argv[1], 'scenario', 'exec'))
+elapsed = time.perf_counter() - start
+print(json.dumps({'seconds': elapsed, 'loaded': [m for m in sys.argv[2:] if m in sys.modules]}))
+'''
+
+def runScenario(code, runs):
+    timings = []
+    loaded = []
+    for _ in range(runs):
+        output = subprocess.run(
+            [sys.executable, '-c', PROBE, code] + HEAVY_MODULES,
+            cwd = REPO_ROOT,
+            capture_output = True,
+            text = True,
+            check = True
+        ).stdout
+        result = json.loads(output)
+        timings.append(result['seconds'])
+        loaded = result['loaded']
+
+    return {
+        'median_ms': round(statistics.median(timings) * 1000, 2),
+        'min_ms': round(min(timings) * 1000, 2),
+        'max_ms': round(max(timings) * 1000, 2),
+        'heavy_modules_loaded': loaded
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description = __doc__, formatter_class = argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--runs', type = int, default = 20)
+    parser.add_argument('--output', help = 'write results as JSON to this path')
+    args = parser.parse_args()
+
+    results = {}
+    for name in SCENARIOS:
+        results[name] = runScenario(SCENARIOS[name], args.runs)
+        print(f"{name:<22} median {results[name]['median_ms']:>8} ms   loads {', '.join(results[name]['heavy_modules_loaded']) or '-'}")
+
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok = True)
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent = 2)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,182 @@
+import argparse
+import csv
+import json
+import sys
+
+from src.storage import getStorage
+from src.journal import RERATE
+from src.batch import rankAllUsers
+from src.render import renderBreweryRankings, renderStyleRankings, renderRecommendations, printLines
+from src.recommend import Recommender, NEIGHBOURS
+from src.server import serve, DEFAULT_HOST, DEFAULT_PORT
+from src import profiling
+
+IMPORT_FIELDS = ['name', 'brewery', 'style', 'rating']
+
+def readRatingRows(path, file_format):
+    """Stream { name, brewery, style, rating[, rated_at] } rows from a CSV or JSONL file"""
+    with open(path, newline = '') as f:
+        if file_format == 'csv':
+            rows = csv.DictReader(f)
+        else:
+            rows = (json.loads(line) for line in f if line.strip() != '')
+
+        for line_number, row in enumerate(rows, start = 1):
+            missing = [field for field in IMPORT_FIELDS if row.get(field) in (None, '')]
+            if len(missing) > 0:
+                raise ValueError(f'{path}: row {line_number} is missing {", ".join(missing)}')
+
+            yield row
+
+def loadUser(storage, user_name):
+    return storage.openUser(user_name)
+
+def importRatings(args, storage):
+    user = loadUser(storage, args.user)
+    file_format = args.format or ('csv' if args.file.endswith('.csv') else 'jsonl')
+
+    count = 0
+    skipped = 0
+    unknown_styles = set()
+    for row in readRatingRows(args.file, file_format):
+        if args.add_styles:
+            user.addNewStyle(row['style'])
+        elif row['style'] not in user.styles:
+            unknown_styles.add(row['style'])
+            skipped += 1
+            continue
+
+        rated_at = float(row['rated_at']) if row.get('rated_at') not in (None, '') else None
+        user._save_new_beer(row['name'], row['brewery'], row['style'], float(row['rating']), rated_at = rated_at)
+        count += 1
+
+    # Everything is persisted in one commit once the whole file has been read
+    storage.saveUserChanges(user)
+    print(f'Imported {count} ratings for {args.user}')
+
+    if skipped > 0:
+        print(f'Skipped {skipped} ratings of styles {args.user} does not have (use --add-styles to add them): {", ".join(sorted(unknown_styles))}', file = sys.stderr)
+
+def rankBreweries(args, storage):
+    rankings = loadUser(storage, args.user).getBreweryRankings(offset = args.offset, limit = args.limit)
+    printLines(renderBreweryRankings(rankings))
+
+def rankStyles(args, storage):
+    rankings = loadUser(storage, args.user).getStyleRankings(
+        offset = args.offset,
+        limit = args.limit,
+        cardinality_threshold = args.cardinality_threshold
+    )
+    printLines(renderStyleRankings(rankings))
+
+def rankAll(args, storage):
+    results = rankAllUsers(
+        storage,
+        user_names = args.users,
+        workers = args.workers,
+        chunksize = args.chunksize,
+        cardinality_threshold = args.cardinality_threshold
+    )
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f)
+    else:
+        json.dump(results, sys.stdout, indent = 2)
+        print()
+
+def rerateBeer(args, storage):
+    user = loadUser(storage, args.user)
+
+    store = user.beer_store
+    beer_id = store.getBeerId(args.brewery, args.beer)
+    if beer_id is None or args.brewery not in user.breweries:
+        sys.exit(f'{args.user} has not rated {args.beer} from {args.brewery}')
+
+    user._save_new_beer(args.beer, args.brewery, store.getStyleName(store.getLatestRow(beer_id)), args.rating, event_type = RERATE)
+    storage.saveUserChanges(user)
+
+def recommendBeers(args, storage):
+    recommender = Recommender.fromStorage(storage, neighbours = args.neighbours)
+    user = loadUser(storage, args.user)
+    printLines(renderRecommendations(recommender.recommend(user, offset = args.offset, limit = args.limit)))
+
+def serveRankings(args, storage):
+    serve(storage, host = args.host, port = args.port)
+
+def buildParser():
+    parser = argparse.ArgumentParser(description = 'Headless beer ratings commands')
+    parser.add_argument('--storage', choices = ['json', 'sqlite', 'binary'], help = 'storage backend, defaults to $BEER_STORAGE or json')
+    parser.add_argument('--profile', metavar = 'REPORT', help = 'write a JSON timing report of the scoring pipeline here')
+    parser.add_argument('--profile-summary', action = 'store_true', help = 'print the timing report to stderr when done')
+    commands = parser.add_subparsers(dest = 'command', required = True)
+
+    import_parser = commands.add_parser('import', help = 'bulk import ratings from a CSV or JSONL file')
+    import_parser.add_argument('user')
+    import_parser.add_argument('file')
+    import_parser.add_argument('--format', choices = ['csv', 'jsonl'], help = 'defaults to the file extension')
+    import_parser.add_argument('--add-styles', action = 'store_true', help = 'add styles the user does not have yet to their style list')
+    import_parser.set_defaults(handler = importRatings)
+
+    rank_parser = commands.add_parser('rank', help = 'print rankings')
+    rank_commands = rank_parser.add_subparsers(dest = 'ranking', required = True)
+
+    breweries_parser = rank_commands.add_parser('breweries')
+    breweries_parser.add_argument('user')
+    breweries_parser.add_argument('--offset', type = int, default = 0)
+    breweries_parser.add_argument('--limit', type = int, help = 'defaults to every brewery')
+    breweries_parser.set_defaults(handler = rankBreweries)
+
+    styles_parser = rank_commands.add_parser('styles')
+    styles_parser.add_argument('user')
+    styles_parser.add_argument('--offset', type = int, default = 0)
+    styles_parser.add_argument('--limit', type = int, help = 'defaults to every style')
+    styles_parser.add_argument('--cardinality-threshold', type = int, default = 3)
+    styles_parser.set_defaults(handler = rankStyles)
+
+    all_parser = rank_commands.add_parser('all', help = 'recompute every user\'s rankings in parallel as JSON')
+    all_parser.add_argument('--users', nargs = '+', help = 'defaults to every user')
+    all_parser.add_argument('--workers', type = int, help = 'defaults to the number of CPUs')
+    all_parser.add_argument('--chunksize', type = int, default = 1)
+    all_parser.add_argument('--cardinality-threshold', type = int, default = 3)
+    all_parser.add_argument('--output', help = 'write JSON here instead of stdout')
+    all_parser.set_defaults(handler = rankAll)
+
+    rerate_parser = commands.add_parser('rerate', help = 'add a new rating for a beer already rated')
+    rerate_parser.add_argument('user')
+    rerate_parser.add_argument('brewery')
+    rerate_parser.add_argument('beer')
+    rerate_parser.add_argument('rating', type = float)
+    rerate_parser.set_defaults(handler = rerateBeer)
+
+    recommend_parser = commands.add_parser('recommend', help = 'suggest beers a user has not tried, from similar users\' ratings')
+    recommend_parser.add_argument('user')
+    recommend_parser.add_argument('--offset', type = int, default = 0)
+    recommend_parser.add_argument('--limit', type = int, default = 10)
+    recommend_parser.add_argument('--neighbours', type = int, default = NEIGHBOURS, help = 'most similar users to draw on')
+    recommend_parser.set_defaults(handler = recommendBeers)
+
+    serve_parser = commands.add_parser('serve', help = 'serve rankings as JSON over HTTP for dashboards')
+    serve_parser.add_argument('--host', default = DEFAULT_HOST)
+    serve_parser.add_argument('--port', type = int, default = DEFAULT_PORT)
+    serve_parser.set_defaults(handler = serveRankings)
+
+    return parser
+
+def main(argv = None):
+    args = buildParser().parse_args(argv)
+
+    profiler = profiling.enableFromEnvironment()
+    if profiler is None and (args.profile or args.profile_summary):
+        profiler = profiling.enable()
+
+    with profiling.phase(args.command):
+        args.handler(args, getStorage(args.storage))
+
+    if args.profile:
+        profiler.writeReport(args.profile)
+    if args.profile_summary:
+        print(profiler.getSummary(), file = sys.stderr)
+
+if __name__ == '__main__':
+    main()
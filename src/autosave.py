@@ -0,0 +1,133 @@
+import atexit
+import sys
+import threading
+import time
+
+# How long a burst of changes may keep arriving before they are written together
+SAVE_DELAY_SECONDS = 2.0
+
+# Longest wait between retries of a failing save; the wait doubles up to this
+MAX_RETRY_DELAY_SECONDS = 60.0
+
+class AutoSaver:
+    """
+    Persists a user's changes from a background thread, so saving never sits
+    between the user and the next prompt.
+
+    Every change marks the user dirty. The worker waits up to delay seconds
+    for more changes before it writes them all with one storage.saveEvents
+    call; the journal append and any compaction happen on the worker.
+    close() (also run at exit) stops the worker and flushes whatever is left.
+
+    A failed background save puts its events back on the user, marks it dirty
+    again and is retried after a wait that doubles with each failure. Until
+    a retry succeeds, the next flush() or close() re-raises the error, so a
+    failure that was never recovered from is not lost.
+    """
+    def __init__(self, storage, user, delay = SAVE_DELAY_SECONDS):
+        self.storage = storage
+        self.user = user
+        self.delay = delay
+
+        self.saves = 0
+        self.error = None
+
+        self._condition = threading.Condition()
+        self._dirty = False
+        self._closing = False
+
+        # Extra wait before the next save while saves keep failing
+        self._retry_delay = 0.0
+
+        # One save at a time, whether from the worker or an explicit flush
+        self._save_lock = threading.Lock()
+
+        user.change_listeners.append(self.markDirty)
+
+        self._thread = threading.Thread(target = self._run, name = f'autosave-{user.name}', daemon = True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def markDirty(self, user = None):
+        with self._condition:
+            self._dirty = True
+            self._condition.notify()
+
+    def flush(self):
+        """Write every pending change now, raising any earlier background failure"""
+        self._save()
+
+        if self.error is not None:
+            error = self.error
+            self.error = None
+            raise error
+
+    def close(self):
+        """Stop the worker and flush; safe to call more than once"""
+        with self._condition:
+            if self._closing:
+                return
+
+            self._closing = True
+            self._condition.notify()
+
+        self._thread.join()
+        atexit.unregister(self.close)
+        if self.markDirty in self.user.change_listeners:
+            self.user.change_listeners.remove(self.markDirty)
+
+        self.flush()
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while not self._dirty and not self._closing:
+                    self._condition.wait()
+
+                if self._closing:
+                    return
+
+                # Let the rest of a burst arrive so it lands in the same write
+                deadline = time.monotonic() + max(self.delay, self._retry_delay)
+                while not self._closing:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._condition.wait(remaining)
+
+                self._dirty = False
+
+            try:
+                self._save()
+
+                # Everything the failure put back is saved now
+                self._retry_delay = 0.0
+                self.error = None
+            except Exception as error:
+                self.error = error
+                self._retry_delay = min(max(2 * self._retry_delay, self.delay), MAX_RETRY_DELAY_SECONDS)
+                print(f'Auto-save failed, will retry in {self._retry_delay:g}s: {error}', file = sys.stderr)
+
+                # The events are back on the user; make sure they are picked up again
+                with self._condition:
+                    self._dirty = True
+
+    def _save(self):
+        with self._save_lock:
+            events = self.user.popPendingEvents()
+            if len(events) == 0:
+                return
+
+            try:
+                self.storage.saveEvents(self.user, events)
+            except BaseException:
+                self.user.restorePendingEvents(events)
+                raise
+
+            self.saves += 1
@@ -0,0 +1,91 @@
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+import itertools
+import os
+
+from src.user import User
+
+def rankUser(user_name, user_data, cardinality_threshold = 3):
+    """
+    Brewery and style rankings for one user as plain data, so they can be sent
+    back from a worker process
+
+    Returns {
+        'user': user_name,
+        'breweries': [{ 'name', 'score', 'beers' }...] best first,
+        'unrated_breweries': [{ 'name', 'beers' }...],
+        'styles': [{ 'name', 'rating', 'beers' }...] best first,
+        'low_cardinality_styles': [{ 'name', 'rating', 'beers' }...]
+    }
+    """
+    user = User(user_name, user_data)
+
+    rated_breweries, unrated_breweries = user.rankBreweries()
+    ranked_styles, low_cardinality_styles = user.rankStyles(cardinality_threshold = cardinality_threshold)
+
+    return {
+        'user': user_name,
+        'breweries': [
+            {'name': brewery.name, 'score': float(brewery.score), 'beers': len(brewery.beer_ids)}
+            for brewery in rated_breweries
+        ],
+        'unrated_breweries': [
+            {'name': brewery.name, 'beers': len(brewery.beer_ids)}
+            for brewery in unrated_breweries
+        ],
+        'styles': [
+            {'name': style_name, 'rating': float(rating), 'beers': count}
+            for style_name, rating, count in ranked_styles
+        ],
+        'low_cardinality_styles': [
+            {'name': style_name, 'rating': float(rating), 'beers': count}
+            for style_name, rating, count in low_cardinality_styles
+        ]
+    }
+
+# Chunks queued per worker beyond the one it is ranking, so no worker idles
+# while the next user is loaded, yet only a few users are loaded at a time
+CHUNKS_AHEAD_PER_WORKER = 2
+
+def _rankUserTask(task):
+    user_name, user_data, cardinality_threshold = task
+    return rankUser(user_name, user_data, cardinality_threshold = cardinality_threshold)
+
+def _rankUserChunk(tasks):
+    return [_rankUserTask(task) for task in tasks]
+
+def rankAllUsers(storage, user_names = None, workers = None, chunksize = 1, cardinality_threshold = 3):
+    """
+    Recompute every user's rankings across a process pool. Each task carries
+    only its own user's data, loaded from storage in this process as workers
+    free up, so only a bounded window of users is in memory at once.
+
+    - workers: pool size, defaults to the number of CPUs; 1 runs in-process
+    - chunksize: users handed to a worker at a time
+    """
+    if user_names is None:
+        user_names = storage.getUserNames()
+
+    tasks = ((user_name, storage.loadUser(user_name), cardinality_threshold) for user_name in user_names)
+
+    if workers == 1:
+        return [_rankUserTask(task) for task in tasks]
+
+    # executor.map would load every user up front; keep a bounded window of chunks in flight instead
+    workers = workers if workers is not None else os.cpu_count() or 1
+    max_in_flight = workers * (1 + CHUNKS_AHEAD_PER_WORKER)
+
+    results = []
+    with ProcessPoolExecutor(max_workers = workers) as executor:
+        in_flight = deque()
+        while True:
+            chunk = list(itertools.islice(tasks, chunksize))
+            if len(chunk) > 0:
+                in_flight.append(executor.submit(_rankUserChunk, chunk))
+
+            # Collect in submission order, so results keep the order of user_names
+            while len(in_flight) > 0 and (len(in_flight) >= max_in_flight or len(chunk) == 0):
+                results.extend(in_flight.popleft().result())
+
+            if len(chunk) == 0:
+                return results
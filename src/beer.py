@@ -1,15 +1,20 @@
-import numpy as np
-
 from src.ratings import BeerRater
+from src.store import BeerStore
 
 class Beer:
-    def __init__(self, data):
-        self.name = data['name']
-        self.style_name = data['style']
-        self.brewery_name = data['brewery']
-        
-        self.rating = data['rating']
-        self.scaled_rating = None
+    """Thin view over one row of a BeerStore"""
+    __slots__ = ('store', 'row')
+
+    def __init__(self, data, store = None):
+        self.store = store if store is not None else BeerStore()
+        self.row = self.store.append(data['name'], data['brewery'], data['style'], data['rating'], data.get('rated_at'))
+
+    @classmethod
+    def fromRow(cls, store, row):
+        beer = cls.__new__(cls)
+        beer.store = store
+        beer.row = row
+        return beer
     
     def __str__(self):
         return self.name
@@ -17,20 +22,69 @@ class Beer:
     def __repr__(self):
         return self.name
 
+    @property
+    def name(self):
+        return self.store.getName(self.row)
+
+    @property
+    def style_name(self):
+        return self.store.getStyleName(self.row)
+
+    @property
+    def brewery_name(self):
+        return self.store.getBreweryName(self.row)
+
+    @property
+    def rating(self):
+        return self.store.getRating(self.row)
+
+    @property
+    def rated_at(self):
+        return self.store.getRatedAt(self.row)
+
+    @property
+    def beer_id(self):
+        """Shared by every rating of the same (brewery, beer name)"""
+        return self.store.getRowBeerId(self.row)
+
+    @property
+    def rating_count(self):
+        return self.store.getRatingCount(self.beer_id)
+
+    @property
+    def average_rating(self):
+        """Mean of every rating of this beer, not just this row's"""
+        return self.store.getAverageRating(self.beer_id)
+
+    @property
+    def scaled_rating(self):
+        return self.store.getScaledRating(self.row)
+
+    @scaled_rating.setter
+    def scaled_rating(self, value):
+        self.store.setScaledRating(self.row, value)
+
     def toJsonObject(self):
-        return {
+        json_object = {
             'name': self.name,
             'brewery': self.brewery_name,
             'style': self.style_name,
             'rating': self.rating
         }
+
+        # Ratings from before timestamps were recorded keep their old shape
+        if self.rated_at is not None:
+            json_object['rated_at'] = self.rated_at
+
+        return json_object
     
-    def generateScaledScore(self, ratings_for_style, all_user_ratings = None):
+    def generateScaledScore(self, ratings_for_style, all_user_ratings = None, style_summary = None):
         rater = BeerRater()
         self.scaled_rating = rater.scale(
             self.rating, 
             ratings_for_style, 
-            all_user_ratings = all_user_ratings
+            all_user_ratings = all_user_ratings,
+            style_summary = style_summary
         )
         
         return self.scaled_rating
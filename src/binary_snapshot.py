@@ -0,0 +1,389 @@
+import json
+import math
+import os
+import sys
+from array import array
+
+from src.store import BeerStore
+from src.user import User
+from src.storage import Storage, journalUserVersions
+from src.journal import RatingsJournal, applyEvents, eventRecords
+from src.utils import fileSignature
+from src.stream import iterSnapshotEntries
+from src.user_index import dumpSnapshot
+from src.profiling import instrumented
+from src.lazy import lazyImport
+
+np = lazyImport('numpy')
+
+BINARY_PATH = 'data/beer_data.npy'
+
+FORMAT = 'beer-snapshot'
+VERSION = 2
+
+# Rating columns shared by every user, each user owning one contiguous slice
+COLUMNS = [('brewery_ids', '<i4'), ('style_ids', '<i4'), ('name_ids', '<i4'), ('ratings', '<f8'), ('rated_ats', '<f8')]
+
+# String tables stored per user, in id order
+STRING_TABLES = ['brewery_names', 'style_names', 'beer_names']
+
+# The only beer object layout that converts back byte for byte
+BEER_KEYS = ['name', 'brewery', 'style', 'rating', 'rated_at']
+
+# Beer fields kept in float columns, which may have been written as ints
+FLOAT_FIELDS = ['rating', 'rated_at']
+
+ALIGNMENT = 8
+
+class BinarySnapshot:
+    """
+    Every user's ratings in one .npy file of raw bytes, read with
+    np.load(mmap_mode = 'r'), so opening it maps the file instead of parsing it.
+
+    The bytes are a little-endian uint64 header length, a JSON header, then
+    8-byte aligned sections: the rating columns for all users back to back,
+    and each user's string tables as NUL separated UTF-8. Users are built
+    straight over the mapped columns; see writeBinarySnapshot for the header.
+    """
+    def __init__(self, path = BINARY_PATH):
+        self.path = path
+        self.buffer = np.load(path, mmap_mode = 'r')
+
+        header_length = int(self.buffer[:8].view('<u8')[0])
+        self.header = json.loads(self.buffer[8:8 + header_length].tobytes())
+        if self.header.get('format') != FORMAT or self.header.get('version') != VERSION:
+            raise ValueError(f'{path}: not a version {VERSION} {FORMAT} file')
+
+        self.data_start = _align(8 + header_length)
+        self.users = {user['name']: user for user in self.header['users']}
+
+    def getUserNames(self):
+        return list(self.users.keys())
+
+    @instrumented('BinarySnapshot.buildUser')
+    def buildUser(self, user_name, storage = None):
+        """The saved User over the mapped columns, or None if they have no entry"""
+        entry = self.users.get(user_name)
+        if entry is None:
+            return None
+
+        store = BeerStore.fromColumns(
+            *(self._strings(entry['strings'][table]) for table in STRING_TABLES),
+            *(self._column(column, dtype, entry['rows']) for column, dtype in COLUMNS)
+        )
+
+        # Breweries own their rows in order, so each one's beers are those first rated in its range
+        first_rows = np.flatnonzero(store.getPreviousRows() == -1)
+        first_beer_ids = store.getBeerIds()[first_rows]
+        counts = [count for _, count in entry['breweries']]
+        bounds = np.searchsorted(first_rows, np.cumsum([0] + counts)).tolist()
+
+        brewery_beer_ids = {
+            brewery_name: first_beer_ids[bounds[i]:bounds[i + 1]].tolist()
+            for i, (brewery_name, _) in enumerate(entry['breweries'])
+        }
+
+        return User.fromStore(user_name, self._userFields(entry), store, brewery_beer_ids, storage = storage)
+
+    def getUserData(self, user_name):
+        """One user's entry in the beer_data.json layout, exactly as it was written"""
+        entry = self.users.get(user_name)
+        if entry is None:
+            return None
+
+        brewery_names, style_names, beer_names = (self._strings(entry['strings'][table]) for table in STRING_TABLES)
+        brewery_ids, style_ids, name_ids, ratings, rated_ats = (
+            self._column(column, dtype, entry['rows']).tolist() for column, dtype in COLUMNS
+        )
+        int_rows = {field: set(rows) for field, rows in entry['int_rows'].items()}
+        null_rated_ats = set(entry['null_rated_ats'])
+
+        breweries = {}
+        row = 0
+        for brewery_name, count in entry['breweries']:
+            beers = []
+            for beer_row in range(row, row + count):
+                beer = {
+                    'name': beer_names[name_ids[beer_row]],
+                    'brewery': brewery_names[brewery_ids[beer_row]],
+                    'style': style_names[style_ids[beer_row]],
+                    'rating': int(ratings[beer_row]) if beer_row in int_rows['rating'] else ratings[beer_row]
+                }
+                if beer_row in null_rated_ats:
+                    beer['rated_at'] = None
+                elif not math.isnan(rated_ats[beer_row]):
+                    beer['rated_at'] = int(rated_ats[beer_row]) if beer_row in int_rows['rated_at'] else rated_ats[beer_row]
+                beers.append(beer)
+
+            breweries[brewery_name] = beers
+            row += count
+
+        fields = self._userFields(entry)
+        return {key: breweries if key == 'breweries' else fields[key] for key in entry['keys']}
+
+    def iterEntries(self):
+        """(user_name, user_data) for every user, in file order"""
+        for user_name in self.users:
+            yield user_name, self.getUserData(user_name)
+
+    def _userFields(self, entry):
+        fields = dict(entry['fields'])
+        if entry['styles'] is not None:
+            fields['styles'] = list(entry['styles'])
+
+        return fields
+
+    def _column(self, column, dtype, rows):
+        offset, count = self.header['columns'][column]
+        start = self.data_start + offset
+        values = self.buffer[start:start + count * np.dtype(dtype).itemsize].view(dtype)[rows[0]:rows[1]]
+
+        # Columns are stored little-endian; anything else has to be converted
+        return values if sys.byteorder == 'little' else values.astype(np.dtype(dtype).newbyteorder('='))
+
+    def _strings(self, section):
+        offset, length, count = section
+        if count == 0:
+            return []
+
+        start = self.data_start + offset
+        return self.buffer[start:start + length].tobytes().decode('utf-8').split('\0')
+
+
+@instrumented('writeBinarySnapshot')
+def writeBinarySnapshot(entries, path = BINARY_PATH):
+    """
+    Atomically write (user_name, user_data) entries in the beer_data.json layout
+    as a binary snapshot. Entries are consumed one at a time; only the rating
+    columns and string tables are held until the file is written.
+
+    Raises ValueError for anything that would not convert back exactly, such as
+    a beer object with fields beyond the ones Beer.toJsonObject writes.
+    """
+    columns = {column: array('i' if dtype == '<i4' else 'd') for column, dtype in COLUMNS}
+    string_blobs = []
+    blobs_length = 0
+    users = []
+
+    for user_name, user_data in entries:
+        start = len(columns['ratings'])
+        tables = {table: {} for table in STRING_TABLES}
+        breweries = []
+
+        # Rows (counted from start) whose value was an int rather than a float, per field
+        int_rows = {field: [] for field in FLOAT_FIELDS}
+
+        # Rows whose beer had rated_at written out as null rather than left out
+        null_rated_ats = []
+
+        for brewery_name, beers in user_data.get('breweries', {}).items():
+            breweries.append((brewery_name, len(beers)))
+
+            for beer in beers:
+                if list(beer) != BEER_KEYS[:len(beer)] or len(beer) < 4:
+                    raise ValueError(f'{user_name}: {brewery_name}: beer {beer!r} has fields a binary snapshot cannot hold')
+
+                row = len(columns['ratings']) - start
+                for field in FLOAT_FIELDS:
+                    if isinstance(beer.get(field), int):
+                        int_rows[field].append(row)
+
+                if 'rated_at' in beer and beer['rated_at'] is None:
+                    null_rated_ats.append(row)
+
+                columns['brewery_ids'].append(_intern(tables['brewery_names'], beer['brewery']))
+                columns['style_ids'].append(_intern(tables['style_names'], beer['style']))
+                columns['name_ids'].append(_intern(tables['beer_names'], beer['name']))
+                columns['ratings'].append(beer['rating'])
+                columns['rated_ats'].append(beer['rated_at'] if beer.get('rated_at') is not None else math.nan)
+
+        strings = {}
+        for table in STRING_TABLES:
+            names = list(tables[table])
+            if any('\0' in name for name in names):
+                raise ValueError(f'{user_name}: {table} contain a NUL character')
+
+            blob = '\0'.join(names).encode('utf-8')
+            strings[table] = [blobs_length, len(blob), len(names)]
+            string_blobs.append(blob + bytes(_align(len(blob)) - len(blob)))
+            blobs_length += _align(len(blob))
+
+        users.append({
+            'name': user_name,
+            'keys': list(user_data),
+            'styles': user_data.get('styles'),
+            'fields': {key: user_data[key] for key in user_data if key not in ('styles', 'breweries')},
+            'breweries': breweries,
+            'rows': [start, len(columns['ratings'])],
+            'int_rows': int_rows,
+            'null_rated_ats': null_rated_ats,
+            'strings': strings
+        })
+
+    # Columns first, then string tables, every section 8-byte aligned
+    header_columns = {}
+    offset = 0
+    for column, dtype in COLUMNS:
+        header_columns[column] = [offset, len(columns[column])]
+        offset += _align(len(columns[column]) * columns[column].itemsize)
+
+    for user in users:
+        for table in STRING_TABLES:
+            user['strings'][table][0] += offset
+
+    header = json.dumps({'format': FORMAT, 'version': VERSION, 'columns': header_columns, 'users': users}).encode('utf-8')
+    data_start = _align(8 + len(header))
+    size = data_start + offset + blobs_length
+
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        np.lib.format.write_array_header_1_0(f, {'descr': '|u1', 'fortran_order': False, 'shape': (size,)})
+        f.write(len(header).to_bytes(8, 'little'))
+        f.write(header + bytes(data_start - 8 - len(header)))
+
+        for column, dtype in COLUMNS:
+            values = columns[column]
+            if sys.byteorder != 'little':
+                values.byteswap()
+
+            length = len(values) * values.itemsize
+            f.write(values.tobytes() + bytes(_align(length) - length))
+
+        for blob in string_blobs:
+            f.write(blob)
+
+        f.flush()
+        os.fsync(f.fileno())
+
+    os.replace(tmp_path, path)
+
+def jsonToBinary(json_path, binary_path = BINARY_PATH):
+    """Convert a beer_data.json snapshot, streamed one user at a time, into a binary one"""
+    writeBinarySnapshot(iterSnapshotEntries(json_path), binary_path)
+
+def binaryToJson(binary_path, json_path):
+    """Convert a binary snapshot back into the exact beer_data.json it came from"""
+    tmp_path = json_path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        dumpSnapshot(BinarySnapshot(binary_path).iterEntries(), f)
+        f.flush()
+        os.fsync(f.fileno())
+
+    os.replace(tmp_path, json_path)
+
+@instrumented('compactBinarySnapshot')
+def compactBinarySnapshot(path = BINARY_PATH):
+    """Fold the ratings journal into a new binary snapshot, as compactSnapshot does for JSON"""
+    journal = RatingsJournal(journalPath(path))
+    with journal.compacting():
+        _compactBinarySnapshot(journal, path)
+
+def _compactBinarySnapshot(journal, path):
+    events_by_user = journal.rotate()
+
+    def entries():
+        if os.path.exists(path):
+            for user_name, user_data in BinarySnapshot(path).iterEntries():
+                yield user_name, applyEvents(user_data, events_by_user.pop(user_name, []))
+
+        # Users who have only ever been journaled
+        for user_name in events_by_user:
+            yield user_name, applyEvents({}, events_by_user[user_name])
+
+    writeBinarySnapshot(entries(), path)
+    journal.discardRotated()
+
+def journalPath(path = BINARY_PATH):
+    """
+    The journal of the binary snapshot at path. It is kept apart from the JSON
+    backend's, since compacting one backend folds and drops journaled events
+    that only its own snapshot then holds.
+    """
+    return path + '.journal'
+
+
+class BinaryStorage(Storage):
+    """A memory-mapped binary snapshot and its own ratings journal, compacted into a new binary snapshot"""
+    def __init__(self, path = BINARY_PATH):
+        self.path = path
+        self.journal_path = journalPath(path)
+        self._snapshot = None
+
+    def getSnapshot(self):
+        """The mapped snapshot, or None before one has been written"""
+        if self._snapshot is None and os.path.exists(self.path):
+            self._snapshot = BinarySnapshot(self.path)
+
+        return self._snapshot
+
+    def getUserNames(self):
+        snapshot = self.getSnapshot()
+        user_names = snapshot.getUserNames() if snapshot is not None else []
+        return user_names + [name for name in RatingsJournal(self.journal_path).getUserNames() if name not in user_names]
+
+    def loadUser(self, user_name, include_ratings = True):
+        snapshot = self.getSnapshot()
+        user_data = snapshot.getUserData(user_name) if snapshot is not None else None
+        return RatingsJournal(self.journal_path).replayUser(user_name, user_data if user_data is not None else {})
+
+    def openUser(self, user_name, include_ratings = True):
+        """The user built over the mapped snapshot; only journaled changes are loaded on top"""
+        snapshot = self.getSnapshot()
+        user = snapshot.buildUser(user_name, storage = self) if snapshot is not None else None
+        if user is None:
+            user = User(user_name, {}, storage = self)
+
+        events = RatingsJournal(self.journal_path).getEventsByUser().get(user_name, [])
+        if len(events) > 0:
+            user.loadRecords(eventRecords(events, user.raw_data.get('journal_seq', 0)))
+
+        return user
+
+    def saveEvents(self, user, events):
+        journal = RatingsJournal(self.journal_path)
+        journal.appendMany({user.name: user.raw_data}, user.name, events, folded_seq = lambda: self._snapshotJournalSeq(user.name))
+
+        if journal.shouldCompact():
+            compactBinarySnapshot(self.path)
+            self._snapshot = None
+
+    def getChangeToken(self):
+        return (fileSignature(self.path), fileSignature(self.journal_path))
+
+    def getUserVersions(self, user_names):
+        return journalUserVersions(self.path, RatingsJournal(self.journal_path), user_names)
+
+    def _snapshotJournalSeq(self, user_name):
+        # Read from the file as it is now, which another process may have rewritten since it was mapped
+        if not os.path.exists(self.path):
+            return 0
+
+        entry = BinarySnapshot(self.path).users.get(user_name)
+        return entry['fields'].get('journal_seq', 0) if entry is not None else 0
+
+
+def _intern(table, name):
+    if name not in table:
+        table[name] = len(table)
+
+    return table[name]
+
+def _align(length):
+    return (length + ALIGNMENT - 1) // ALIGNMENT * ALIGNMENT
+
+
+if __name__ == '__main__':
+    from src.utils import DATA_PATH, compactSnapshot
+
+    if len(sys.argv) != 2 or sys.argv[1] not in ('to-binary', 'to-json'):
+        sys.exit(f'usage: python -m src.binary_snapshot to-binary|to-json  (converts between {DATA_PATH} and {BINARY_PATH})')
+
+    # Each backend has its own journal, so fold the source's into its snapshot first
+    if sys.argv[1] == 'to-binary':
+        compactSnapshot()
+        jsonToBinary(DATA_PATH, BINARY_PATH)
+        print(f'Wrote {BINARY_PATH}')
+    else:
+        compactBinarySnapshot(BINARY_PATH)
+        binaryToJson(BINARY_PATH, DATA_PATH)
+        print(f'Wrote {DATA_PATH}')
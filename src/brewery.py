@@ -1,12 +1,22 @@
 from src.beer import Beer
-import numpy as np
+from src.store import BeerStore
+from src.profiling import instrumented
 
 class Brewery:
-    def __init__(self, name, beers_data = []):
+    @instrumented('Brewery.__init__')
+    def __init__(self, name, beers_data = [], store = None):
         self.name = name
-        self.beers = [Beer(beer_obj) for beer_obj in beers_data]
+
+        # Beer ids in the user's BeerStore, one per distinct beer in the order first rated
+        self.store = store if store is not None else BeerStore()
+        self.beer_ids = []
+        for beer_obj in beers_data:
+            self._addRow(self.store.append(beer_obj['name'], beer_obj['brewery'], beer_obj['style'], beer_obj['rating'], beer_obj.get('rated_at')))
 
         self.score = None
+
+        # (lower, upper) bounds on score, set by User.rankBreweries
+        self.confidence_interval = None
     
     def __str__(self):
         return self.name
@@ -17,43 +27,25 @@ class Brewery:
     def getRatingString(self):
         return f'{self.name}: {self.score}'
     
-    def addNewBeer(self, name, style_name, rating):
-        self.beers.append(Beer({
-            'name': name,
-            'style': style_name,
-            'brewery': self.name,
-            'rating': rating,
-        }))
-
-    def generateScore(self, ratings_lists_by_style, rating_threshold = 2):
-        """
-        ratings_lists_by_style - { style_name: [...float ratings for each of the beers tagged to that style] }
-        """
-
-        if len(self.beers) < rating_threshold:
-            self.score = None
-            return self.score
-
-        mean_style_ratings = {
-            style: np.mean(ratings_lists_by_style[style])
-            for style in ratings_lists_by_style
-            if len(ratings_lists_by_style[style]) > 0
-        }
-
-        style_lists = [ratings_lists_by_style[style] for style in ratings_lists_by_style]
-        all_user_ratings = [rating for lst in style_lists for rating in lst]
-
-        numerator = 0
-        denominator = 0
-        for beer in self.beers:
-            beer.generateScaledScore(ratings_lists_by_style[beer.style_name], all_user_ratings = all_user_ratings)
-
-            weighted_score_from_beer = beer.scaled_rating * mean_style_ratings[beer.style_name]
-            numerator += weighted_score_from_beer
-            denominator += mean_style_ratings[beer.style_name]
-        
-        self.score = round(numerator / denominator, 2)
-        return self.score
+    @property
+    def beers(self):
+        """One Beer per distinct beer, viewing its latest rating"""
+        return [Beer.fromRow(self.store, self.store.getLatestRow(beer_id)) for beer_id in self.beer_ids]
+
+    def getRows(self):
+        """Every rating row, re-ratings included, in the order they were added"""
+        return sorted(row for beer_id in self.beer_ids for row in self.store.getBeerRows(beer_id))
+
+    def addNewBeer(self, name, style_name, rating, rated_at = None):
+        """Add a rating; re-rating a beer updates its entry rather than adding another"""
+        row = self.store.append(name, self.name, style_name, rating, rated_at)
+        self._addRow(row)
+        return Beer.fromRow(self.store, row)
+
+    def _addRow(self, row):
+        beer_id = self.store.getRowBeerId(row)
+        if self.store.getRatingCount(beer_id) == 1:
+            self.beer_ids.append(beer_id)
 
     def toJsonObject(self):
-        return [beer.toJsonObject() for beer in self.beers]
\ No newline at end of file
+        return [Beer.fromRow(self.store, row).toJsonObject() for row in self.getRows()]
\ No newline at end of file
@@ -0,0 +1,264 @@
+from contextlib import contextmanager
+import json
+import os
+
+try:
+    import fcntl
+except ImportError:
+    # No advisory locks on Windows; a single process at a time is assumed there
+    fcntl = None
+
+from src.stream import BEER, STYLE, FIELD
+
+JOURNAL_PATH = 'data/beer_data.journal'
+
+# Fold the journal back into a fresh snapshot once it grows past this size
+COMPACTION_THRESHOLD_BYTES = 256 * 1024
+
+RATE = 'rate'
+RERATE = 'rerate'
+ADD_STYLE = 'add_style'
+
+class RatingsJournal:
+    """
+    Append-only log of rating and style events, replayed on top of the last
+    beer_data.json snapshot.
+
+    Every event carries a per-user sequence number, and each user's snapshot
+    entry records the last sequence folded into it ('journal_seq'). Replay
+    skips anything already in the snapshot, so a crash between writing a
+    snapshot and dropping the journal never applies an event twice.
+
+    Several processes may share the journal. Appends and rotation hold an
+    exclusive lock on a sidecar lock file, and sequence numbers are assigned
+    under it from what is on disk, so two writers never reuse one. Readers
+    take no lock and skip a final line still being written. Compaction never
+    rewrites the journal in place: under a second lock, held for the whole of
+    it (see compacting), it renames the journal aside, folds that file into a
+    snapshot and only then deletes it, so anything appended meanwhile lands
+    in a fresh journal.
+    """
+    def __init__(self, path = JOURNAL_PATH, compaction_threshold = COMPACTION_THRESHOLD_BYTES):
+        self.path = path
+        self.compaction_threshold = compaction_threshold
+
+        # The journal being compacted, the lock guarding writers and the one serializing compactions
+        self.rotated_path = path + '.old'
+        self.lock_path = path + '.lock'
+        self.compaction_lock_path = path + '.compact.lock'
+
+    def append(self, data, user_name, event, folded_seq = None):
+        """Durably record one event for user_name and stamp its sequence into data"""
+        self.appendMany(data, user_name, [event], folded_seq = folded_seq)
+
+    def appendMany(self, data, user_name, events, folded_seq = None):
+        """
+        Record a batch of events for user_name with a single write and fsync.
+
+        Sequences continue from the user's last journaled event, or when the
+        journal has none, from folded_seq(): the user's journal_seq in the
+        snapshot, read under the lock. Without folded_seq, the journal_seq in
+        data is trusted, which is only safe for a single writer.
+        """
+        if len(events) == 0:
+            return
+
+        user_data = data.setdefault(user_name, {})
+
+        with self._locked():
+            self._dropTornTail(self.path)
+
+            seq = self._lastSeq(user_name)
+            if seq is None:
+                seq = folded_seq() if folded_seq is not None else 0
+            seq = max(seq, user_data.get('journal_seq', 0))
+
+            lines = []
+            for event in events:
+                seq += 1
+                lines.append(json.dumps(dict(event, user = user_name, seq = seq)) + '\n')
+
+            with open(self.path, 'a') as f:
+                f.write(''.join(lines))
+                f.flush()
+                os.fsync(f.fileno())
+
+        user_data['journal_seq'] = seq
+
+    def replay(self, data):
+        """Apply every journaled event newer than the snapshot to data"""
+        events_by_user = self.getEventsByUser()
+        for user_name in events_by_user:
+            applyEvents(data.setdefault(user_name, {}), events_by_user[user_name])
+
+        return data
+
+    def replayUser(self, user_name, user_data):
+        """Apply only user_name's journaled events to their snapshot entry"""
+        return applyEvents(user_data, [record for record in self._readRecords() if record['user'] == user_name])
+
+    def getEventsByUser(self):
+        """{ user_name: [events...] } in journal order, users in first-seen order"""
+        events_by_user = {}
+        for record in self._readRecords():
+            events_by_user.setdefault(record['user'], []).append(record)
+
+        return events_by_user
+
+    def getUserNames(self):
+        """Users with journaled events, in first-seen order"""
+        return list(self.getEventsByUser().keys())
+
+    def shouldCompact(self):
+        return os.path.exists(self.path) and os.path.getsize(self.path) >= self.compaction_threshold
+
+    def rotate(self):
+        """
+        Move the journal aside for compaction and return its events by user,
+        as getEventsByUser. A journal left aside by an interrupted compaction
+        is folded in again, together with anything journaled since.
+        """
+        with self._locked():
+            if os.path.exists(self.path):
+                if os.path.exists(self.rotated_path):
+                    self._dropTornTail(self.rotated_path)
+                    with open(self.path, 'rb') as source, open(self.rotated_path, 'ab') as target:
+                        target.write(source.read())
+                        target.flush()
+                        os.fsync(target.fileno())
+                    os.remove(self.path)
+                else:
+                    os.replace(self.path, self.rotated_path)
+
+        events_by_user = {}
+        for record in self._readFile(self.rotated_path):
+            events_by_user.setdefault(record['user'], []).append(record)
+
+        return events_by_user
+
+    def discardRotated(self):
+        """Delete the rotated journal once a snapshot holding its events is written"""
+        with self._locked():
+            if os.path.exists(self.rotated_path):
+                os.remove(self.rotated_path)
+
+    def compacting(self):
+        """
+        Context manager held around rotate, writing the snapshot and
+        discardRotated, so one process compacts at a time. Appends only wait
+        for the short rotate and discard steps.
+        """
+        return self._locked(self.compaction_lock_path)
+
+    def _lastSeq(self, user_name):
+        """The user's last journaled sequence, or None if the journal has none of theirs"""
+        seqs = [record['seq'] for record in self._readRecords() if record['user'] == user_name]
+        return max(seqs) if len(seqs) > 0 else None
+
+    def _readRecords(self):
+        # The rotated journal holds the older events while a compaction runs
+        return self._readFile(self.rotated_path) + self._readFile(self.path)
+
+    def _readFile(self, path):
+        if not os.path.exists(path):
+            return []
+
+        with open(path, 'rb') as f:
+            contents = f.read()
+
+        records = []
+        offset = 0
+        while offset < len(contents):
+            end = contents.find(b'\n', offset)
+            if end == -1:
+                # A record still being appended, or torn by a crash; the next
+                # append drops it under the lock
+                break
+
+            line = contents[offset:end]
+            if line.strip() != b'':
+                records.append(json.loads(line))
+            offset = end + 1
+
+        return records
+
+    def _dropTornTail(self, path):
+        """Cut a partial last line left by a crashed writer; only call holding the lock"""
+        if not os.path.exists(path):
+            return
+
+        with open(path, 'r+b') as f:
+            contents = f.read()
+            if contents == b'' or contents.endswith(b'\n'):
+                return
+
+            f.truncate(contents.rfind(b'\n') + 1)
+            os.fsync(f.fileno())
+
+    @contextmanager
+    def _locked(self, lock_path = None):
+        with open(lock_path if lock_path is not None else self.lock_path, 'a') as lock_file:
+            if fcntl is not None:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+
+
+def applyEvents(user_data, events):
+    """Apply one user's journal events that are newer than their snapshot entry"""
+    for event in events:
+        if event['seq'] <= user_data.get('journal_seq', 0):
+            continue
+
+        applyEvent(user_data, event)
+        user_data['journal_seq'] = event['seq']
+
+    return user_data
+
+def eventRecords(events, journal_seq = 0):
+    """
+    The stream.iterSnapshotUsers records for one user's journal events newer
+    than journal_seq, so they can be loaded the same way as the snapshot
+    """
+    for event in events:
+        if event['seq'] <= journal_seq:
+            continue
+
+        if event['type'] == ADD_STYLE:
+            yield (STYLE, event['style'])
+        elif event['type'] in (RATE, RERATE):
+            beer = {key: event[key] for key in ('name', 'brewery', 'style', 'rating')}
+            if event.get('rated_at') is not None:
+                beer['rated_at'] = event['rated_at']
+            yield (BEER, beer)
+        else:
+            raise ValueError(f"Unknown journal event type: {event['type']}")
+
+        yield (FIELD, 'journal_seq', event['seq'])
+
+def applyEvent(user_data, event):
+    """Apply a single journal event to one user's beer_data.json entry"""
+    if event['type'] == ADD_STYLE:
+        styles = user_data.setdefault('styles', [])
+        if event['style'] not in styles:
+            styles.append(event['style'])
+
+    elif event['type'] in (RATE, RERATE):
+        beer = {
+            'name': event['name'],
+            'brewery': event['brewery'],
+            'style': event['style'],
+            'rating': event['rating']
+        }
+        if event.get('rated_at') is not None:
+            beer['rated_at'] = event['rated_at']
+
+        breweries = user_data.setdefault('breweries', {})
+        breweries.setdefault(event['brewery'], []).append(beer)
+
+    else:
+        raise ValueError(f"Unknown journal event type: {event['type']}")
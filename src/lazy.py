@@ -0,0 +1,17 @@
+import importlib
+
+class LazyModule:
+    """Stand-in for a module that is only imported the first time one of its attributes is used"""
+    def __init__(self, name):
+        self._name = name
+        self._module = None
+
+    def __getattr__(self, attribute):
+        if self._module is None:
+            self._module = importlib.import_module(self._name)
+
+        return getattr(self._module, attribute)
+
+
+def lazyImport(name):
+    return LazyModule(name)
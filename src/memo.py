@@ -0,0 +1,78 @@
+from collections import OrderedDict
+
+from src.ratings import BeerRater, BatchRatingsMetadata
+from src.profiling import instrumented
+from src.lazy import lazyImport
+
+np = lazyImport('numpy')
+
+class ScaledScoreCache:
+    """
+    Bounded LRU cache of scaled scores and their RatingsMetadata.
+
+    Entries are keyed on (style, raw rating, style stats version, global mean,
+    rater settings), so they go stale only when a rating in that style
+    changes, the user's global mean moves or the rater is reconfigured. Beers
+    of a style that share a raw rating share an entry.
+    """
+    def __init__(self, maxsize = 10000):
+        self.maxsize = maxsize
+        self.entries = OrderedDict()
+
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    @instrumented('ScaledScoreCache.scale')
+    def scale(self, raw_ratings, style_stats, style_ratings, all_user_ratings = None, global_mean = None, rater = None):
+        """
+        Scale every rating of one style, computing only the distinct raw
+        ratings that aren't cached with a single scale_batch call
+
+        Returns (scaled_ratings, BatchRatingsMetadata)
+        """
+        unique_ratings, inverse = np.unique(np.asarray(raw_ratings, dtype = float), return_inverse = True)
+
+        rater = rater if rater is not None else BeerRater()
+        settings = rater.getSettingsKey()
+        keys = [(style_stats.name, rating, style_stats.version, global_mean, settings) for rating in unique_ratings.tolist()]
+        results = [self._get(key) for key in keys]
+
+        missing = [i for i in range(len(keys)) if results[i] is None]
+        self.hits += len(keys) - len(missing)
+        self.misses += len(missing)
+
+        if len(missing) > 0:
+            scaled_ratings, metadata = rater.scale_batch(
+                unique_ratings[missing],
+                style_ratings,
+                all_user_ratings = all_user_ratings,
+                style_summary = style_stats.getSummary(),
+                global_mean = global_mean,
+                sorted_style_ratings = style_stats.getSortedArray()
+            )
+            for position, i in enumerate(missing):
+                results[i] = (scaled_ratings[position], metadata.getRow(position))
+                self._put(keys[i], results[i])
+
+        unique_scaled = np.array([result[0] for result in results], dtype = float)
+        unique_metadata = BatchRatingsMetadata.fromRows(unique_ratings, [result[1] for result in results])
+        return unique_scaled[inverse], unique_metadata.take(inverse)
+
+    def clear(self):
+        self.entries.clear()
+
+    def _get(self, key):
+        if key not in self.entries:
+            return None
+
+        self.entries.move_to_end(key)
+        return self.entries[key]
+
+    def _put(self, key, value):
+        self.entries[key] = value
+        self.entries.move_to_end(key)
+        if len(self.entries) > self.maxsize:
+            self.entries.popitem(last = False)
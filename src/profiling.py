@@ -0,0 +1,165 @@
+import atexit
+from contextlib import contextmanager
+import functools
+import json
+import os
+import sys
+import threading
+import time
+
+PROFILE_ENV = 'BEER_PROFILE'
+
+# The active Profiler; None keeps every instrumented call a plain pass-through
+_profiler = None
+
+def instrumented(name):
+    """
+    Record calls, cumulative time and allocated memory blocks under name while
+    a Profiler is enabled. Disabled, the wrapper costs one global lookup.
+    """
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if _profiler is None:
+                return function(*args, **kwargs)
+
+            return _profiler.call(name, function, args, kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+class Profiler:
+    """
+    Call counts, inclusive time and net allocated memory blocks per
+    instrumented function, plus the same for named phases.
+
+    Blocks come from sys.getallocatedblocks, so they are a net count of live
+    allocations, not every malloc. trace_memory also records each phase's peak
+    traced memory via tracemalloc, which slows everything down noticeably.
+    """
+    def __init__(self, trace_memory = False):
+        self.trace_memory = trace_memory
+        self.functions = {}
+        self.phases = {}
+        self._lock = threading.Lock()
+
+    def call(self, name, function, args, kwargs):
+        blocks = sys.getallocatedblocks()
+        start = time.perf_counter()
+        try:
+            return function(*args, **kwargs)
+        finally:
+            self._record(self.functions, name, time.perf_counter() - start, sys.getallocatedblocks() - blocks)
+
+    @contextmanager
+    def phase(self, name):
+        if self.trace_memory:
+            # Imported here since it pulls in modules plain runs never need
+            import tracemalloc
+
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+            tracemalloc.reset_peak()
+
+        blocks = sys.getallocatedblocks()
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            stats = self._record(self.phases, name, time.perf_counter() - start, sys.getallocatedblocks() - blocks)
+            if self.trace_memory:
+                with self._lock:
+                    stats['peak_bytes'] = max(stats.get('peak_bytes', 0), tracemalloc.get_traced_memory()[1])
+
+    def getReport(self):
+        with self._lock:
+            return {
+                'functions': {name: dict(stats) for name, stats in self.functions.items()},
+                'phases': {name: dict(stats) for name, stats in self.phases.items()}
+            }
+
+    def writeReport(self, path):
+        with open(path, 'w') as f:
+            json.dump(self.getReport(), f, indent = 2)
+
+    def getSummary(self):
+        """Human readable lines, slowest first"""
+        report = self.getReport()
+
+        lines = []
+        for section in ('phases', 'functions'):
+            if len(report[section]) == 0:
+                continue
+
+            lines.append(f'{section}:')
+            for name, stats in sorted(report[section].items(), key=lambda item: item[1]['seconds'], reverse = True):
+                lines.append(
+                    f"  {name:<40} {stats['calls']:>8} calls {stats['seconds'] * 1000:>10.2f} ms {stats['allocated_blocks']:>10} blocks"
+                )
+
+        return '\n'.join(lines)
+
+    def _record(self, table, name, seconds, allocated_blocks):
+        with self._lock:
+            stats = table.get(name)
+            if stats is None:
+                stats = {'calls': 0, 'seconds': 0.0, 'allocated_blocks': 0}
+                table[name] = stats
+
+            stats['calls'] += 1
+            stats['seconds'] += seconds
+            stats['allocated_blocks'] += allocated_blocks
+            return stats
+
+
+def enable(profiler = None):
+    """Start recording into profiler (a new one by default) and return it"""
+    global _profiler
+    _profiler = profiler if profiler is not None else Profiler()
+    return _profiler
+
+def disable():
+    """Stop recording and return the profiler that was active, if any"""
+    global _profiler
+    profiler = _profiler
+    _profiler = None
+    return profiler
+
+def getProfiler():
+    return _profiler
+
+@contextmanager
+def phase(name):
+    """Time a named stretch of work; a no-op while profiling is disabled"""
+    if _profiler is None:
+        yield
+        return
+
+    with _profiler.phase(name):
+        yield
+
+@contextmanager
+def profile(report_path = None, trace_memory = False):
+    """Profile the enclosed block, writing a JSON report to report_path if given"""
+    profiler = enable(Profiler(trace_memory = trace_memory))
+    try:
+        yield profiler
+    finally:
+        disable()
+        if report_path is not None:
+            profiler.writeReport(report_path)
+
+def enableFromEnvironment():
+    """
+    Profile the whole process when $BEER_PROFILE names a report path, writing
+    the JSON report on exit. Returns the profiler, or None when not requested.
+    """
+    report_path = os.environ.get(PROFILE_ENV)
+    if not report_path:
+        return None
+
+    profiler = enable()
+    atexit.register(profiler.writeReport, report_path)
+    return profiler
@@ -1,4 +1,10 @@
-import numpy as np
+from src.profiling import instrumented
+from src.lazy import lazyImport
+from src.stats import sortedMedian, sortedMad
+
+np = lazyImport('numpy')
+
+SECONDS_PER_DAY = 24 * 60 * 60
 
 class RatingsMetadata:
     """Container for metadata from rating calculations"""
@@ -11,6 +17,84 @@ class RatingsMetadata:
         self.interpretation = None
 
 
+class BatchRatingsMetadata:
+    """Columnar metadata from a batch of rating calculations, one row per beer"""
+    def __init__(self, raw_ratings):
+        raw_ratings = np.asarray(raw_ratings, dtype = float)
+        size = len(raw_ratings)
+
+        # Rows that fail validation keep the defaults from _getDefaultResult
+        self.z_score = np.zeros(size)
+        self.percentile = np.zeros(size)
+        self.confidence_lower = raw_ratings.copy()
+        self.confidence_upper = raw_ratings.copy()
+        self.confidence_width = np.zeros(size)
+        self.extreme_modifier = np.full(size, np.nan)
+        self.outlier_dampening = np.full(size, np.nan)
+
+        # Shared by every row since they only depend on the style
+        self.variance_influence = None
+        self.smoothing_constant = None
+        self.global_context = None
+
+    def __len__(self):
+        return len(self.z_score)
+
+    @classmethod
+    def fromRows(cls, raw_ratings, rows):
+        """Rebuild columns from per-row RatingsMetadata, e.g. rows that were cached"""
+        metadata = cls(raw_ratings)
+        for i, row in enumerate(rows):
+            metadata.z_score[i] = row.z_score
+            metadata.percentile[i] = row.percentile
+            metadata.confidence_lower[i] = row.confidence_interval['lower']
+            metadata.confidence_upper[i] = row.confidence_interval['upper']
+            metadata.confidence_width[i] = row.confidence_interval['width']
+
+            if len(row.components) > 0:
+                metadata.extreme_modifier[i] = row.components['extreme_modifier']
+                metadata.outlier_dampening[i] = row.components['outlier_dampening']
+                metadata.variance_influence = row.components['variance_influence']
+                metadata.smoothing_constant = row.components['smoothing_constant']
+
+            metadata.global_context = row.global_context
+
+        return metadata
+
+    def take(self, indices):
+        """New metadata holding the given rows, in order"""
+        metadata = BatchRatingsMetadata(self.confidence_lower[indices])
+        for column in ('z_score', 'percentile', 'confidence_upper', 'confidence_width', 'extreme_modifier', 'outlier_dampening'):
+            setattr(metadata, column, getattr(self, column)[indices])
+
+        metadata.variance_influence = self.variance_influence
+        metadata.smoothing_constant = self.smoothing_constant
+        metadata.global_context = self.global_context
+        return metadata
+
+    def getRow(self, i):
+        """Build the scalar RatingsMetadata for a single row"""
+        metadata = RatingsMetadata()
+        metadata.z_score = self.z_score[i]
+        metadata.percentile = self.percentile[i]
+        metadata.confidence_interval = {
+            'lower': self.confidence_lower[i],
+            'upper': self.confidence_upper[i],
+            'width': self.confidence_width[i]
+        }
+        metadata.global_context = self.global_context
+
+        if not np.isnan(self.extreme_modifier[i]):
+            metadata.components = {
+                'variance_influence': self.variance_influence,
+                'extreme_modifier': self.extreme_modifier[i],
+                'outlier_dampening': self.outlier_dampening[i],
+                'smoothing_constant': self.smoothing_constant
+            }
+
+        return metadata
+
+
 class BeerRater:
     def __init__(self):
         
@@ -21,6 +105,7 @@ class BeerRater:
         self.min_sample_size = 5
         self.outlier_threshold = 3
 
+        # Days for an older rating of a re-rated beer to count half as much
         self.recency_half_life = 30
         self.enable_recency_weighting = False
 
@@ -31,71 +116,195 @@ class BeerRater:
 
         self.metadata = RatingsMetadata()
 
-    def scale(self, raw_rating, style_ratings, all_user_ratings = None):
+    def getRecencyHalfLife(self):
+        """recency_half_life in seconds, or None when recency weighting is off"""
+        if not self.enable_recency_weighting:
+            return None
+
+        return self.recency_half_life * SECONDS_PER_DAY
+
+    def getSettingsKey(self):
+        """Hashable snapshot of every scaling setting, for caches of scaled scores"""
+        return tuple(sorted((name, value) for name, value in vars(self).items() if name != 'metadata'))
+
+    @instrumented('BeerRater.scale')
+    def scale(self, raw_rating, style_ratings, all_user_ratings = None, style_summary = None):
         """
         Main scaling function
 
         - raw_rating
         - style_ratings: array of raw ratings for the beer's style
         - all_user_ratings: all user beer ratings, defaults to None
+        - style_summary: cached StyleStats summary for style_ratings, defaults to None
         """
 
         if not self._validateInputs(raw_rating, style_ratings):
             return self._getDefaultResult(raw_rating)
-        
-        N = len(style_ratings)
-        
-        rating_stats = self._calculateStats(style_ratings)
 
-        global_context = None
-        if all_user_ratings is not None:
-            global_context = self._calculateGlobalContext(all_user_ratings, rating_stats['mean'])
-        
-        # Bayesian shrinkage for small samples
-        adjusted_stats = (
-            self._applyShrinkage(rating_stats, global_context, N)
-            if self.use_bayesian_shrinkage and global_context is not None
-            else rating_stats
-        )
+        N = len(style_ratings)
+        style = self._prepareStyle(style_ratings, all_user_ratings, style_summary = style_summary)
+        adjusted_stats = style['adjusted_stats']
 
         # Get z score
         z_score = (raw_rating - adjusted_stats['mean']) / adjusted_stats['std'] if adjusted_stats['std'] > 0 else 0
 
-        confidence = self._calculateConfidence(adjusted_stats, N)
-        
-        variance_influence = self._calculateVarianceInfluence(adjusted_stats['variance'])
-
         # Extreme rating modifier (compress adjustments near boundaries)
         extreme_rating_modifier = self._calculateExtremeModifier(raw_rating)
 
         # Outlier dampening (diminishing returns for extreme z-scores)
         outlier_dampening = self._calculateOutlierDampening(z_score)
 
-        smoothing_constant = self._calculateAdaptiveSmoothing(N) if self.use_adaptive_smoothing else 2.0
-
         # Base adjustment using tanh for smooth bounded scaling
         max_adjustment = raw_rating * self.bounding_factor
-        base_adjustment = np.tanh(z_score / smoothing_constant) * max_adjustment
+        base_adjustment = np.tanh(z_score / style['smoothing_constant']) * max_adjustment
 
         # Composite final adjustment
-        final_adjustment = base_adjustment * self.adjustment_strength * variance_influence * confidence * extreme_rating_modifier * outlier_dampening
+        final_adjustment = base_adjustment * self.adjustment_strength * style['variance_influence'] * style['confidence'] * extreme_rating_modifier * outlier_dampening
 
         scaled_rating = self._clamp(raw_rating + final_adjustment, 1, 10)
 
         # Store metadata
+        self.metadata = RatingsMetadata()
         self.metadata.z_score = round(z_score, 2)
         self.metadata.confidence_interval = self._calculateConfidenceInterval(scaled_rating, adjusted_stats, N)
         self.metadata.percentile = self._calculatePercentile(raw_rating, style_ratings)
         self.metadata.components = {
-            'variance_influence': round(variance_influence, 3),
+            'variance_influence': round(style['variance_influence'], 3),
             'extreme_modifier': round(extreme_rating_modifier, 3),
             'outlier_dampening': round(outlier_dampening, 3),
-            'smoothing_constant': round(smoothing_constant, 2)
+            'smoothing_constant': round(style['smoothing_constant'], 2)
         }
-        self.metadata.global_context = global_context
+        self.metadata.global_context = style['global_context']
 
         return round(scaled_rating, 2)
+
+    @instrumented('BeerRater.scale_batch')
+    def scale_batch(self, raw_ratings, style_ratings, all_user_ratings = None, style_summary = None, global_mean = None, sorted_style_ratings = None):
+        """
+        Vectorized scaling for many beers of the same style
+
+        - raw_ratings: array of raw ratings, all tagged to the same style
+        - style_ratings: array of raw ratings for the style
+        - all_user_ratings: all user beer ratings, defaults to None
+        - style_summary: cached StyleStats summary for style_ratings, defaults to None
+        - global_mean: precomputed mean of all_user_ratings, defaults to None
+        - sorted_style_ratings: style_ratings already sorted, defaults to None
+
+        Returns (scaled_ratings, BatchRatingsMetadata). Invalid raw ratings
+        are passed through unchanged, as in scale.
+        """
+
+        raw_array = np.asarray(raw_ratings, dtype = float)
+        metadata = BatchRatingsMetadata(raw_array)
+
+        if len(style_ratings) == 0:
+            print('Invalid category ratings:', style_ratings)
+            return raw_array.copy(), metadata
+
+        valid = (raw_array >= 1) & (raw_array <= 10)
+        if not np.all(valid):
+            print('Invalid raw ratings:', raw_array[~valid])
+
+        N = len(style_ratings)
+
+        # Median, MAD and percentiles all read from one sorted copy of the style
+        if sorted_style_ratings is not None:
+            sorted_ratings = np.asarray(sorted_style_ratings, dtype = float)
+        else:
+            sorted_ratings = np.sort(np.asarray(style_ratings, dtype = float))
+
+        # Everything up to the per-beer pipeline depends only on the style
+        style = self._prepareStyle(
+            style_ratings,
+            all_user_ratings,
+            style_summary = style_summary,
+            global_mean = global_mean,
+            sorted_ratings = sorted_ratings
+        )
+        adjusted_stats = style['adjusted_stats']
+        global_context = style['global_context']
+        confidence = style['confidence']
+        variance_influence = style['variance_influence']
+        smoothing_constant = style['smoothing_constant']
+
+        ratings = raw_array[valid]
+
+        # Get z scores
+        if adjusted_stats['std'] > 0:
+            z_scores = (ratings - adjusted_stats['mean']) / adjusted_stats['std']
+        else:
+            z_scores = np.zeros_like(ratings)
+
+        extreme_rating_modifiers = self._calculateExtremeModifiers(ratings)
+        outlier_dampenings = self._calculateOutlierDampenings(z_scores)
+
+        # Base adjustment using tanh for smooth bounded scaling
+        max_adjustments = ratings * self.bounding_factor
+        base_adjustments = np.tanh(z_scores / smoothing_constant) * max_adjustments
+
+        final_adjustments = base_adjustments * self.adjustment_strength * variance_influence * confidence * extreme_rating_modifiers * outlier_dampenings
+        scaled_ratings = np.clip(ratings + final_adjustments, 1, 10)
+
+        # Confidence interval margin is shared by every beer in the style
+        margin_of_error = 1.96 * adjusted_stats['std'] / np.sqrt(N)
+        lower = np.clip(scaled_ratings - margin_of_error, 1, 10)
+        upper = np.clip(scaled_ratings + margin_of_error, 1, 10)
+
+        metadata.z_score[valid] = np.round(z_scores, 2)
+        metadata.percentile[valid] = self._calculatePercentiles(ratings, sorted_ratings)
+        metadata.confidence_lower[valid] = np.round(lower, 2)
+        metadata.confidence_upper[valid] = np.round(upper, 2)
+        metadata.confidence_width[valid] = np.round(upper - lower, 2)
+        metadata.extreme_modifier[valid] = np.round(extreme_rating_modifiers, 3)
+        metadata.outlier_dampening[valid] = np.round(outlier_dampenings, 3)
+        metadata.variance_influence = round(variance_influence, 3)
+        metadata.smoothing_constant = round(smoothing_constant, 2)
+        metadata.global_context = global_context
+
+        result = raw_array.copy()
+        result[valid] = np.round(scaled_ratings, 2)
+        return result, metadata
     
+    def getMaxScaledRatings(self, raw_ratings):
+        """
+        Upper bound on what scale_batch can return for each raw rating, in any
+        style. Every factor scaling the tanh adjustment is at most 1, so a
+        rating rises by at most bounding_factor * adjustment_strength of itself.
+        """
+        raw_array = np.asarray(raw_ratings, dtype = float)
+        valid = (raw_array >= 1) & (raw_array <= 10)
+
+        max_ratings = np.minimum(raw_array * (1 + self.bounding_factor * self.adjustment_strength), 10)
+        return np.where(valid, np.round(max_ratings, 2), raw_array)
+    
+    def _prepareStyle(self, style_ratings, all_user_ratings = None, style_summary = None, global_mean = None, sorted_ratings = None):
+        """
+        Everything scale and scale_batch derive from the style alone: its
+        (possibly shrunk) stats, global context, confidence, variance
+        influence and smoothing constant
+        """
+        N = len(style_ratings)
+        rating_stats = self._calculateStats(style_ratings, summary = style_summary, sorted_ratings = sorted_ratings)
+
+        global_context = None
+        if all_user_ratings is not None:
+            global_context = self._calculateGlobalContext(all_user_ratings, rating_stats['mean'], global_mean = global_mean)
+
+        # Bayesian shrinkage for small samples
+        adjusted_stats = (
+            self._applyShrinkage(rating_stats, global_context, N)
+            if self.use_bayesian_shrinkage and global_context is not None
+            else rating_stats
+        )
+
+        return {
+            'adjusted_stats': adjusted_stats,
+            'global_context': global_context,
+            'confidence': self._calculateConfidence(adjusted_stats, N),
+            'variance_influence': self._calculateVarianceInfluence(adjusted_stats['variance']),
+            'smoothing_constant': self._calculateAdaptiveSmoothing(N) if self.use_adaptive_smoothing else 2.0
+        }
+
     def _validateInputs(self, raw_rating, style_ratings):
         if not isinstance(raw_rating, (int, float)) or raw_rating < 1 or raw_rating > 10:
             print('Invalid raw rating:', raw_rating)
@@ -107,19 +316,46 @@ class BeerRater:
         
         return True
     
-    def _calculateStats(self, style_ratings, robust_stats_threshold = 3):
+    @instrumented('BeerRater._calculateStats')
+    def _calculateStats(self, style_ratings, robust_stats_threshold = 3, summary = None, sorted_ratings = None):
+        if summary is not None:
+            return self._statsFromSummary(summary, robust_stats_threshold)
+
         if self.use_robust_stats and len(style_ratings) >= robust_stats_threshold:
-            return self._calculateRobustStats(style_ratings)
+            return self._calculateRobustStats(style_ratings, sorted_ratings = sorted_ratings)
 
         return self._calculateClassicalStats(style_ratings)
 
-    def _calculateRobustStats(self, style_ratings):
-        ratings_array = np.array(style_ratings)
-        median = np.median(ratings_array)
+    def _statsFromSummary(self, summary, robust_stats_threshold = 3):
+        """Same output as _calculateStats, built from a cached StyleStats summary"""
+        if self.use_robust_stats and summary['count'] >= robust_stats_threshold:
+            std = summary['mad'] * 1.4826
+            return {
+                'mean': summary['median'],
+                'median': summary['median'],
+                'std': std,
+                'variance': std ** 2,
+                'mad': summary['mad'],
+                'robust': True
+            }
+
+        return {
+            'mean': summary['mean'],
+            'median': summary['median'],
+            'std': summary['std'],
+            'variance': summary['variance'],
+            'robust': False
+        }
+
+    @instrumented('BeerRater._calculateRobustStats')
+    def _calculateRobustStats(self, style_ratings, sorted_ratings = None):
+        if sorted_ratings is None:
+            sorted_ratings = np.sort(np.asarray(style_ratings, dtype = float))
+
+        median = sortedMedian(sorted_ratings)
 
         # Median absolute deviation (MAD)
-        absolute_deviations = np.abs(ratings_array - median)
-        mad = np.median(absolute_deviations)
+        mad = sortedMad(sorted_ratings, median)
 
         # Convert MAD to standard deviation equivalent
         std = mad * 1.4826
@@ -134,6 +370,7 @@ class BeerRater:
             'robust': True
         }
     
+    @instrumented('BeerRater._calculateClassicalStats')
     def _calculateClassicalStats(self, style_ratings):
         ratings_array = np.array(style_ratings)
         return {
@@ -144,8 +381,11 @@ class BeerRater:
             'robust': False
         }
 
-    def _calculateGlobalContext(self, all_user_ratings, category_mean):
-        global_mean = np.mean(all_user_ratings)
+    @instrumented('BeerRater._calculateGlobalContext')
+    def _calculateGlobalContext(self, all_user_ratings, category_mean, global_mean = None):
+        if global_mean is None:
+            global_mean = np.mean(all_user_ratings)
+
         category_deviation = category_mean - global_mean
 
         if category_deviation > 1.5:
@@ -185,6 +425,7 @@ class BeerRater:
 
         return shrunk_stats
     
+    @instrumented('BeerRater._calculateConfidence')
     def _calculateConfidence(self, rating_stats, N):
         sample_size_component = min(1.0, N / self.min_sample_size)
 
@@ -195,6 +436,7 @@ class BeerRater:
         combined_confidence = sample_size_component * precision_component
         return self._clamp(combined_confidence, 0, 1)
     
+    @instrumented('BeerRater._calculateVarianceInfluence')
     def _calculateVarianceInfluence(self, variance):
         """
         Sigmoid function centered at variance = 1.0
@@ -204,31 +446,58 @@ class BeerRater:
         return 1 / (1 + np.exp(-3 * (variance - 1.0)))
     
     def _calculateExtremeModifier(self, rating):
-        """
-        Reduce adjustments for ratings near boundaries (1 or 10)
-        to preserve the meaningfulness of extreme ratings
-        """
+        """_calculateExtremeModifiers for a single rating"""
         distance_from_boundary = min(rating - 1, 10 - rating)
-        
+
         if distance_from_boundary >= 2:
             return 1.0  # Full adjustment for mid-range ratings
-        
+
         # Smooth compression near boundaries
         return (distance_from_boundary / 2) ** self.extreme_compression_factor
-    
-    def _calculateOutlierDampening(self, z_score):
+
+    @instrumented('BeerRater._calculateExtremeModifiers')
+    def _calculateExtremeModifiers(self, ratings):
         """
-        Apply diminishing returns for extreme z-scores
-        z=3 → ~0.77, z=4 → ~0.63
+        Reduce adjustments for ratings near boundaries (1 or 10)
+        to preserve the meaningfulness of extreme ratings
         """
+        distance_from_boundary = np.minimum(ratings - 1, 10 - ratings)
+
+        # Full adjustment for mid-range ratings
+        modifiers = np.ones_like(ratings)
+
+        # Smooth compression near boundaries
+        near_boundary = distance_from_boundary < 2
+        modifiers[near_boundary] = (distance_from_boundary[near_boundary] / 2) ** self.extreme_compression_factor
+        return modifiers
+    
+    def _calculateOutlierDampening(self, z_score):
+        """_calculateOutlierDampenings for a single z score"""
         abs_z = abs(z_score)
-        
+
         if abs_z <= 2:
             return 1.0  # No dampening for typical ratings
-        
+
         # Diminishing returns for extreme z-scores
         return 1 / (1 + 0.3 * (abs_z - 2))
+
+    @instrumented('BeerRater._calculateOutlierDampenings')
+    def _calculateOutlierDampenings(self, z_scores):
+        """
+        Apply diminishing returns for extreme z-scores
+        z=3 → ~0.77, z=4 → ~0.63
+        """
+        abs_z = np.abs(z_scores)
+
+        # No dampening for typical ratings
+        dampenings = np.ones_like(z_scores)
+
+        # Diminishing returns for extreme z-scores
+        extreme = abs_z > 2
+        dampenings[extreme] = 1 / (1 + 0.3 * (abs_z[extreme] - 2))
+        return dampenings
     
+    @instrumented('BeerRater._calculateAdaptiveSmoothing')
     def _calculateAdaptiveSmoothing(self, N):
         """
         Smaller samples get more smoothing (higher constant)
@@ -247,32 +516,44 @@ class BeerRater:
         """
         standard_error = rating_stats['std'] / np.sqrt(N)
         margin_of_error = 1.96 * standard_error
-        
+
         lower = self._clamp(scaled_rating - margin_of_error, 1, 10)
         upper = self._clamp(scaled_rating + margin_of_error, 1, 10)
         width = upper - lower
-        
+
         return {
             'lower': round(lower, 2),
             'upper': round(upper, 2),
             'width': round(width, 2)
         }
-    
+
     def _calculatePercentile(self, rating, style_ratings):
-        """
-        Calculate percentile with proper tie handling
-        Uses average rank method for ties
-        """
-        ratings_array = np.array(style_ratings)
-        
+        """_calculatePercentiles for a single rating, without needing the ratings sorted"""
+        ratings_array = np.asarray(style_ratings)
+
         count_below = np.sum(ratings_array < rating)
         count_equal = np.sum(ratings_array == rating)
-        
+
         # Average rank for ties
         average_rank = count_below + (count_equal + 1) / 2
         percentile = (average_rank / len(ratings_array)) * 100
-        
+
         return round(percentile, 1)
+
+    @instrumented('BeerRater._calculatePercentiles')
+    def _calculatePercentiles(self, ratings, sorted_ratings):
+        """
+        Calculate percentiles against the sorted style ratings in O(log N) each,
+        with proper tie handling: uses average rank method for ties
+        """
+        count_below = np.searchsorted(sorted_ratings, ratings, side = 'left')
+        count_equal = np.searchsorted(sorted_ratings, ratings, side = 'right') - count_below
+
+        # Average rank for ties
+        average_ranks = count_below + (count_equal + 1) / 2
+        percentiles = (average_ranks / len(sorted_ratings)) * 100
+
+        return np.round(percentiles, 1)
     
     def _clamp(self, value, min_val=1, max_val=10):
         """Clamp value between min and max"""
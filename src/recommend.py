@@ -0,0 +1,372 @@
+from array import array
+
+from src.store import StringTable
+from src.results import Recommendation, paginate, selectTop
+from src.profiling import instrumented
+from src.lazy import lazyImport
+
+np = lazyImport('numpy')
+
+# Beers two users must both have rated before their similarity counts
+MIN_OVERLAP = 3
+
+# Similarities over few shared beers are shrunk toward 0 by overlap / (overlap + this)
+SIMILARITY_SHRINKAGE = 10
+
+# Most similar users a prediction draws on
+NEIGHBOURS = 50
+
+# Unindexed entries tolerated, as a share of indexed ones, before re-sorting
+MAX_UNINDEXED_SHARE = 0.1
+MIN_UNINDEXED = 4096
+
+class RatingMatrix:
+    """
+    Sparse user x beer matrix of every user's mean rating of each beer they
+    rated. Beers are matched across users by (brewery, beer name).
+
+    Entries are coordinate columns (user, beer, rating sum, rating count) in
+    stdlib arrays, so adding ratings never copies the matrix. Orderings by
+    user and by beer, CSR-style, cover the entries present at the last
+    reindex; entries added since form a short unindexed tail that lookups scan
+    with NumPy, and it is folded in once it grows past a share of the rest.
+    Re-rating a beer updates its entry in place, which keeps both orderings
+    valid.
+    """
+    def __init__(self):
+        self.user_names = StringTable()
+
+        # Interns (brewery_name, beer_name) pairs
+        self.beer_keys = StringTable()
+
+        # Style of each beer's latest rating by any user
+        self.beer_styles = []
+
+        self._users = array('i')
+        self._beers = array('i')
+        self._sums = array('d')
+        self._counts = array('i')
+
+        # Per user: sum of their entries' means, entry count, and the store generation and rows synced
+        self._user_totals = array('d')
+        self._user_sizes = array('i')
+        self._synced_generations = array('q')
+        self._synced_rows = array('i')
+
+        # (entry order, indptr) by user and by beer over the first _indexed entries
+        self._indexed = 0
+        self._by_user = None
+        self._by_beer = None
+
+    def __len__(self):
+        return len(self._users)
+
+    def countUsers(self):
+        return len(self.user_names)
+
+    def countBeers(self):
+        return len(self.beer_keys)
+
+    @instrumented('RatingMatrix.syncUser')
+    def syncUser(self, user):
+        """
+        Bring the user's entries up to date with their BeerStore, reading only
+        the rows added since the last sync. Usable as a User change listener.
+        """
+        store = user.beer_store
+        user_index = self.user_names.intern(user.name)
+        if user_index == len(self._user_totals):
+            self._user_totals.append(0.0)
+            self._user_sizes.append(0)
+            self._synced_generations.append(-1)
+            self._synced_rows.append(0)
+
+        # Rows only line up within one store; a reloaded user is resynced in full, values being absolute
+        start = self._synced_rows[user_index] if self._synced_generations[user_index] == store.generation else 0
+        if start == len(store):
+            return
+
+        store_beer_ids = np.unique(store.getBeerIds()[start:])
+        rows = store.getLatestRows()[store_beer_ids]
+        beers = np.array([
+            self._internBeer(store.getBreweryName(row), store.getName(row), store.getStyleName(row))
+            for row in rows.tolist()
+        ], dtype = np.int32)
+
+        sums = store.getRatingSums()[store_beer_ids]
+        counts = store.getRatingCounts()[store_beer_ids]
+        self._synced_generations[user_index] = store.generation
+        self._synced_rows[user_index] = len(store)
+        self._setEntries(user_index, beers, sums, counts)
+
+    def getUserEntries(self, user_index):
+        """(beer indices, mean ratings) of one user's entries"""
+        entries = self._gather(self._by_user, self._getColumn(self._users), np.array([user_index]))
+        return (self._getColumn(self._beers)[entries], self._getMeans(entries))
+
+    def getUserMeans(self):
+        """Mean of each user's per-beer means, 0 for users without entries"""
+        sizes = self._getColumn(self._user_sizes)
+        return np.divide(self._getColumn(self._user_totals), sizes, out = np.zeros(len(sizes)), where = sizes > 0)
+
+    def getEntriesForBeers(self, beer_indices):
+        """(users, beers, mean ratings) of every entry of the given beers"""
+        entries = self._gather(self._by_beer, self._getColumn(self._beers), beer_indices)
+        return (self._getColumn(self._users)[entries], self._getColumn(self._beers)[entries], self._getMeans(entries))
+
+    def getEntriesForUsers(self, user_indices):
+        """(users, beers, mean ratings) of every entry of the given users"""
+        entries = self._gather(self._by_user, self._getColumn(self._users), user_indices)
+        return (self._getColumn(self._users)[entries], self._getColumn(self._beers)[entries], self._getMeans(entries))
+
+    def reindex(self):
+        """Sort every entry into the by-user and by-beer orderings"""
+        self._indexed = len(self)
+        self._by_user = _sortedIndex(self._getColumn(self._users), self.countUsers())
+        self._by_beer = _sortedIndex(self._getColumn(self._beers), self.countBeers())
+
+    def _internBeer(self, brewery_name, name, style_name):
+        beer_index = self.beer_keys.intern((brewery_name, name))
+        if beer_index == len(self.beer_styles):
+            self.beer_styles.append(style_name)
+        else:
+            self.beer_styles[beer_index] = style_name
+
+        return beer_index
+
+    def _setEntries(self, user_index, beers, sums, counts):
+        """Overwrite the user's entries of the given beers, adding those they lack"""
+        if self._user_sizes[user_index] == 0:
+            # A user's first sync, e.g. while building the matrix, has nothing to look up
+            existing = np.zeros(0, dtype = np.int64)
+        else:
+            self._ensureIndexed()
+            existing = self._gather(self._by_user, self._getColumn(self._users), np.array([user_index]))
+
+        existing_beers = self._getColumn(self._beers)[existing]
+        order = np.argsort(existing_beers)
+        positions = np.searchsorted(existing_beers, beers, sorter = order)
+        found = positions < len(existing_beers)
+        found[found] = existing_beers[order[positions[found]]] == beers[found]
+
+        updated = existing[order[positions[found]]]
+        means = sums / counts
+        self._user_totals[user_index] += float(means[found].sum() - self._getMeans(updated).sum()) + float(means[~found].sum())
+        self._user_sizes[user_index] += int(np.count_nonzero(~found))
+
+        self._getColumn(self._sums)[updated] = sums[found]
+        self._getColumn(self._counts)[updated] = counts[found]
+
+        added = np.count_nonzero(~found)
+        _extend(self._users, 'i', np.full(added, user_index))
+        _extend(self._beers, 'i', beers[~found])
+        _extend(self._sums, 'd', sums[~found])
+        _extend(self._counts, 'i', counts[~found])
+
+    def _ensureIndexed(self):
+        unindexed = len(self) - self._indexed
+        if self._by_user is None or unindexed > max(MIN_UNINDEXED, MAX_UNINDEXED_SHARE * self._indexed):
+            self.reindex()
+
+    def _gather(self, index, column, keys):
+        """Entries whose column value is in keys: indexed ranges, then a scan of the unindexed tail"""
+        keys = np.asarray(keys, dtype = np.int64)
+        entries = []
+
+        if index is not None:
+            order, indptr = index
+            indexed_keys = keys[keys < len(indptr) - 1]
+            starts = indptr[indexed_keys]
+            lengths = indptr[indexed_keys + 1] - starts
+
+            # Concatenated ranges [start, start + length) without a Python loop
+            range_starts = np.repeat(starts - np.cumsum(lengths) + lengths, lengths)
+            entries.append(order[range_starts + np.arange(lengths.sum())])
+
+        tail_start = self._indexed if index is not None else 0
+        tail = column[tail_start:]
+        entries.append(tail_start + np.flatnonzero(np.isin(tail, keys)))
+
+        return np.concatenate(entries)
+
+    def _getMeans(self, entries):
+        return self._getColumn(self._sums)[entries] / self._getColumn(self._counts)[entries]
+
+    def _getColumn(self, column):
+        """Zero-copy view of a column; drop it before the column next grows"""
+        if len(column) == 0:
+            return np.zeros(0, dtype = np.int32 if column.typecode == 'i' else np.float64)
+
+        return np.frombuffer(column, dtype = np.int32 if column.typecode == 'i' else np.float64)
+
+
+class Recommender:
+    """
+    User-based collaborative filtering over a RatingMatrix shared by every
+    user.
+
+    Users are compared by Pearson correlation of their mean-centred ratings
+    over the beers both rated, computed for one user against everyone at
+    once from the entries of that user's beers. A beer the user has not
+    tried is predicted from the most similar users who rated it, then scaled
+    with the user's own BeerRater against their ratings of its style, the
+    same way their rankings are scored.
+
+    watch() keeps the matrix up to date as a user rates, so it is never
+    rebuilt for a new rating.
+    """
+    def __init__(self, matrix = None, neighbours = NEIGHBOURS, min_overlap = MIN_OVERLAP, min_raters = 1):
+        self.matrix = matrix if matrix is not None else RatingMatrix()
+        self.neighbours = neighbours
+        self.min_overlap = min_overlap
+
+        # Neighbours who must have rated a beer for it to be predicted
+        self.min_raters = min_raters
+
+    @classmethod
+    @instrumented('Recommender.fromStorage')
+    def fromStorage(cls, storage, **kwargs):
+        """A recommender over every saved user, built one user at a time"""
+        recommender = cls(**kwargs)
+        for user in storage.iterUsers():
+            recommender.matrix.syncUser(user)
+
+        recommender.matrix.reindex()
+        return recommender
+
+    def watch(self, user):
+        """Sync user into the matrix now and after every change they make"""
+        self.matrix.syncUser(user)
+        user.change_listeners.append(self.matrix.syncUser)
+
+    @instrumented('Recommender.getSimilarities')
+    def getSimilarities(self, user_name):
+        """
+        (similarity, overlap) arrays indexed by user: similarity to user_name,
+        0 for themselves and anyone sharing fewer than min_overlap beers
+        """
+        matrix = self.matrix
+        matrix._ensureIndexed()
+        num_users = matrix.countUsers()
+
+        user_index = matrix.user_names.getId(user_name)
+        if user_index is None:
+            return (np.zeros(num_users), np.zeros(num_users, dtype = int))
+
+        means = matrix.getUserMeans()
+        user_beers, user_ratings = matrix.getUserEntries(user_index)
+        order = np.argsort(user_beers)
+        user_beers = user_beers[order]
+        user_centred = user_ratings[order] - means[user_index]
+
+        # Every other user's entries of this user's beers, paired with this user's entry
+        users, beers, ratings = matrix.getEntriesForBeers(user_beers)
+        others = users != user_index
+        users = users[others]
+        own = user_centred[np.searchsorted(user_beers, beers[others])]
+        centred = ratings[others] - means[users]
+
+        products = np.bincount(users, weights = own * centred, minlength = num_users)
+        own_squares = np.bincount(users, weights = own * own, minlength = num_users)
+        other_squares = np.bincount(users, weights = centred * centred, minlength = num_users)
+        overlap = np.bincount(users, minlength = num_users)
+
+        norms = np.sqrt(own_squares * other_squares)
+        similarity = np.divide(products, norms, out = np.zeros(num_users), where = (norms > 0) & (overlap >= self.min_overlap))
+        similarity *= overlap / (overlap + SIMILARITY_SHRINKAGE)
+
+        return (similarity, overlap)
+
+    def getSimilarUsers(self, user_name, limit = 10):
+        """[(user_name, similarity, shared beers)...] of the most similar users, best first"""
+        similarity, overlap = self.getSimilarities(user_name)
+        top = [user_index for user_index in selectTop(similarity, limit).tolist() if similarity[user_index] > 0]
+
+        return [(self.matrix.user_names.getName(user_index), round(float(similarity[user_index]), 3), int(overlap[user_index])) for user_index in top]
+
+    @instrumented('Recommender.predictRatings')
+    def predictRatings(self, user_name):
+        """
+        (beer indices, predicted raw ratings, raters) for every beer user_name
+        has not rated but a positively similar neighbour has. A prediction is
+        the user's mean plus the similarity-weighted mean of the neighbours'
+        deviations from theirs.
+        """
+        matrix = self.matrix
+        similarity, _ = self.getSimilarities(user_name)
+        neighbours = selectTop(similarity, self.neighbours)
+        neighbours = neighbours[similarity[neighbours] > 0]
+
+        user_index = matrix.user_names.getId(user_name)
+        if user_index is None or len(neighbours) == 0:
+            return (np.zeros(0, dtype = int), np.zeros(0), np.zeros(0, dtype = int))
+
+        means = matrix.getUserMeans()
+        users, beers, ratings = matrix.getEntriesForUsers(neighbours)
+        untried = ~np.isin(beers, matrix.getUserEntries(user_index)[0])
+        users, beers, ratings = users[untried], beers[untried], ratings[untried]
+
+        weights = similarity[users]
+        num_beers = matrix.countBeers()
+        deviations = np.bincount(beers, weights = weights * (ratings - means[users]), minlength = num_beers)
+        total_weights = np.bincount(beers, weights = weights, minlength = num_beers)
+        raters = np.bincount(beers, minlength = num_beers)
+
+        candidates = np.flatnonzero((raters >= self.min_raters) & (total_weights > 0))
+        predicted = np.clip(means[user_index] + deviations[candidates] / total_weights[candidates], 1, 10)
+
+        return (candidates, predicted, raters[candidates])
+
+    @instrumented('Recommender.recommend')
+    def recommend(self, user, offset = 0, limit = 10):
+        """
+        One page of beers user has not rated, as Recommendation tuples, best
+        scaled prediction first. Predictions in styles the user has no ratings
+        for can't be scaled and keep their raw value.
+        """
+        self.matrix.syncUser(user)
+        beer_indices, predicted, raters = self.predictRatings(user.name)
+        if len(beer_indices) == 0:
+            return []
+
+        scaled = np.round(predicted, 2)
+        styles = np.array([self.matrix.beer_styles[beer_index] for beer_index in beer_indices.tolist()], dtype = object)
+        context = user._getScalingContext()
+
+        for style_name in set(styles.tolist()) & set(user.styles):
+            stats = context['style_stats'][style_name]
+            if len(stats) == 0:
+                continue
+
+            in_style = styles == style_name
+            scaled[in_style], _ = context['rater'].scale_batch(
+                predicted[in_style],
+                context['ratings_lists_by_style'][style_name],
+                all_user_ratings = context['all_user_ratings'],
+                style_summary = stats.getSummary(),
+                global_mean = context['global_mean'],
+                sorted_style_ratings = stats.getSortedArray()
+            )
+
+        top = selectTop(scaled, offset + limit) if limit is not None else np.lexsort((np.arange(len(scaled)), -scaled))
+        recommendations = []
+        for i, position in enumerate(paginate(top.tolist(), offset, limit)):
+            brewery_name, name = self.matrix.beer_keys.getName(int(beer_indices[position]))
+            recommendations.append(Recommendation(
+                offset + i + 1, name, brewery_name, styles[position],
+                float(scaled[position]), round(float(predicted[position]), 2), int(raters[position])
+            ))
+
+        return recommendations
+
+
+def _sortedIndex(keys, num_keys):
+    """(entries ordered by key, indptr) so key k's entries are order[indptr[k]:indptr[k + 1]]"""
+    order = np.argsort(keys, kind = 'stable')
+    indptr = np.zeros(num_keys + 1, dtype = np.int64)
+    np.cumsum(np.bincount(keys, minlength = num_keys), out = indptr[1:])
+    return (order, indptr)
+
+def _extend(column, typecode, values):
+    """Append a NumPy array to a stdlib array of the same item size"""
+    column.frombytes(np.ascontiguousarray(values, dtype = np.int32 if typecode == 'i' else np.float64).tobytes())
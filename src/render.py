@@ -0,0 +1,25 @@
+import sys
+
+# Each renderer is a generator, so a caller that stops early never formats the rest
+
+def renderBreweryRankings(rankings):
+    for ranking in rankings:
+        yield f'{ranking.rank}. {ranking.name}: {ranking.score}'
+
+def renderStyleRankings(rankings):
+    for ranking in rankings:
+        yield f'{ranking.rank}. {ranking.name} - {ranking.rating} ({ranking.beers})'
+
+def renderBeerRankings(rankings):
+    for ranking in rankings:
+        yield f'{ranking.rank}. {ranking.name} ({ranking.brewery}) - {ranking.rating}'
+
+def renderRecommendations(recommendations):
+    for recommendation in recommendations:
+        yield f'{recommendation.rank}. {recommendation.name} ({recommendation.brewery}, {recommendation.style}) - {recommendation.rating}'
+
+def printLines(lines, out = None):
+    """Write rendered lines to out, stdout by default"""
+    out = out if out is not None else sys.stdout
+    for line in lines:
+        out.write(line + '\n')
@@ -0,0 +1,41 @@
+from collections import namedtuple
+
+from src.lazy import lazyImport
+
+np = lazyImport('numpy')
+
+# Rankings returned by User; src/render.py turns them into printable lines
+
+# rank is 1-based over the full ranking, so it stays correct for a later page
+BreweryRanking = namedtuple('BreweryRanking', ['rank', 'name', 'score', 'beers', 'lower', 'upper'])
+
+StyleRanking = namedtuple('StyleRanking', ['rank', 'name', 'rating', 'beers'])
+
+BeerRanking = namedtuple('BeerRanking', ['rank', 'name', 'brewery', 'rating'])
+
+# rating is the prediction scaled like the user's own ratings, predicted the raw prediction
+Recommendation = namedtuple('Recommendation', ['rank', 'name', 'brewery', 'style', 'rating', 'predicted', 'raters'])
+
+def paginate(items, offset = 0, limit = None):
+    """Slice one page out of an already ranked list"""
+    end = None if limit is None else offset + limit
+    return items[offset:end]
+
+def selectTop(scores, k):
+    """
+    Positions of the k highest scores, best first, found with a partial
+    selection instead of a full sort. Ties go to the earlier position, the
+    same order a stable descending sort gives.
+    """
+    scores = np.asarray(scores)
+    if k <= 0:
+        return np.zeros(0, dtype = int)
+
+    if k >= len(scores):
+        candidates = np.arange(len(scores))
+    else:
+        kth_best = np.partition(scores, len(scores) - k)[len(scores) - k]
+        candidates = np.flatnonzero(scores >= kth_best)
+
+    order = np.lexsort((candidates, -scores[candidates]))
+    return candidates[order][:k]
@@ -0,0 +1,140 @@
+from bisect import bisect_left, insort
+from collections import Counter
+import unicodedata
+
+# Fuzzy matches need at least this share of the query's trigrams
+MIN_SIMILARITY = 0.4
+
+# Match tiers, best first
+EXACT = 0
+PREFIX = 1
+WORD_PREFIX = 2
+FUZZY = 3
+
+def normalizeName(name):
+    """Case, accents and punctuation folded away, words separated by single spaces"""
+    folded = name.casefold()
+    if not folded.isascii():
+        folded = ''.join(char for char in unicodedata.normalize('NFKD', folded) if not unicodedata.combining(char))
+
+    return ' '.join(''.join(char if char.isalnum() else ' ' for char in folded).split())
+
+def trigrams(normalized_name):
+    """Character trigrams of every word, padded so word starts weigh more"""
+    return {
+        padded[i:i + 3]
+        for word in normalized_name.split()
+        for padded in (f'  {word} ',)
+        for i in range(len(padded) - 2)
+    }
+
+
+class NameSearchIndex:
+    """
+    Ranked, incremental search over a growing set of names, for pickers too
+    long to show whole.
+
+    Matches rank exact names first, then names starting with the query, then
+    names with a word starting with it, then fuzzy matches sharing enough
+    character trigrams with it (typos, missing letters). Prefixes are found by
+    bisecting sorted lists and fuzzy candidates through trigram posting sets,
+    so neither scans every name. add() keeps everything up to date in place.
+    """
+    def __init__(self, names = ()):
+        self.names = []
+        self.ids = {}
+        self._normalized_names = []
+
+        # Sorted (normalized name, id) and (word, id) pairs for prefix lookups
+        self._sorted_names = []
+        self._sorted_words = []
+
+        # trigram -> ids of names containing it
+        self._postings = {}
+
+        # Sorting once beats inserting every name in order
+        for name in names:
+            self._index(name, insert = False)
+
+        self._sorted_names.sort()
+        self._sorted_words.sort()
+
+    def __len__(self):
+        return len(self.names)
+
+    def __contains__(self, name):
+        return name in self.ids
+
+    def add(self, name):
+        """Index name; adding a name already indexed does nothing"""
+        self._index(name, insert = True)
+
+    def _index(self, name, insert):
+        """insert keeps the sorted lists sorted; otherwise the caller sorts them"""
+        if name in self.ids:
+            return
+
+        name_id = len(self.names)
+        self.ids[name] = name_id
+        self.names.append(name)
+
+        normalized = normalizeName(name)
+        self._normalized_names.append(normalized)
+
+        add = insort if insert else list.append
+        add(self._sorted_names, (normalized, name_id))
+        for word in set(normalized.split()):
+            add(self._sorted_words, (word, name_id))
+
+        for trigram in trigrams(normalized):
+            self._postings.setdefault(trigram, set()).add(name_id)
+
+    def search(self, query, offset = 0, limit = None):
+        """
+        One page of names matching query, best first. Within a tier shorter
+        names come first, then earlier added ones. An empty query matches
+        every name in the order added.
+        """
+        normalized = normalizeName(query)
+        if normalized == '':
+            ranked = range(len(self.names))
+        else:
+            ranked = self._rank(normalized)
+
+        end = None if limit is None else offset + limit
+        return [self.names[name_id] for name_id in ranked[offset:end]]
+
+    def _rank(self, normalized):
+        tiers = {}
+        for name_id in self._prefixMatches(self._sorted_names, normalized):
+            tiers[name_id] = EXACT if self._normalized_names[name_id] == normalized else PREFIX
+
+        for name_id in self._prefixMatches(self._sorted_words, normalized):
+            tiers.setdefault(name_id, WORD_PREFIX)
+
+        # Fuzzy matches rank by how much of the query they contain, so a typo
+        # in one word of a long name still matches
+        similarities = {}
+        query_trigrams = trigrams(normalized)
+        shared = Counter()
+        for trigram in query_trigrams:
+            shared.update(self._postings.get(trigram, ()))
+
+        for name_id, count in shared.items():
+            similarity = count / len(query_trigrams)
+            if name_id not in tiers and similarity >= MIN_SIMILARITY:
+                tiers[name_id] = FUZZY
+                similarities[name_id] = similarity
+
+        return sorted(
+            tiers,
+            key=lambda name_id: (tiers[name_id], -similarities.get(name_id, 0.0), len(self.names[name_id]), name_id)
+        )
+
+    def _prefixMatches(self, sorted_pairs, prefix):
+        start = bisect_left(sorted_pairs, (prefix, -1))
+        for position in range(start, len(sorted_pairs)):
+            if not sorted_pairs[position][0].startswith(prefix):
+                break
+
+            yield sorted_pairs[position][1]
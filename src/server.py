@@ -0,0 +1,265 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+import hashlib
+import json
+import sys
+from urllib.parse import parse_qs, unquote, urlsplit
+
+DEFAULT_HOST = '127.0.0.1'
+DEFAULT_PORT = 8080
+
+# Distinct pages (resource and query) kept per user before the oldest is dropped
+MAX_RESPONSES_PER_USER = 64
+
+# Request line plus headers; anything longer is rejected
+MAX_HEADER_BYTES = 16 * 1024
+
+REASONS = {200: 'OK', 304: 'Not Modified', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed', 500: 'Internal Server Error'}
+
+class HttpError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+class _UserEntry:
+    """A loaded user and their rendered responses, valid while version holds"""
+    __slots__ = ('version', 'user', 'responses')
+
+    def __init__(self, version):
+        self.version = version
+        self.user = None
+        self.responses = {}
+
+
+class RankingCache:
+    """
+    Rendered ranking responses per user, each with an ETag, kept until that
+    user's saved data changes.
+
+    Every lookup first compares the storage's change token; only when it moved
+    are cached users' versions re-read, and only users whose version changed
+    are dropped. Misses are computed on a single worker thread, so the event
+    loop keeps answering cached requests, and concurrent misses for the same
+    response await one shared computation instead of each scoring the user.
+    """
+    def __init__(self, storage):
+        self.storage = storage
+        self.users = {}
+
+        # (user_name, resource) -> Future of a computation in progress
+        self._pending = {}
+
+        # User objects and storage are only touched from this one thread
+        self._executor = ThreadPoolExecutor(max_workers = 1, thread_name_prefix = 'rankings')
+        self._token = None
+        self._user_names = None
+
+    async def get(self, user_name, resource):
+        """(etag, body) for resource, a tuple naming the ranking and its page"""
+        await self._refresh()
+        if user_name not in self._user_names:
+            raise HttpError(404, f'No user named {user_name}')
+
+        entry = self.users.get(user_name)
+        if entry is not None and resource in entry.responses:
+            return entry.responses[resource]
+
+        key = (user_name, resource)
+        if key not in self._pending:
+            self._pending[key] = asyncio.ensure_future(self._compute(user_name, resource))
+            self._pending[key].add_done_callback(lambda _: self._pending.pop(key, None))
+
+        # A waiter that goes away must not cancel the others' computation
+        return await asyncio.shield(self._pending[key])
+
+    def close(self):
+        self._executor.shutdown(wait = True)
+
+    async def _refresh(self):
+        loop = asyncio.get_running_loop()
+        token = await loop.run_in_executor(self._executor, self.storage.getChangeToken)
+        if token is not None and token == self._token and self._user_names is not None:
+            return
+
+        user_names = set(await loop.run_in_executor(self._executor, self.storage.getUserNames))
+        versions = await loop.run_in_executor(self._executor, self.storage.getUserVersions, list(self.users))
+        for user_name in versions:
+            if user_name in self.users and self.users[user_name].version != versions[user_name]:
+                del self.users[user_name]
+
+        # Only now that stale users are dropped may a request trust the new token
+        self._user_names = user_names
+        self._token = token
+
+    async def _compute(self, user_name, resource):
+        loop = asyncio.get_running_loop()
+
+        entry = self.users.get(user_name)
+        if entry is None:
+            # Read the version before the data, so a change in between is caught next time
+            versions = await loop.run_in_executor(self._executor, self.storage.getUserVersions, [user_name])
+            entry = self.users.setdefault(user_name, _UserEntry(versions[user_name]))
+
+        body = await loop.run_in_executor(self._executor, self._render, entry, user_name, resource)
+        response = ('"' + hashlib.sha1(body).hexdigest() + '"', body)
+
+        # Only keep it if the user was not invalidated while it was computed
+        if self.users.get(user_name) is entry:
+            if len(entry.responses) >= MAX_RESPONSES_PER_USER:
+                del entry.responses[next(iter(entry.responses))]
+            entry.responses[resource] = response
+
+        return response
+
+    def _render(self, entry, user_name, resource):
+        if entry.user is None:
+            entry.user = self.storage.openUser(user_name)
+
+        user = entry.user
+        kind, offset, limit = resource[:3]
+
+        if kind == 'breweries':
+            rankings = user.getBreweryRankings(offset = offset, limit = limit)
+        elif kind == 'styles':
+            rankings = user.getStyleRankings(offset = offset, limit = limit)
+        else:
+            style_name = resource[3]
+            if style_name not in user.styles:
+                raise HttpError(404, f'{user_name} has no style named {style_name}')
+            rankings = user.getStyleBeerRankings(style_name, offset = offset, limit = limit)
+
+        return json.dumps({'user': user_name, kind: [ranking._asdict() for ranking in rankings]}).encode('utf-8')
+
+
+class RankingServer:
+    """
+    Read-only HTTP/1.1 API over the ranking methods of User, for dashboards:
+
+        GET /users/{name}/breweries
+        GET /users/{name}/styles
+        GET /users/{name}/styles/{style}/beers
+
+    Each takes optional offset and limit query parameters. Responses carry an
+    ETag; a matching If-None-Match is answered with 304 and no body.
+    """
+    def __init__(self, storage, host = DEFAULT_HOST, port = DEFAULT_PORT):
+        self.cache = RankingCache(storage)
+        self.host = host
+        self.port = port
+        self._server = None
+
+    async def start(self):
+        self._server = await asyncio.start_server(self._handleConnection, self.host, self.port, limit = MAX_HEADER_BYTES)
+        self.port = self._server.sockets[0].getsockname()[1]
+        return self._server
+
+    async def serveForever(self):
+        server = await self.start()
+        async with server:
+            await server.serve_forever()
+
+    async def close(self):
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+
+        self.cache.close()
+
+    async def _handleConnection(self, reader, writer):
+        try:
+            while True:
+                try:
+                    head = await reader.readuntil(b'\r\n\r\n')
+                except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError):
+                    break
+
+                method, target, headers = self._parseHead(head)
+                keep_alive = headers.get('connection', '').lower() != 'close'
+
+                status, response_headers, body = await self._respond(method, target, headers)
+                self._write(writer, status, response_headers, b'' if method == 'HEAD' else body, len(body), keep_alive)
+                await writer.drain()
+
+                if not keep_alive:
+                    break
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def _respond(self, method, target, headers):
+        try:
+            if method not in ('GET', 'HEAD'):
+                raise HttpError(405, f'{method} is not supported')
+
+            user_name, resource = self._route(target)
+            etag, body = await self.cache.get(user_name, resource)
+
+            if etag in [tag.strip() for tag in headers.get('if-none-match', '').split(',')]:
+                return (304, {'ETag': etag, 'Cache-Control': 'no-cache'}, b'')
+
+            return (200, {'ETag': etag, 'Cache-Control': 'no-cache', 'Content-Type': 'application/json'}, body)
+
+        except HttpError as error:
+            return (error.status, {'Content-Type': 'application/json'}, json.dumps({'error': str(error)}).encode('utf-8'))
+
+        except Exception as error:
+            print(f'Error serving {target}: {error!r}', file = sys.stderr)
+            return (500, {'Content-Type': 'application/json'}, json.dumps({'error': 'internal error'}).encode('utf-8'))
+
+    def _route(self, target):
+        """(user_name, resource) for a request target, resource being (kind, offset, limit[, style])"""
+        url = urlsplit(target)
+        parts = [unquote(part) for part in url.path.strip('/').split('/')]
+        query = parse_qs(url.query)
+
+        try:
+            offset = int(query.get('offset', ['0'])[0])
+            limit = int(query['limit'][0]) if 'limit' in query else None
+        except ValueError:
+            raise HttpError(400, 'offset and limit must be integers')
+
+        if offset < 0 or (limit is not None and limit < 0):
+            raise HttpError(400, 'offset and limit must not be negative')
+
+        if len(parts) == 3 and parts[0] == 'users' and parts[2] in ('breweries', 'styles'):
+            return (parts[1], (parts[2], offset, limit))
+
+        if len(parts) == 5 and parts[0] == 'users' and parts[2] == 'styles' and parts[4] == 'beers':
+            return (parts[1], ('beers', offset, limit, parts[3]))
+
+        raise HttpError(404, f'No such resource: {url.path}')
+
+    def _parseHead(self, head):
+        lines = head.decode('latin-1').split('\r\n')
+        method, target = (lines[0].split(' ') + ['', ''])[:2]
+
+        headers = {}
+        for line in lines[1:]:
+            if ':' in line:
+                name, value = line.split(':', 1)
+                headers[name.strip().lower()] = value.strip()
+
+        return (method, target, headers)
+
+    def _write(self, writer, status, headers, body, content_length, keep_alive):
+        lines = [f'HTTP/1.1 {status} {REASONS[status]}']
+        lines += [f'{name}: {value}' for name, value in headers.items()]
+        lines.append(f'Content-Length: {content_length if status != 304 else 0}')
+        lines.append('Connection: ' + ('keep-alive' if keep_alive else 'close'))
+
+        writer.write(('\r\n'.join(lines) + '\r\n\r\n').encode('latin-1') + body)
+
+
+def serve(storage, host = DEFAULT_HOST, port = DEFAULT_PORT):
+    """Run the API until interrupted"""
+    server = RankingServer(storage, host = host, port = port)
+    print(f'Serving rankings on http://{host}:{port}/users/{{name}}/breweries')
+
+    try:
+        asyncio.run(server.serveForever())
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.cache.close()
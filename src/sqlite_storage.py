@@ -0,0 +1,295 @@
+import sqlite3
+import threading
+
+from src.storage import Storage
+from src.journal import RATE, RERATE, ADD_STYLE
+from src.stats import DecayedAverage
+from src.results import paginate
+
+DB_PATH = 'data/beer_data.db'
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS users (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL UNIQUE
+);
+
+CREATE TABLE IF NOT EXISTS breweries (
+    id INTEGER PRIMARY KEY,
+    user_id INTEGER NOT NULL REFERENCES users(id),
+    name TEXT NOT NULL,
+    UNIQUE (user_id, name)
+);
+
+-- position is the style's place in the user's style list; NULL for styles that
+-- only appear on ratings
+CREATE TABLE IF NOT EXISTS styles (
+    id INTEGER PRIMARY KEY,
+    user_id INTEGER NOT NULL REFERENCES users(id),
+    name TEXT NOT NULL,
+    position INTEGER,
+    UNIQUE (user_id, name)
+);
+
+CREATE TABLE IF NOT EXISTS ratings (
+    id INTEGER PRIMARY KEY,
+    user_id INTEGER NOT NULL REFERENCES users(id),
+    brewery_id INTEGER NOT NULL REFERENCES breweries(id),
+    style_id INTEGER NOT NULL REFERENCES styles(id),
+    name TEXT NOT NULL,
+    rating REAL NOT NULL,
+    rated_at REAL
+);
+
+CREATE INDEX IF NOT EXISTS ratings_user_style ON ratings (user_id, style_id, rating);
+CREATE INDEX IF NOT EXISTS ratings_user_brewery ON ratings (user_id, brewery_id);
+'''
+
+class SqliteStorage(Storage):
+    """Ratings in a local SQLite database, indexed by (user, style) and (user, brewery)"""
+    supports_queries = True
+
+    def __init__(self, path = DB_PATH):
+        self.path = path
+
+        # An AutoSaver may write from its own thread. SQLite serializes use of
+        # the connection itself; the lock keeps each write transaction whole
+        self.connection = sqlite3.connect(path, check_same_thread = False)
+        self.lock = threading.RLock()
+        self.connection.executescript(SCHEMA)
+        self._migrate()
+
+    def getUserNames(self):
+        return [name for (name,) in self.connection.execute('SELECT name FROM users ORDER BY id')]
+
+    def loadUser(self, user_name, include_ratings = True):
+        user_id = self._getUserId(user_name)
+        if user_id is None:
+            return {}
+
+        styles = [
+            name for (name,) in self.connection.execute(
+                'SELECT name FROM styles WHERE user_id = ? AND position IS NOT NULL ORDER BY position',
+                (user_id,)
+            )
+        ]
+        if not include_ratings:
+            return {'styles': styles}
+
+        breweries = {
+            name: [] for (name,) in self.connection.execute(
+                'SELECT name FROM breweries WHERE user_id = ? ORDER BY id',
+                (user_id,)
+            )
+        }
+        rows = self.connection.execute(
+            '''
+            SELECT ratings.name, breweries.name, styles.name, ratings.rating, ratings.rated_at
+            FROM ratings
+            JOIN breweries ON breweries.id = ratings.brewery_id
+            JOIN styles ON styles.id = ratings.style_id
+            WHERE ratings.user_id = ?
+            ORDER BY ratings.id
+            ''',
+            (user_id,)
+        )
+        for name, brewery_name, style_name, rating, rated_at in rows:
+            breweries[brewery_name].append(self._beerObject(name, brewery_name, style_name, rating, rated_at))
+
+        return {'styles': styles, 'breweries': breweries}
+
+    def saveEvents(self, user, events):
+        with self.lock, self.connection:
+            user_id = self._getOrCreateUserId(user.name)
+            for event in events:
+                self._applyEvent(user_id, event)
+
+    def getStyleBeers(self, user_name, style_name, offset = 0, limit = None, half_life = None):
+        user_id = self._getUserId(user_name)
+        if user_id is None:
+            return []
+
+        style_row = self.connection.execute(
+            'SELECT id FROM styles WHERE user_id = ? AND name = ?',
+            (user_id, style_name)
+        ).fetchone()
+        if style_row is None:
+            return []
+
+        if half_life is not None:
+            return self._getRecencyWeightedStyleBeers(user_id, style_name, style_row[0], offset, limit, half_life)
+
+        # Narrowed by the (user_id, style_id, rating) index. Re-ratings of a beer
+        # collapse into one entry with their mean rating; ties keep the order
+        # beers were first rated. LIMIT -1 means no limit
+        rows = self.connection.execute(
+            '''
+            SELECT ratings.name, breweries.name, ?, AVG(ratings.rating), MAX(ratings.rated_at)
+            FROM ratings
+            JOIN breweries ON breweries.id = ratings.brewery_id
+            WHERE ratings.user_id = ? AND ratings.style_id = ?
+            GROUP BY ratings.brewery_id, ratings.name
+            ORDER BY AVG(ratings.rating) DESC, MIN(ratings.id)
+            LIMIT ? OFFSET ?
+            ''',
+            (style_name, user_id, style_row[0], -1 if limit is None else limit, offset)
+        )
+        return [self._beerObject(*row) for row in rows]
+
+    def _getRecencyWeightedStyleBeers(self, user_id, style_name, style_id, offset, limit, half_life):
+        """
+        getStyleBeers ranked by recency-weighted ratings. SQLite can't decay
+        ratings itself, so the style's rows are read in rating order and
+        averaged the same way StyleStats averages them.
+        """
+        rows = self.connection.execute(
+            '''
+            SELECT ratings.name, breweries.name, ratings.rating, ratings.rated_at
+            FROM ratings
+            JOIN breweries ON breweries.id = ratings.brewery_id
+            WHERE ratings.user_id = ? AND ratings.style_id = ?
+            ORDER BY ratings.id
+            ''',
+            (user_id, style_id)
+        )
+
+        # (brewery, name) -> [DecayedAverage, latest rated_at], in order of first rating
+        beers = {}
+        for name, brewery_name, rating, rated_at in rows:
+            key = (brewery_name, name)
+            if key not in beers:
+                beers[key] = [DecayedAverage(half_life), None]
+
+            beers[key][0].add(rating, rated_at)
+            if rated_at is not None and (beers[key][1] is None or rated_at > beers[key][1]):
+                beers[key][1] = rated_at
+
+        # Stable, so ties keep the order beers were first rated
+        ranked = sorted(beers.items(), key=lambda item: item[1][0].getAverage(), reverse = True)
+        return [
+            self._beerObject(name, brewery_name, style_name, totals.getAverage(), latest_rated_at)
+            for (brewery_name, name), (totals, latest_rated_at) in paginate(ranked, offset, limit)
+        ]
+
+    def importUser(self, user_name, user_data):
+        """
+        Insert a whole user from the beer_data.json layout, unless the database
+        already has them. Returns whether the user was imported.
+        """
+        with self.lock, self.connection:
+            # Each import is one transaction, so a user present was imported in full (or saved since)
+            if self._getUserId(user_name) is not None:
+                return False
+
+            user_id = self._getOrCreateUserId(user_name)
+
+            for style_name in user_data.get('styles', []):
+                self._applyEvent(user_id, {'type': ADD_STYLE, 'style': style_name})
+
+            breweries = user_data.get('breweries', {})
+            for brewery_name in breweries:
+                self._getOrCreateId('breweries', user_id, brewery_name)
+                for beer in breweries[brewery_name]:
+                    self._applyEvent(user_id, {
+                        'type': RATE,
+                        'name': beer['name'],
+                        'brewery': brewery_name,
+                        'style': beer['style'],
+                        'rating': beer['rating'],
+                        'rated_at': beer.get('rated_at')
+                    })
+
+        return True
+
+    def getChangeToken(self):
+        # data_version moves when another connection commits, total_changes when this one does
+        return (self.connection.execute('PRAGMA data_version').fetchone()[0], self.connection.total_changes)
+
+    def getUserVersions(self, user_names):
+        versions = {}
+        for user_name in user_names:
+            user_id = self._getUserId(user_name)
+            if user_id is None:
+                versions[user_name] = None
+                continue
+
+            # Ratings are only ever inserted, and adding a style sets its position
+            versions[user_name] = (
+                self.connection.execute('SELECT COUNT(*), MAX(id) FROM ratings WHERE user_id = ?', (user_id,)).fetchone(),
+                self.connection.execute('SELECT COUNT(*), COUNT(position) FROM styles WHERE user_id = ?', (user_id,)).fetchone()
+            )
+
+        return versions
+
+    def close(self):
+        self.connection.close()
+
+    def _applyEvent(self, user_id, event):
+        if event['type'] == ADD_STYLE:
+            style_id = self._getOrCreateId('styles', user_id, event['style'])
+            self.connection.execute(
+                '''
+                UPDATE styles
+                SET position = (SELECT COALESCE(MAX(position), -1) + 1 FROM styles WHERE user_id = ?)
+                WHERE id = ? AND position IS NULL
+                ''',
+                (user_id, style_id)
+            )
+
+        elif event['type'] in (RATE, RERATE):
+            brewery_id = self._getOrCreateId('breweries', user_id, event['brewery'])
+            style_id = self._getOrCreateId('styles', user_id, event['style'])
+            self.connection.execute(
+                'INSERT INTO ratings (user_id, brewery_id, style_id, name, rating, rated_at) VALUES (?, ?, ?, ?, ?, ?)',
+                (user_id, brewery_id, style_id, event['name'], event['rating'], event.get('rated_at'))
+            )
+
+        else:
+            raise ValueError(f"Unknown event type: {event['type']}")
+
+    def _getUserId(self, user_name):
+        row = self.connection.execute('SELECT id FROM users WHERE name = ?', (user_name,)).fetchone()
+        return row[0] if row is not None else None
+
+    def _getOrCreateUserId(self, user_name):
+        self.connection.execute('INSERT OR IGNORE INTO users (name) VALUES (?)', (user_name,))
+        return self._getUserId(user_name)
+
+    def _getOrCreateId(self, table, user_id, name):
+        # table is always one of our own table names, never user input
+        self.connection.execute(f'INSERT OR IGNORE INTO {table} (user_id, name) VALUES (?, ?)', (user_id, name))
+        return self.connection.execute(f'SELECT id FROM {table} WHERE user_id = ? AND name = ?', (user_id, name)).fetchone()[0]
+
+    def _migrate(self):
+        """Bring databases created before ratings were timestamped up to the current schema"""
+        columns = [column[1] for column in self.connection.execute('PRAGMA table_info(ratings)')]
+        if 'rated_at' not in columns:
+            with self.connection:
+                self.connection.execute('ALTER TABLE ratings ADD COLUMN rated_at REAL')
+
+    def _beerObject(self, name, brewery_name, style_name, rating, rated_at = None):
+        beer = {'name': name, 'brewery': brewery_name, 'style': style_name, 'rating': rating}
+        if rated_at is not None:
+            beer['rated_at'] = rated_at
+
+        return beer
+
+
+def migrateJsonToSqlite(data, path = DB_PATH):
+    """
+    Copy every user in the beer_data.json layout into a SQLite database. Users
+    already in it are left alone, so running it again adds nothing twice.
+    Returns (storage, names of the users imported).
+    """
+    storage = SqliteStorage(path)
+    imported = [user_name for user_name in data if storage.importUser(user_name, data[user_name])]
+
+    return storage, imported
+
+
+if __name__ == '__main__':
+    from src.utils import open_beer_data
+
+    storage, imported = migrateJsonToSqlite(open_beer_data())
+    print(f'Migrated {len(imported)} users to {storage.path}; {len(storage.getUserNames()) - len(imported)} were already there')
+    storage.close()
@@ -0,0 +1,308 @@
+from bisect import bisect_left, bisect_right, insort
+import itertools
+import math
+
+from src.lazy import lazyImport
+
+np = lazyImport('numpy')
+
+# Versions are drawn from one counter so they never repeat across StyleStats
+_versions = itertools.count(1)
+
+# Styles with at most this many beers are summarized in plain Python, where
+# NumPy's per-call overhead costs more than the math itself
+SMALL_STYLE_SIZE = 64
+
+def pairwiseSum(values, start = 0, count = None):
+    """
+    Sum of values[start:start + count] added in exactly the order of NumPy's
+    pairwise summation, so it rounds the same as np.sum over a float64 array
+    """
+    if count is None:
+        count = len(values) - start
+
+    if count < 8:
+        total = 0.0
+        for i in range(start, start + count):
+            total += values[i]
+        return total
+
+    if count <= 128:
+        # Eight interleaved accumulators, combined as a tree, then the remainder
+        partials = values[start:start + 8]
+        i = 8
+        while i < count - count % 8:
+            partials = [partials[j] + values[start + i + j] for j in range(8)]
+            i += 8
+
+        total = ((partials[0] + partials[1]) + (partials[2] + partials[3])) + ((partials[4] + partials[5]) + (partials[6] + partials[7]))
+        for i in range(start + i, start + count):
+            total += values[i]
+        return total
+
+    half = count // 2
+    half -= half % 8
+    return pairwiseSum(values, start, half) + pairwiseSum(values, start + half, count - half)
+
+def sortedMedian(sorted_values):
+    """Median of an already sorted sequence in O(1)"""
+    middle = len(sorted_values) // 2
+    if len(sorted_values) % 2 == 1:
+        return sorted_values[middle]
+
+    return (sorted_values[middle - 1] + sorted_values[middle]) / 2
+
+def sortedMad(sorted_values, median):
+    """
+    Median absolute deviation of an already sorted sequence in O(log N).
+
+    Deviations of the values below the median, read right to left, and of the
+    values above it, read left to right, form two sorted runs; the MAD is the
+    middle of their merge, found by binary search without building either run.
+    """
+    count = len(sorted_values)
+    split = bisect_right(sorted_values, median)
+
+    if count % 2 == 1:
+        return _kthDeviation(sorted_values, median, split, count // 2)
+
+    return (_kthDeviation(sorted_values, median, split, count // 2 - 1) + _kthDeviation(sorted_values, median, split, count // 2)) / 2
+
+def _kthDeviation(sorted_values, median, split, k):
+    """k-th smallest (0-based) absolute deviation from median"""
+    below_count = split
+    above_count = len(sorted_values) - split
+
+    def below(i):
+        return median - sorted_values[split - 1 - i] if i < below_count else math.inf
+
+    def above(j):
+        return sorted_values[split + j] - median if j < above_count else math.inf
+
+    # i deviations come from below the median and k + 1 - i from above it
+    low = max(0, k + 1 - above_count)
+    high = min(k + 1, below_count)
+    while True:
+        i = (low + high) // 2
+        j = k + 1 - i
+
+        below_last = below(i - 1) if i > 0 else -math.inf
+        above_last = above(j - 1) if j > 0 else -math.inf
+
+        if below_last > above(j):
+            high = i - 1
+        elif above_last > below(i):
+            low = i + 1
+        else:
+            return max(below_last, above_last)
+
+
+class DecayedAverage:
+    """
+    Average of one beer's ratings in O(1) per rating, optionally weighted by
+    recency: a rating half_life seconds older than another counts half as much.
+
+    The weighted total and total weight are kept as of the latest rating and
+    decayed only when a newer one arrives. Decaying both by the same factor
+    leaves their ratio alone, so reading the average never touches the history.
+    Ratings without a time count as rated at the latest time seen.
+    """
+    __slots__ = ('half_life', 'weighted_total', 'total_weight', 'count', 'latest_time')
+
+    def __init__(self, half_life = None):
+        self.half_life = half_life
+        self.weighted_total = 0.0
+        self.total_weight = 0.0
+        self.count = 0
+        self.latest_time = None
+
+    def add(self, rating, rated_at = None):
+        weight = 1.0
+        if self.half_life is not None and rated_at is not None:
+            if self.latest_time is None or rated_at >= self.latest_time:
+                if self.latest_time is not None:
+                    decay = 0.5 ** ((rated_at - self.latest_time) / self.half_life)
+                    self.weighted_total *= decay
+                    self.total_weight *= decay
+                self.latest_time = rated_at
+            else:
+                weight = 0.5 ** ((self.latest_time - rated_at) / self.half_life)
+
+        self.weighted_total += weight * rating
+        self.total_weight += weight
+        self.count += 1
+
+    def getAverage(self):
+        return self.weighted_total / self.total_weight
+
+
+class StyleStats:
+    """
+    Statistics over the per-beer averaged ratings of a single style.
+    Per-beer totals and the sorted list are kept up to date as ratings
+    arrive; re-rating a beer replaces its old average in the sorted list
+    rather than rebuilding the list, so updates cost one insert / delete.
+
+    The median and MAD are read off the sorted list in O(log N). The mean
+    and variance are not running sums: a sum kept across inserts and
+    removals rounds differently from np.mean over the rating list, which
+    shifts rankings. They are summed pairwise over the style, once per
+    change and only when read (see getSummary), in plain Python for small
+    styles.
+
+    half_life, in seconds, turns each beer's average into a recency-weighted
+    one (see DecayedAverage); None keeps the plain average.
+    """
+    def __init__(self, name, half_life = None):
+        self.name = name
+        self.half_life = half_life
+
+        # beer key -> DecayedAverage of its ratings
+        self.beer_totals = {}
+
+        self.sorted_ratings = []
+
+        self._summary = None
+        self._sorted_array = None
+
+        # Changes whenever the style's ratings do; cached scores key on it
+        self.version = next(_versions)
+
+    def __len__(self):
+        return len(self.sorted_ratings)
+
+    def __repr__(self):
+        return f'Name: {self.name}, Count: {len(self)};'
+
+    def addRating(self, beer_key, rating, rated_at = None):
+        if beer_key in self.beer_totals:
+            totals = self.beer_totals[beer_key]
+            self._remove(totals.getAverage())
+        else:
+            totals = DecayedAverage(self.half_life)
+            self.beer_totals[beer_key] = totals
+
+        totals.add(rating, rated_at)
+        self._insert(totals.getAverage())
+        self._summary = None
+        self._sorted_array = None
+        self.version = next(_versions)
+
+    def addRatings(self, beer_keys, ratings, rated_ats = None):
+        """Bulk load ratings, sorting once instead of inserting one at a time"""
+        if rated_ats is None:
+            rated_ats = itertools.repeat(None)
+
+        for beer_key, rating, rated_at in zip(beer_keys, ratings, rated_ats):
+            if beer_key not in self.beer_totals:
+                self.beer_totals[beer_key] = DecayedAverage(self.half_life)
+
+            self.beer_totals[beer_key].add(rating, rated_at)
+
+        self.sorted_ratings = sorted(self.getRatings())
+        self._summary = None
+        self._sorted_array = None
+        self.version = next(_versions)
+
+    def getRatings(self):
+        """Per-beer averaged ratings, in the order the beers were first rated"""
+        return [totals.getAverage() for totals in self.beer_totals.values()]
+
+    def getBeerRating(self, beer_key):
+        """One beer's averaged rating within this style, recency-weighted if half_life is set"""
+        return self.beer_totals[beer_key].getAverage()
+
+    def getMean(self):
+        return self.getSummary()['mean']
+
+    def getSummary(self):
+        """
+        Cached mean / median / MAD / variance, recomputed only after the
+        style has changed
+        """
+        if self._summary is None:
+            self._summary = self._calculateSummary()
+
+        return self._summary
+
+    def getSortedArray(self):
+        """The sorted ratings as a NumPy array, rebuilt only after the style changes"""
+        if self._sorted_array is None:
+            self._sorted_array = np.asarray(self.sorted_ratings, dtype = float)
+
+        return self._sorted_array
+
+    def getPercentile(self, rating):
+        """Percentile of rating within the style in O(log N), averaging the rank of ties"""
+        count_below = bisect_left(self.sorted_ratings, rating)
+        count_equal = bisect_right(self.sorted_ratings, rating) - count_below
+
+        average_rank = count_below + (count_equal + 1) / 2
+        return round((average_rank / len(self.sorted_ratings)) * 100, 1)
+
+    def _calculateSummary(self):
+        count = len(self.sorted_ratings)
+        if count == 0:
+            return {'count': 0, 'mean': None, 'median': None, 'mad': None, 'variance': None, 'std': None}
+
+        # NumPy's pairwise sums over the ratings in first-rated order, so means
+        # round exactly as np.mean over the style's rating list always has
+        if count <= SMALL_STYLE_SIZE:
+            ratings = self.getRatings()
+            mean = pairwiseSum(ratings) / count
+            variance = pairwiseSum([(rating - mean) * (rating - mean) for rating in ratings]) / count
+            std = math.sqrt(variance)
+        else:
+            ratings = np.asarray(self.getRatings(), dtype = float)
+            mean, variance, std = np.mean(ratings), np.var(ratings), np.std(ratings)
+
+        median = sortedMedian(self.sorted_ratings)
+
+        return {
+            'count': count,
+            'mean': mean,
+            'median': median,
+            'mad': sortedMad(self.sorted_ratings, median),
+            'variance': variance,
+            'std': std
+        }
+
+    def _insert(self, value):
+        insort(self.sorted_ratings, value)
+
+    def _remove(self, value):
+        del self.sorted_ratings[bisect_left(self.sorted_ratings, value)]
+
+
+class StyleStatsStore:
+    """Per-user collection of StyleStats, keyed by style name"""
+    def __init__(self, half_life = None):
+        self.half_life = half_life
+        self.styles = {}
+
+    def __contains__(self, style_name):
+        return style_name in self.styles
+
+    def addRating(self, style_name, beer_key, rating, rated_at = None):
+        if style_name not in self.styles:
+            self.styles[style_name] = StyleStats(style_name, self.half_life)
+
+        self.styles[style_name].addRating(beer_key, rating, rated_at)
+
+    def addRatings(self, style_name, beer_keys, ratings, rated_ats = None):
+        if style_name not in self.styles:
+            self.styles[style_name] = StyleStats(style_name, self.half_life)
+
+        self.styles[style_name].addRatings(beer_keys, ratings, rated_ats)
+
+    def getStats(self, style_name):
+        if style_name not in self.styles:
+            self.styles[style_name] = StyleStats(style_name, self.half_life)
+
+        return self.styles[style_name]
+
+    def getRatings(self, style_name):
+        if style_name not in self.styles:
+            return []
+
+        return self.styles[style_name].getRatings()
@@ -0,0 +1,131 @@
+import os
+
+from src.utils import DATA_PATH, open_user_names, open_user_data, saveUserEvents, fileSignature
+from src.journal import JOURNAL_PATH, RatingsJournal, eventRecords
+from src.stream import iterSnapshotUsers
+from src.user import User
+
+JSON = 'json'
+SQLITE = 'sqlite'
+BINARY = 'binary'
+
+class Storage:
+    """
+    Interface for where users' ratings live. Backends that can answer view
+    queries themselves (e.g. one style sorted by rating) set supports_queries.
+    """
+    supports_queries = False
+
+    def getUserNames(self):
+        raise NotImplementedError
+
+    def loadUser(self, user_name, include_ratings = True):
+        """
+        Return the user's data in the beer_data.json layout
+        ({ 'styles': [...], 'breweries': { brewery_name: [...beer objects] } })
+        """
+        raise NotImplementedError
+
+    def openUser(self, user_name, include_ratings = True):
+        """The user as a User; backends that can build one without the JSON layout override this"""
+        return User(user_name, self.loadUser(user_name, include_ratings = include_ratings), storage = self)
+
+    def saveUserChanges(self, user):
+        """Persist the user's pending events"""
+        self.saveEvents(user, user.popPendingEvents())
+
+    def saveEvents(self, user, events):
+        """Persist events already taken from the user's pending events"""
+        raise NotImplementedError
+
+    def getStyleBeers(self, user_name, style_name, offset = 0, limit = None, half_life = None):
+        """
+        Beer objects tagged to style_name, highest rated first, optionally one
+        page of them. half_life, in seconds, ranks re-rated beers by their
+        recency-weighted rating (see stats.DecayedAverage)
+        """
+        raise NotImplementedError
+
+    def getChangeToken(self):
+        """
+        A cheap value that changes whenever any saved data may have, so callers
+        can skip getUserVersions until it does; None if the backend cannot tell
+        """
+        return None
+
+    def getUserVersions(self, user_names):
+        """{ user_name: version }, each version changing whenever that user's saved data does"""
+        raise NotImplementedError
+
+    def iterUsers(self):
+        """Every saved User, one at a time"""
+        for user_name in self.getUserNames():
+            yield self.openUser(user_name)
+
+
+class JsonStorage(Storage):
+    """The beer_data.json snapshot, its user index and the ratings journal"""
+    def getUserNames(self):
+        return open_user_names()
+
+    def loadUser(self, user_name, include_ratings = True):
+        return open_user_data(user_name)
+
+    def saveEvents(self, user, events):
+        saveUserEvents(user, events)
+
+    def getChangeToken(self):
+        return (fileSignature(DATA_PATH), fileSignature(JOURNAL_PATH))
+
+    def getUserVersions(self, user_names):
+        return journalUserVersions(DATA_PATH, RatingsJournal(), user_names)
+
+    def iterUsers(self):
+        """
+        Every saved User, streamed from the snapshot so only the user being
+        built is ever in memory, with their journaled changes applied
+        """
+        events_by_user = RatingsJournal().getEventsByUser()
+
+        if os.path.exists(DATA_PATH):
+            for user_name, records in iterSnapshotUsers(DATA_PATH):
+                user = User.fromRecords(user_name, records, storage = self)
+                user.loadRecords(eventRecords(events_by_user.pop(user_name, []), user.raw_data.get('journal_seq', 0)))
+                yield user
+
+        # Users who have only ever been journaled
+        for user_name in events_by_user:
+            yield User.fromRecords(user_name, eventRecords(events_by_user[user_name]), storage = self)
+
+
+def journalUserVersions(snapshot_path, journal, user_names):
+    """
+    getUserVersions for snapshot + journal backends: the last journaled
+    sequence of each user. Rewriting the snapshot changes every version,
+    since compaction moves those sequences out of the journal.
+    """
+    snapshot = fileSignature(snapshot_path)
+    last_seqs = {
+        user_name: events[-1]['seq']
+        for user_name, events in journal.getEventsByUser().items()
+    }
+    return {user_name: (snapshot, last_seqs.get(user_name, 0)) for user_name in user_names}
+
+
+def getStorage(backend = None):
+    """Pick the storage backend, defaulting to the BEER_STORAGE environment variable"""
+    if backend is None:
+        backend = os.environ.get('BEER_STORAGE', JSON)
+
+    if backend == JSON:
+        return JsonStorage()
+
+    if backend == SQLITE:
+        from src.sqlite_storage import SqliteStorage
+        return SqliteStorage()
+
+    if backend == BINARY:
+        from src.binary_snapshot import BinaryStorage
+        return BinaryStorage()
+
+    raise ValueError(f'Unknown storage backend: {backend}')
@@ -0,0 +1,356 @@
+from array import array
+import itertools
+import math
+
+from src.lazy import lazyImport
+
+np = lazyImport('numpy')
+
+# Source of BeerStore.generation
+_generations = itertools.count()
+
+class StringTable:
+    """Interns strings to dense integer ids"""
+    def __init__(self):
+        self.names = []
+        self.ids = {}
+
+    def __len__(self):
+        return len(self.names)
+
+    def __contains__(self, name):
+        return name in self.ids
+
+    def intern(self, name):
+        if name not in self.ids:
+            self.ids[name] = len(self.names)
+            self.names.append(name)
+
+        return self.ids[name]
+
+    def getId(self, name):
+        return self.ids.get(name)
+
+    def getName(self, string_id):
+        return self.names[string_id]
+
+
+class BeerStore:
+    """
+    Column-oriented storage for every rating of a single user. Brewery, style and
+    beer names are interned to integer ids; Beer objects are thin views over a row.
+
+    Every rating is a row, so re-rating a beer adds one. Rows of the same
+    (brewery, beer name) share a dense beer id whose rating count, sum and
+    latest row are kept up to date on append, so a beer is looked up in O(1)
+    and aggregations can read one entry per beer instead of every rating.
+
+    Columns are stdlib arrays, so loading and editing never imports NumPy. The
+    get*Ids / get*Ratings accessors return zero-copy NumPy views for the scoring
+    code; a view must be dropped before the next append.
+
+    A store built by fromColumns reads read-only buffers instead, e.g. a
+    memory-mapped binary snapshot; they are copied into arrays on first append.
+    """
+    def __init__(self):
+        self.brewery_names = StringTable()
+        self.style_names = StringTable()
+        self.beer_names = StringTable()
+
+        self._brewery_ids = array('i')
+        self._style_ids = array('i')
+        self._name_ids = array('i')
+
+        # Ratings stay float64: one-decimal ratings are not exact in float32
+        self._ratings = array('d')
+        self._scaled_ratings = array('d')
+
+        # Unix time of each rating, NaN when it predates timestamps
+        self._rated_ats = array('d')
+
+        # Beer id of each row, and the same beer's previous row or -1
+        self._beer_ids = array('i')
+        self._previous_rows = array('i')
+
+        # (brewery_id, name_id) -> beer id, and per beer id aggregates
+        self.beer_keys = {}
+        self._rating_counts = array('i')
+        self._rating_sums = array('d')
+        self._latest_rows = array('i')
+
+        # Whether the rating columns above are borrowed read-only buffers
+        self._mapped = False
+
+        # Unique per store, so anything caching by row number can tell a reloaded user's store apart
+        self.generation = next(_generations)
+
+    @classmethod
+    def fromColumns(cls, brewery_names, style_names, beer_names, brewery_ids, style_ids, name_ids, ratings, rated_ats):
+        """
+        A store over existing columns without copying them. The name lists are
+        the string tables in id order; the columns are native-endian, C-contiguous
+        int32 / float64 buffers (anything exposing the buffer protocol).
+        """
+        store = cls()
+        for table, names in ((store.brewery_names, brewery_names), (store.style_names, style_names), (store.beer_names, beer_names)):
+            table.names = list(names)
+            table.ids = {name: string_id for string_id, name in enumerate(table.names)}
+
+        store._brewery_ids = memoryview(brewery_ids).cast('B').cast('i')
+        store._style_ids = memoryview(style_ids).cast('B').cast('i')
+        store._name_ids = memoryview(name_ids).cast('B').cast('i')
+        store._ratings = memoryview(ratings).cast('B').cast('d')
+        store._rated_ats = memoryview(rated_ats).cast('B').cast('d')
+        store._scaled_ratings = array('d', [math.nan]) * len(store._ratings)
+        store._mapped = True
+        store._buildBeerIndex()
+
+        return store
+
+    def __len__(self):
+        return len(self._ratings)
+
+    def append(self, name, brewery_name, style_name, rating, rated_at = None):
+        """Add a rating row and return its row index"""
+        if self._mapped:
+            self._copyColumns()
+
+        row = len(self._ratings)
+        brewery_id = self.brewery_names.intern(brewery_name)
+        name_id = self.beer_names.intern(name)
+
+        beer_id = self.beer_keys.get((brewery_id, name_id))
+        if beer_id is None:
+            beer_id = len(self._rating_counts)
+            self.beer_keys[(brewery_id, name_id)] = beer_id
+            self._rating_counts.append(0)
+            self._rating_sums.append(0.0)
+            self._latest_rows.append(-1)
+
+        self._brewery_ids.append(brewery_id)
+        self._style_ids.append(self.style_names.intern(style_name))
+        self._name_ids.append(name_id)
+        self._ratings.append(rating)
+        self._scaled_ratings.append(math.nan)
+        self._rated_ats.append(math.nan if rated_at is None else rated_at)
+
+        self._beer_ids.append(beer_id)
+        self._previous_rows.append(self._latest_rows[beer_id])
+        self._rating_counts[beer_id] += 1
+        self._rating_sums[beer_id] += rating
+        self._latest_rows[beer_id] = row
+
+        return row
+
+    def countBeers(self):
+        """Number of distinct (brewery, beer name) pairs"""
+        return len(self._rating_counts)
+
+    def getBeerId(self, brewery_name, name):
+        """The beer id of a (brewery, beer name) pair, or None if it was never rated"""
+        brewery_id = self.brewery_names.getId(brewery_name)
+        name_id = self.beer_names.getId(name)
+        if brewery_id is None or name_id is None:
+            return None
+
+        return self.beer_keys.get((brewery_id, name_id))
+
+    def getRowBeerId(self, row):
+        return self._beer_ids[row]
+
+    def getLatestRow(self, beer_id):
+        return self._latest_rows[beer_id]
+
+    def getRatingCount(self, beer_id):
+        return self._rating_counts[beer_id]
+
+    def getAverageRating(self, beer_id):
+        return self._rating_sums[beer_id] / self._rating_counts[beer_id]
+
+    def getBeerRows(self, beer_id):
+        """Every rating row of one beer, oldest first"""
+        rows = []
+        row = self._latest_rows[beer_id]
+        while row != -1:
+            rows.append(row)
+            row = self._previous_rows[row]
+
+        return rows[::-1]
+
+    def getBeerIds(self):
+        """Beer id of every row"""
+        return self._view(self._beer_ids, np.int32)
+
+    def getLatestRows(self):
+        return self._view(self._latest_rows, np.int32)
+
+    def getPreviousRows(self):
+        """Each row's previous rating of the same beer, -1 for a beer's first rating"""
+        return self._view(self._previous_rows, np.int32)
+
+    def getRatingCounts(self):
+        """Number of ratings of every beer, indexed by beer id"""
+        return self._view(self._rating_counts, np.int32)
+
+    def getRatingSums(self):
+        return self._view(self._rating_sums, np.float64)
+
+    def getAverageRatings(self):
+        """Mean rating of every beer, indexed by beer id"""
+        if self.countBeers() == 0:
+            return np.zeros(0)
+
+        return self._view(self._rating_sums, np.float64) / self._view(self._rating_counts, np.int32)
+
+    def getBreweryIds(self):
+        return self._view(self._brewery_ids, np.int32)
+
+    def getStyleIds(self):
+        return self._view(self._style_ids, np.int32)
+
+    def getNameIds(self):
+        return self._view(self._name_ids, np.int32)
+
+    def getRatings(self):
+        return self._view(self._ratings, np.float64)
+
+    def getScaledRatings(self):
+        return self._view(self._scaled_ratings, np.float64)
+
+    def getRatedAts(self):
+        return self._view(self._rated_ats, np.float64)
+
+    def getName(self, row):
+        return self.beer_names.getName(self._name_ids[row])
+
+    def getBreweryName(self, row):
+        return self.brewery_names.getName(self._brewery_ids[row])
+
+    def getStyleName(self, row):
+        return self.style_names.getName(self._style_ids[row])
+
+    def getStyleId(self, row):
+        return self._style_ids[row]
+
+    def getNameId(self, row):
+        return self._name_ids[row]
+
+    def getRating(self, row):
+        return self._ratings[row]
+
+    def getRatedAt(self, row):
+        rated_at = self._rated_ats[row]
+        return None if math.isnan(rated_at) else rated_at
+
+    def getScaledRating(self, row):
+        scaled_rating = self._scaled_ratings[row]
+        return None if math.isnan(scaled_rating) else scaled_rating
+
+    def setScaledRating(self, row, value):
+        self._scaled_ratings[row] = math.nan if value is None else value
+
+    def groupRowsByStyleId(self):
+        """{ style_id: [rows] } in order of each style's first row, rows ascending"""
+        if not self._mapped:
+            rows_by_style_id = {}
+            for row in range(len(self)):
+                rows_by_style_id.setdefault(self._style_ids[row], []).append(row)
+
+            return rows_by_style_id
+
+        return self._groupByStyleId(np.arange(len(self)))
+
+    def groupBeersByStyleId(self):
+        """{ style_id: [beer ids] }, each beer once per style it was rated under, in rating order"""
+        if not self._mapped:
+            beers_by_style_id = {}
+            seen = set()
+            for row in range(len(self)):
+                key = (self._style_ids[row], self._beer_ids[row])
+                if key not in seen:
+                    seen.add(key)
+                    beers_by_style_id.setdefault(key[0], []).append(key[1])
+
+            return beers_by_style_id
+
+        # The first row of every (style, beer) pair stands for the beer
+        pair_keys = self.getStyleIds().astype(np.int64) * max(self.countBeers(), 1) + self.getBeerIds()
+        first_rows = np.sort(np.unique(pair_keys, return_index = True)[1])
+        beer_ids = self.getBeerIds()
+
+        return {
+            style_id: beer_ids[rows].tolist()
+            for style_id, rows in self._groupByStyleId(first_rows).items()
+        }
+
+    def _groupByStyleId(self, rows):
+        """groupRowsByStyleId over an ascending subset of rows, without a Python loop"""
+        # NumPy is already loaded for a mapped store
+        style_ids = self.getStyleIds()[rows]
+        order = np.argsort(style_ids, kind = 'stable')
+        sorted_ids = style_ids[order]
+        starts = np.flatnonzero(np.concatenate(([True], sorted_ids[1:] != sorted_ids[:-1]))) if len(order) > 0 else np.zeros(0, dtype = int)
+        groups = np.split(rows[order], starts[1:])
+
+        # Mirror the dict the loop builds, keyed in first-appearance order
+        return {
+            int(sorted_ids[start]): group.tolist()
+            for start, group in sorted(zip(starts, groups), key = lambda item: item[1][0])
+        }
+
+    def _buildBeerIndex(self):
+        """The beer id columns and aggregates for rows that were not appended one by one"""
+        count = len(self)
+        pair_keys = self.getBreweryIds().astype(np.int64) * max(len(self.beer_names), 1) + self.getNameIds()
+        _, first_rows, inverse = np.unique(pair_keys, return_index = True, return_inverse = True)
+
+        # Number beers in order of their first rating, as appending does
+        by_first_row = np.argsort(first_rows, kind = 'stable')
+        beer_ids = np.empty(len(first_rows), dtype = np.int32)
+        beer_ids[by_first_row] = np.arange(len(first_rows), dtype = np.int32)
+        row_beer_ids = beer_ids[inverse.reshape(-1)]
+        first_rows = first_rows[by_first_row]
+
+        # Within each beer's rows, each row's predecessor is the row sorted before it
+        order = np.argsort(row_beer_ids, kind = 'stable')
+        previous_rows = np.full(count, -1, dtype = np.int32)
+        same_beer = row_beer_ids[order[1:]] == row_beer_ids[order[:-1]]
+        previous_rows[order[1:][same_beer]] = order[:-1][same_beer]
+
+        # Each beer's last row in that order is its latest
+        last_rows = order[np.flatnonzero(np.append(~same_beer, True))] if count > 0 else order
+        latest_rows = np.empty(len(first_rows), dtype = np.int32)
+        latest_rows[row_beer_ids[last_rows]] = last_rows
+
+        self._beer_ids = _toArray('i', row_beer_ids)
+        self._previous_rows = _toArray('i', previous_rows)
+        self._rating_counts = _toArray('i', np.bincount(row_beer_ids, minlength = len(first_rows)))
+        self._rating_sums = _toArray('d', np.bincount(row_beer_ids, weights = self.getRatings(), minlength = len(first_rows)))
+        self._latest_rows = _toArray('i', latest_rows)
+
+        self.beer_keys = dict(zip(
+            zip(self.getBreweryIds()[first_rows].tolist(), self.getNameIds()[first_rows].tolist()),
+            range(len(first_rows))
+        ))
+
+    def _copyColumns(self):
+        """Copy borrowed columns into arrays so they can grow"""
+        for attribute, typecode in (('_brewery_ids', 'i'), ('_style_ids', 'i'), ('_name_ids', 'i'), ('_ratings', 'd'), ('_rated_ats', 'd')):
+            column = array(typecode)
+            column.frombytes(getattr(self, attribute).cast('B'))
+            setattr(self, attribute, column)
+
+        self._mapped = False
+
+    def _view(self, column, dtype):
+        if len(column) == 0:
+            return np.zeros(0, dtype = dtype)
+
+        return np.frombuffer(column, dtype = dtype)
+
+
+def _toArray(typecode, values):
+    """Copy a NumPy array into a stdlib array of the same item size"""
+    column = array(typecode)
+    column.frombytes(np.ascontiguousarray(values, dtype = np.int32 if typecode == 'i' else np.float64).tobytes())
+    return column
@@ -0,0 +1,221 @@
+import json
+import re
+
+# Characters read from the snapshot at a time; grows while a single value is larger
+CHUNK_SIZE = 64 * 1024
+
+# A number is complete only once one of these follows it
+NUMBER_END = re.compile(r'[,\]}\s]')
+
+# Record kinds yielded for one user by iterSnapshotUsers
+BREWERY = 'brewery'
+BEER = 'beer'
+STYLE = 'style'
+FIELD = 'field'
+
+class JsonStreamReader:
+    """
+    Reads a JSON document from a text file a chunk at a time. Containers are
+    walked one token at a time; readValue decodes one complete value, so
+    memory stays bounded by the largest value read rather than the file.
+
+    Malformed input raises ValueError with the character offset it was found at.
+    """
+    def __init__(self, f, name = '<stream>', chunk_size = CHUNK_SIZE):
+        self.f = f
+        self.name = name
+        self.chunk_size = chunk_size
+        self.decoder = json.JSONDecoder()
+
+        self.buffer = ''
+        self.position = 0
+
+        # Characters dropped from the front of buffer, for error offsets
+        self.consumed = 0
+        self.eof = False
+
+    def peek(self):
+        """Next non-whitespace character without consuming it, or '' at the end of the file"""
+        while True:
+            while self.position < len(self.buffer) and self.buffer[self.position] in ' \t\n\r':
+                self.position += 1
+
+            if self.position < len(self.buffer):
+                return self.buffer[self.position]
+
+            if not self._fill():
+                return ''
+
+    def expect(self, char):
+        if self.peek() != char:
+            self._fail(f'expected {char!r}')
+
+        self.position += 1
+
+    def readValue(self):
+        # A number split at the chunk boundary, e.g. '9.' + '5', would decode
+        # as its first half, so buffer up to the character after it first
+        if self.peek() in '-0123456789':
+            while NUMBER_END.search(self.buffer, self.position) is None and self._fill():
+                pass
+
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buffer, self.position)
+            except json.JSONDecodeError as error:
+                # Most likely the value continues in the next chunk
+                if not self._fill(len(self.buffer) - self.position):
+                    self._fail(error.msg, error.pos)
+                continue
+
+            self.position = end
+            return value
+
+    def nextItem(self, closing):
+        """
+        After a container element, consume the ',' before the next one. Returns
+        False, leaving it unconsumed, once closing is next.
+        """
+        char = self.peek()
+        if char == ',':
+            self.position += 1
+            return True
+
+        if char != closing:
+            self._fail(f'expected \',\' or {closing!r}')
+
+        return False
+
+    def expectEnd(self):
+        if self.peek() != '':
+            self._fail('unexpected data after the document')
+
+    def _fill(self, pending = 0):
+        """Read another chunk, at least as large as what is pending; False at the end of the file"""
+        if self.eof:
+            return False
+
+        chunk = self.f.read(max(self.chunk_size, pending))
+        if chunk == '':
+            self.eof = True
+            return False
+
+        self.consumed += self.position
+        self.buffer = self.buffer[self.position:] + chunk
+        self.position = 0
+        return True
+
+    def _fail(self, message, position = None):
+        position = self.position if position is None else position
+        raise ValueError(f'{self.name}: {message}: character {self.consumed + position}')
+
+
+def iterSnapshotEntries(path, chunk_size = CHUNK_SIZE):
+    """
+    Yield (user_name, user_data) for each user in a beer_data.json snapshot,
+    holding only one user's entry in memory at a time
+    """
+    with open(path) as f:
+        reader = JsonStreamReader(f, name = path, chunk_size = chunk_size)
+        reader.expect('{')
+
+        if reader.peek() != '}':
+            while True:
+                user_name = _readKey(reader)
+                yield user_name, reader.readValue()
+
+                if not reader.nextItem('}'):
+                    break
+
+        reader.expect('}')
+        reader.expectEnd()
+
+def iterSnapshotUsers(path, chunk_size = CHUNK_SIZE):
+    """
+    Yield (user_name, records) for each user in a beer_data.json snapshot
+    without building their entry. records yields, in file order:
+
+    - (BREWERY, brewery_name) followed by (BEER, beer_object) for each of
+      its ratings, brewery by brewery
+    - (STYLE, style_name) for every style in the user's list
+    - (FIELD, key, value) for anything else, e.g. journal_seq
+
+    Each user's records must be consumed before moving on; whatever is left
+    is skipped.
+    """
+    with open(path) as f:
+        reader = JsonStreamReader(f, name = path, chunk_size = chunk_size)
+        reader.expect('{')
+
+        if reader.peek() != '}':
+            while True:
+                user_name = _readKey(reader)
+
+                records = _iterUserRecords(reader)
+                yield user_name, records
+                for _ in records:
+                    pass
+
+                if not reader.nextItem('}'):
+                    break
+
+        reader.expect('}')
+        reader.expectEnd()
+
+def _iterUserRecords(reader):
+    reader.expect('{')
+    if reader.peek() == '}':
+        reader.expect('}')
+        return
+
+    while True:
+        key = _readKey(reader)
+
+        if key == 'breweries':
+            yield from _iterBeers(reader)
+        elif key == 'styles':
+            yield from ((STYLE, style_name) for style_name in _iterArray(reader))
+        else:
+            yield (FIELD, key, reader.readValue())
+
+        if not reader.nextItem('}'):
+            break
+
+    reader.expect('}')
+
+def _iterBeers(reader):
+    reader.expect('{')
+    if reader.peek() == '}':
+        reader.expect('}')
+        return
+
+    while True:
+        yield (BREWERY, _readKey(reader))
+        yield from ((BEER, beer) for beer in _iterArray(reader))
+
+        if not reader.nextItem('}'):
+            break
+
+    reader.expect('}')
+
+def _iterArray(reader):
+    reader.expect('[')
+    if reader.peek() == ']':
+        reader.expect(']')
+        return
+
+    while True:
+        yield reader.readValue()
+
+        if not reader.nextItem(']'):
+            break
+
+    reader.expect(']')
+
+def _readKey(reader):
+    if reader.peek() != '"':
+        reader._fail('expected an object key')
+
+    key = reader.readValue()
+    reader.expect(':')
+    return key
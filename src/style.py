@@ -1,16 +1,51 @@
-import numpy as np
+from src.beer import Beer
+from src.lazy import lazyImport
+
+np = lazyImport('numpy')
 
 class Style:
-    def __init__(self, name):
+    def __init__(self, name, store = None):
         self.name = name
-        self.tagged_beers = []
+
+        # Beer ids in the user's BeerStore, one per distinct beer
+        self.store = store
+        self.tagged_beer_ids = []
+        self._tagged_beer_id_set = set()
 
     def __str__(self):
         return self.name
     
     def __repr__(self):
         return f'Name: {self.name}, Beers: {self.tagged_beers};'
+
+    @property
+    def tagged_beers(self):
+        """One Beer per tagged beer, viewing its latest rating"""
+        return [Beer.fromRow(self.store, self.store.getLatestRow(beer_id)) for beer_id in self.tagged_beer_ids]
+
+    def tagBeer(self, beer):
+        self.tagBeerIds(beer.store, [beer.beer_id])
+
+    def tagBeerIds(self, store, beer_ids):
+        """Tag store beers to this style, ignoring beers that are already tagged"""
+        if self.store is None:
+            self.store = store
+
+        if len(self.tagged_beer_ids) == 0:
+            self.tagged_beer_ids = list(map(int, beer_ids))
+            self._tagged_beer_id_set = set(self.tagged_beer_ids)
+            if len(self._tagged_beer_id_set) < len(self.tagged_beer_ids):
+                self.tagged_beer_ids = list(dict.fromkeys(self.tagged_beer_ids))
+            return
+
+        for beer_id in beer_ids:
+            beer_id = int(beer_id)
+            if beer_id not in self._tagged_beer_id_set:
+                self._tagged_beer_id_set.add(beer_id)
+                self.tagged_beer_ids.append(beer_id)
     
     def getRating(self):
-        ratings_lst = [beer.rating for beer in self.tagged_beers]
-        return np.mean(ratings_lst)
\ No newline at end of file
+        if len(self.tagged_beer_ids) == 0:
+            return np.mean([])
+
+        return np.mean(self.store.getAverageRatings()[self.tagged_beer_ids])
@@ -1,35 +1,250 @@
-import numpy as np
+import heapq
+import threading
+import time
 
-from src.utils import getUserInput, getInteractiveMenuResponse, clear_terminal
+from src.utils import getUserInput, getInteractiveMenuResponse, getSearchMenuResponse, clear_terminal
 from src.style import Style
 from src.brewery import Brewery
+from src.beer import Beer
+from src.stats import StyleStatsStore
+from src.store import BeerStore
+from src.journal import RATE, RERATE, ADD_STYLE
+from src.stream import BREWERY, BEER, STYLE, FIELD
+from src.ratings import BeerRater
+from src.memo import ScaledScoreCache
+from src.results import BreweryRanking, StyleRanking, BeerRanking, paginate, selectTop
+from src.render import renderBreweryRankings, renderStyleRankings, renderBeerRankings, printLines
+from src.search import NameSearchIndex
+from src.profiling import instrumented
+from src.lazy import lazyImport
+
+np = lazyImport('numpy')
 
 class User:
-    def __init__(self, name, data):
+    @instrumented('User.__init__')
+    def __init__(self, name, data, storage = None):
         self.name = name
 
         self.raw_data = data
 
+        # Backend the user was loaded from, used for queries it can answer directly
+        self.storage = storage
+
+        # Changes not yet written to the ratings journal
+        self.pending_events = []
+
+        # Guards pending_events, which an AutoSaver drains from its own thread
+        self.lock = threading.Lock()
+
+        # Called with the user after every change, e.g. AutoSaver.markDirty
+        self.change_listeners = []
+
+        # Every rating of this user lives in one columnar store
+        self.beer_store = BeerStore()
+
         raw_breweries_data = self.raw_data['breweries'] if 'breweries' in self.raw_data else {}
         self.breweries = {
-            brewery_name: Brewery(brewery_name, raw_breweries_data[brewery_name]) 
+            brewery_name: Brewery(brewery_name, raw_breweries_data[brewery_name], store = self.beer_store) 
             for brewery_name in raw_breweries_data
         }
         
         raw_style_data = self.raw_data['styles'] if 'styles' in self.raw_data else []
-        self.styles = { style: Style(style) for style in raw_style_data }
-        self._syncStylesWithBreweries()
+        self.styles = { style: Style(style, store = self.beer_store) for style in raw_style_data }
 
-    def _syncStylesWithBreweries(self):
-        for brewery_name in self.breweries:
-            brewery = self.breweries[brewery_name]
-            for beer in brewery.beers:
-                if beer.style_name in self.styles:
-                    self.styles[beer.style_name].tagged_beers.append(beer)
+        self._syncStylesWithBreweries(self._groupBeersByStyle())
+
+        # Built on first use, so modes that never rank don't pay for it
+        self._style_stats = None
+
+        # Scaled scores survive between rankings until their style or the global mean changes
+        self.score_cache = ScaledScoreCache()
+
+        # Scoring settings, including whether re-rated beers favour recent ratings
+        self.rater = BeerRater()
+
+        # Name search for the interactive pickers, built on first use; beers are searched per brewery
+        self._search_indexes = None
+        self._beer_search_indexes = {}
+
+    @classmethod
+    def fromRecords(cls, name, records, storage = None):
+        """
+        Build a user straight from stream.iterSnapshotUsers records, without the
+        user's beer_data.json entry ever existing as one dict
+        """
+        user = cls(name, {}, storage = storage)
+        user.loadRecords(records)
+        return user
+
+    @classmethod
+    def fromStore(cls, name, data, store, brewery_beer_ids, storage = None):
+        """
+        Build a user over an already filled BeerStore, e.g. one mapped from a
+        binary snapshot, without re-appending its rows
+
+        data - the user's styles and other fields, without 'breweries'
+        brewery_beer_ids - { brewery_name: [...store beer ids] } in brewery order
+        """
+        user = cls(name, data, storage = storage)
+        user.beer_store = store
+        user.breweries = {}
+        for brewery_name in brewery_beer_ids:
+            brewery = Brewery(brewery_name, store = store)
+            brewery.beer_ids = brewery_beer_ids[brewery_name]
+            user.breweries[brewery_name] = brewery
+
+        for style in user.styles.values():
+            style.store = store
+
+        user._syncStylesWithBreweries(user._groupBeersByStyle())
+        return user
+
+    def loadRecords(self, records):
+        """Load already saved ratings, styles and fields; unlike _save_new_beer, records no events"""
+        raw_styles = self.raw_data.setdefault('styles', [])
+
+        for record in records:
+            if record[0] == BREWERY:
+                if record[1] not in self.breweries:
+                    self.breweries[record[1]] = Brewery(record[1], store = self.beer_store)
+
+            elif record[0] == BEER:
+                beer = record[1]
+                if beer['brewery'] not in self.breweries:
+                    self.breweries[beer['brewery']] = Brewery(beer['brewery'], store = self.beer_store)
+
+                self.breweries[beer['brewery']].addNewBeer(beer['name'], beer['style'], beer['rating'], beer.get('rated_at'))
+
+            elif record[0] == STYLE:
+                if record[1] not in self.styles:
+                    self.styles[record[1]] = Style(record[1], store = self.beer_store)
+                    raw_styles.append(record[1])
+
+            elif record[0] == FIELD:
+                self.raw_data[record[1]] = record[2]
+
+        # Tagging skips beers a style already has, so loading in several steps is fine
+        self._syncStylesWithBreweries(self._groupBeersByStyle())
+        self._style_stats = None
+        self._search_indexes = None
+        self._beer_search_indexes = {}
+
+    @property
+    def style_stats(self):
+        if self._style_stats is None:
+            self._style_stats = StyleStatsStore(half_life = self.rater.getRecencyHalfLife())
+            self._buildStyleStats(self._groupRowsByStyle())
+
+        return self._style_stats
+
+    @property
+    def search_indexes(self):
+        """{ 'breweries' | 'styles': NameSearchIndex }, kept up to date as the user rates"""
+        if self._search_indexes is None:
+            self._search_indexes = {
+                'breweries': NameSearchIndex(self.breweries),
+                'styles': NameSearchIndex(self.styles)
+            }
+
+        return self._search_indexes
+
+    def getBeerSearchIndex(self, brewery_name):
+        """NameSearchIndex of the beers rated from one brewery, kept up to date as the user rates"""
+        if brewery_name not in self._beer_search_indexes:
+            store = self.beer_store
+            self._beer_search_indexes[brewery_name] = NameSearchIndex(
+                store.getName(store.getLatestRow(beer_id)) for beer_id in self.breweries[brewery_name].beer_ids
+            )
+
+        return self._beer_search_indexes[brewery_name]
+
+    def _groupRowsByStyle(self):
+        """{ style_name: store rows } in rating order"""
+        store = self.beer_store
+        rows_by_style_id = store.groupRowsByStyleId()
+
+        return {
+            store.style_names.getName(style_id): rows_by_style_id[style_id]
+            for style_id in rows_by_style_id
+        }
+
+    def _groupBeersByStyle(self):
+        """{ style_name: store beer ids }, each distinct beer once, in rating order"""
+        store = self.beer_store
+        beers_by_style_id = store.groupBeersByStyleId()
+
+        return {
+            store.style_names.getName(style_id): beers_by_style_id[style_id]
+            for style_id in beers_by_style_id
+        }
+
+    @instrumented('User._buildStyleStats')
+    def _buildStyleStats(self, rows_by_style):
+        store = self.beer_store
+        for style_name in rows_by_style:
+            style_rows = rows_by_style[style_name]
+            self._style_stats.addRatings(
+                style_name,
+                [store.getRowBeerId(row) for row in style_rows],
+                [store.getRating(row) for row in style_rows],
+                [store.getRatedAt(row) for row in style_rows]
+            )
+
+    def setRecencyWeighting(self, enabled, half_life_days = None):
+        """Switch re-rated beers between a plain and a recency-weighted average"""
+        self.rater.enable_recency_weighting = enabled
+        if half_life_days is not None:
+            self.rater.recency_half_life = half_life_days
+
+        # Style statistics are rebuilt with the new weighting on next use
+        self._style_stats = None
+
+    def getRatingHistory(self, brewery_name, beer_name):
+        """[(rated_at, rating)...] for one beer, oldest first; rated_at is None for untimestamped ratings"""
+        store = self.beer_store
+        beer_id = store.getBeerId(brewery_name, beer_name)
+        if beer_id is None:
+            return []
+
+        return [(store.getRatedAt(row), store.getRating(row)) for row in store.getBeerRows(beer_id)]
+
+    def _syncStylesWithBreweries(self, beers_by_style):
+        """Tag every stored beer to its style; after loading, styles are kept up to date incrementally"""
+        for style_name in self.styles:
+            if style_name in beers_by_style:
+                self.styles[style_name].tagBeerIds(self.beer_store, beers_by_style[style_name])
+
+    def _backfillStyle(self, style):
+        style_id = self.beer_store.style_names.getId(style.name)
+        if style_id is not None:
+            style.tagBeerIds(self.beer_store, self.beer_store.groupBeersByStyleId().get(style_id, []))
 
     def addNewStyle(self, style_name):
         if style_name not in self.styles:
-            self.styles[style_name] = Style(style_name)
+            self.styles[style_name] = Style(style_name, store = self.beer_store)
+            self._backfillStyle(self.styles[style_name])
+            if self._search_indexes is not None:
+                self._search_indexes['styles'].add(style_name)
+            self._recordEvent({'type': ADD_STYLE, 'style': style_name})
+
+    def popPendingEvents(self):
+        with self.lock:
+            events = self.pending_events
+            self.pending_events = []
+
+        return events
+
+    def restorePendingEvents(self, events):
+        """Put back events a failed save popped, ahead of any made since"""
+        with self.lock:
+            self.pending_events = events + self.pending_events
+
+    def _recordEvent(self, event):
+        with self.lock:
+            self.pending_events.append(event)
+
+        for listener in self.change_listeners:
+            listener(self)
     
     def interactiveAddNewStyle(self, verbose = True):
         adding_styles = True
@@ -51,15 +266,14 @@ class User:
         new_beer_name = getUserInput('What is the name of your beer? ')
         clear_terminal()
 
-        brewery_lst = list(self.breweries.keys()) + ['Add new brewery']
-        brewery_name = getInteractiveMenuResponse('What brewery is it from?', brewery_lst)
+        brewery_name = getSearchMenuResponse('What brewery is it from?', self.search_indexes['breweries'], ['Add new brewery'])
         clear_terminal()
 
         if brewery_name == 'Add new brewery':
             brewery_name = getUserInput('What is the name of the brewery? ')
             clear_terminal()
 
-        style_name = getInteractiveMenuResponse("Select your beer's style from the dropdown below:", list(self.styles.keys()))
+        style_name = getSearchMenuResponse("Select your beer's style from the dropdown below:", self.search_indexes['styles'])
         clear_terminal()
 
         rating = float(getUserInput('Rate your beer out of 10 '))
@@ -71,44 +285,61 @@ class User:
             self.getBreweryRatings()
     
     def interactiveRerateBeer(self, verbose = True):
-        breweries_lst = list(self.breweries.keys())
-        if len(breweries_lst) == 0:
+        if len(self.breweries) == 0:
             print('No beers to rate')
             return
         
-        brewery_name = getInteractiveMenuResponse('Which brewery is the beer from?', breweries_lst)
-        brewery = self.breweries[brewery_name]
+        brewery_name = getSearchMenuResponse('Which brewery is the beer from?', self.search_indexes['breweries'])
         clear_terminal()
 
-        beer_name = getInteractiveMenuResponse('Which beer do you want to rate?', [beer.name for beer in brewery.beers])
-        beer = next((beer for beer in brewery.beers if beer.name == beer_name), None)
+        store = self.beer_store
+        beer_name = getSearchMenuResponse('Which beer do you want to rate?', self.getBeerSearchIndex(brewery_name))
+        beer = Beer.fromRow(store, store.getLatestRow(store.getBeerId(brewery_name, beer_name)))
         clear_terminal()
 
         new_rating = float(getUserInput('Rate your beer (out of 10): '))
         clear_terminal()
 
-        self._save_new_beer(beer.name, brewery_name, beer.style_name, new_rating)
+        self._save_new_beer(beer.name, brewery_name, beer.style_name, new_rating, event_type = RERATE)
 
         if verbose:
             self.getBreweryRatings()
     
     def interactiveSeeRatingsForStyle(self):
-        style_name = getInteractiveMenuResponse('Which style?', list(self.styles.keys()))
-        selected_style = self.styles[style_name]
+        style_name = getSearchMenuResponse('Which style?', self.search_indexes['styles'])
         clear_terminal()
 
-        sorted_list = sorted(selected_style.tagged_beers, key=lambda b: b.rating, reverse = True)
         print(f'Ratings for {style_name}s:\n')
-        for i, beer in enumerate(sorted_list):
-            print(f'{i + 1}. {beer.name} ({beer.brewery_name}) - {beer.rating}')
+        printLines(renderBeerRankings(self.getStyleBeerRankings(style_name)))
 
 
-    def _save_new_beer(self, name, brewery_name, style_name, rating):
+    def _save_new_beer(self, name, brewery_name, style_name, rating, event_type = RATE, rated_at = None):
         if brewery_name not in self.breweries:
-            self.breweries[brewery_name] = Brewery(brewery_name)
+            self.breweries[brewery_name] = Brewery(brewery_name, store = self.beer_store)
         
-        self.breweries[brewery_name].addNewBeer(name, style_name, rating)
-        self._syncStylesWithBreweries()
+        if rated_at is None:
+            rated_at = time.time()
+        beer = self.breweries[brewery_name].addNewBeer(name, style_name, rating, rated_at)
+        if style_name in self.styles:
+            self.styles[style_name].tagBeer(beer)
+
+        # Only the touched style's statistics change
+        if self._style_stats is not None:
+            self._style_stats.addRating(style_name, beer.beer_id, rating, rated_at)
+
+        if self._search_indexes is not None:
+            self._search_indexes['breweries'].add(brewery_name)
+        if brewery_name in self._beer_search_indexes:
+            self._beer_search_indexes[brewery_name].add(name)
+
+        self._recordEvent({
+            'type': event_type,
+            'name': name,
+            'brewery': brewery_name,
+            'style': style_name,
+            'rating': rating,
+            'rated_at': rated_at
+        })
 
     
     def getUpdatedUserData(self):
@@ -120,74 +351,326 @@ class User:
         return self.raw_data
     
     def getBreweryRatings(self):
-        ratings_lists_by_style = self._getRatingsListsByStyle()
+        rated_breweries, unrated_breweries = self.rankBreweries()
+
+        printLines(renderBreweryRankings(self._breweryRankings(rated_breweries)))
+        
+        return (rated_breweries, unrated_breweries)
+
+    def getBreweryRankings(self, offset = 0, limit = None, rating_threshold = 2):
+        """One page of rated breweries, best first, as BreweryRanking tuples"""
+        if limit is not None:
+            top_breweries = self.topBreweries(offset + limit, rating_threshold = rating_threshold)
+            return self._breweryRankings(top_breweries[offset:], start = offset)
+
+        rated_breweries, _ = self.rankBreweries(rating_threshold = rating_threshold)
+        return self._breweryRankings(paginate(rated_breweries, offset, limit), start = offset)
+
+    def _breweryRankings(self, breweries, start = 0):
+        return [
+            BreweryRanking(
+                start + i + 1, brewery.name, float(brewery.score), len(brewery.beer_ids),
+                float(brewery.confidence_interval[0]), float(brewery.confidence_interval[1])
+            )
+            for i, brewery in enumerate(breweries)
+        ]
+
+    @instrumented('User.rankBreweries')
+    def rankBreweries(self, rating_threshold = 2):
+        """
+        Score every brewery in a single pass. Global context and style means are
+        computed once, each style's beers are scaled in one vectorized batch, and
+        brewery weighted scores are reduced with np.bincount over brewery indices.
+        Each distinct beer counts once, with the mean of its ratings. Beers of
+        breweries below rating_threshold are never scaled.
+
+        Returns (rated_breweries sorted by score, unrated_breweries)
+        """
+        brewery_names, brewery_indices, beer_counts = self._getBreweryIndices()
+        eligible_beers = np.flatnonzero(beer_counts[brewery_indices] >= rating_threshold)
+
+        totals = self._scoreBeers(eligible_beers, brewery_indices, len(brewery_names), self._getScalingContext())
+        self._setBreweryScores(brewery_names, totals, np.arange(len(brewery_names)))
 
         rated_breweries = []
         unrated_breweries = []
-        for brewery_name in self.breweries:
+        for brewery_name in brewery_names:
             brewery = self.breweries[brewery_name]
-            brewery.generateScore(ratings_lists_by_style)
 
             if brewery.score is None:
                 unrated_breweries.append(brewery)
             else:
                 rated_breweries.append(brewery)
-        
+
         rated_breweries.sort(key=lambda b: b.score, reverse = True)
 
-        for i in range(len(rated_breweries)):
-            print(f'{i + 1}. {rated_breweries[i].getRatingString()}')
-        
         return (rated_breweries, unrated_breweries)
-    
-    def getStyleRatings(self, verbose = True, cardinality_threshold = 3):
-        ratings_by_style = self._getRatingsListsByStyle()
-        
-        style_ratings = []
-        for style_name in ratings_by_style:
-            num_beers_for_style = len(ratings_by_style[style_name])
 
-            if num_beers_for_style > 0:
-                style_ratings.append((
-                    style_name, round(np.mean(ratings_by_style[style_name]), 2), num_beers_for_style
-                ))
+    @instrumented('User.topBreweries')
+    def topBreweries(self, k, rating_threshold = 2):
+        """
+        The k best rated breweries, the same as rankBreweries()[0][:k] down to
+        the order of ties, without scoring or sorting the rest.
 
-        sorted_ratings = sorted(style_ratings, key=lambda tup: tup[1], reverse=True)
+        Breweries are scored k at a time in decreasing order of an upper bound
+        on their score (BeerRater.getMaxScaledRatings). Once the next bound is
+        below the k-th best score so far, no unscored brewery can make the cut.
+        """
+        if k <= 0:
+            return []
 
-        print('Rankings:')
-        
-        low_cardinality_styles = []
-        high_cardinality_rank = 1
-        for tup in sorted_ratings:
-            style, rating, count = tup
-            
-            if count >= cardinality_threshold:
-                print(f'{high_cardinality_rank}. {style} - {rating} ({count})')
-                high_cardinality_rank += 1
+        brewery_names, brewery_indices, beer_counts = self._getBreweryIndices()
+        num_breweries = len(brewery_names)
+        context = self._getScalingContext()
+        store = self.beer_store
+
+        eligible_beers = np.flatnonzero(beer_counts[brewery_indices] >= rating_threshold)
+        style_means = np.array([
+            context['style_stats'][style_name].getMean() for style_name in store.style_names.names
+        ])
+        beer_style_ids = store.getStyleIds()[store.getLatestRows()[eligible_beers]]
+        beer_weights = style_means[beer_style_ids] if len(eligible_beers) > 0 else np.zeros(0)
+        bound_numerators = np.bincount(
+            brewery_indices[eligible_beers],
+            weights = context['rater'].getMaxScaledRatings(self._getBeerRatings(eligible_beers)) * beer_weights,
+            minlength = num_breweries
+        )
+        bound_denominators = np.bincount(brewery_indices[eligible_beers], weights = beer_weights, minlength = num_breweries)
+
+        candidates = np.flatnonzero(bound_denominators > 0)
+        upper_bounds = np.round(bound_numerators[candidates] / bound_denominators[candidates], 2)
+        candidates = candidates[np.argsort(-upper_bounds, kind = 'stable')]
+        upper_bounds = np.sort(upper_bounds)[::-1]
+
+        totals = tuple(np.zeros(num_breweries) for _ in range(4))
+        scores = np.full(num_breweries, -np.inf)
+        position = 0
+        while position < len(candidates):
+            scored = scores[np.isfinite(scores)]
+            if len(scored) >= k and upper_bounds[position] < np.partition(scored, len(scored) - k)[len(scored) - k]:
+                break
+
+            batch = candidates[position:position + max(k, 1)]
+            position += len(batch)
+
+            # Each batch only touches its own breweries' bins
+            beer_ids = [beer_id for brewery_index in batch for beer_id in self.breweries[brewery_names[brewery_index]].beer_ids]
+            batch_totals = self._scoreBeers(beer_ids, brewery_indices, num_breweries, context)
+            totals = tuple(total + batch_total for total, batch_total in zip(totals, batch_totals))
+            scores[batch] = np.round(totals[0][batch] / totals[1][batch], 2)
+
+        scored = np.flatnonzero(np.isfinite(scores))
+        top = scored[selectTop(scores[scored], k)]
+
+        self._setBreweryScores(brewery_names, totals, top)
+        return [self.breweries[brewery_names[brewery_index]] for brewery_index in top]
+
+    def _getBreweryIndices(self):
+        """(brewery names, brewery index of every store beer id, distinct beer count per brewery)"""
+        brewery_names = list(self.breweries.keys())
+        brewery_indices = np.zeros(self.beer_store.countBeers(), dtype = int)
+        for brewery_index, brewery_name in enumerate(brewery_names):
+            brewery_indices[self.breweries[brewery_name].beer_ids] = brewery_index
+
+        beer_counts = np.bincount(brewery_indices, minlength = len(brewery_names))
+        return (brewery_names, brewery_indices, beer_counts)
+
+    def _getScalingContext(self):
+        """
+        Everything scaling needs that is shared by every style. Covers the
+        user's styles and any other style a stored rating is tagged with, so
+        ratings saved under a style missing from the list still rank.
+        """
+        style_names = list(self.styles) + [
+            style_name for style_name in self.beer_store.style_names.names if style_name not in self.styles
+        ]
+        ratings_lists_by_style = self._getRatingsListsByStyle(style_names)
+        all_user_ratings = [rating for style_name in ratings_lists_by_style for rating in ratings_lists_by_style[style_name]]
+
+        return {
+            'ratings_lists_by_style': ratings_lists_by_style,
+            'style_stats': self._getStatsByStyle(style_names),
+            'all_user_ratings': all_user_ratings,
+            'global_mean': np.mean(all_user_ratings) if len(all_user_ratings) > 0 else None,
+            'rater': self.rater
+        }
+
+    @instrumented('User._scoreBeers')
+    def _scoreBeers(self, beer_ids, brewery_indices, num_breweries, context):
+        """
+        Scale the mean rating of the given store beers style by style and
+        reduce them per brewery. A beer's style is that of its latest rating,
+        which is also where its scaled rating is stored.
+
+        Returns style-weighted sums per brewery of (scaled ratings, style
+        weights, lower confidence bounds, upper confidence bounds)
+        """
+        store = self.beer_store
+        beer_ids = np.asarray(beer_ids, dtype = int)
+        rows = store.getLatestRows()[beer_ids]
+        style_ids = store.getStyleIds()[rows]
+        ratings = self._getBeerRatings(beer_ids)
+
+        scaled_ratings = np.zeros(len(rows))
+        lower_bounds = np.zeros(len(rows))
+        upper_bounds = np.zeros(len(rows))
+        style_weights = np.zeros(len(rows))
+
+        for style_id in np.unique(style_ids):
+            style_name = store.style_names.getName(style_id)
+            in_style = style_ids == style_id
+            stats = context['style_stats'][style_name]
+
+            scaled_ratings[in_style], metadata = self.score_cache.scale(
+                ratings[in_style],
+                stats,
+                context['ratings_lists_by_style'][style_name],
+                all_user_ratings = context['all_user_ratings'],
+                global_mean = context['global_mean'],
+                rater = context['rater']
+            )
+            lower_bounds[in_style] = metadata.confidence_lower
+            upper_bounds[in_style] = metadata.confidence_upper
+            style_weights[in_style] = stats.getMean()
+
+        store.getScaledRatings()[rows] = scaled_ratings
+
+        beer_breweries = brewery_indices[beer_ids]
+        return (
+            np.bincount(beer_breweries, weights = scaled_ratings * style_weights, minlength = num_breweries),
+            np.bincount(beer_breweries, weights = style_weights, minlength = num_breweries),
+            np.bincount(beer_breweries, weights = lower_bounds * style_weights, minlength = num_breweries),
+            np.bincount(beer_breweries, weights = upper_bounds * style_weights, minlength = num_breweries)
+        )
+
+    def _getBeerRatings(self, beer_ids, style_name = None):
+        """
+        The rating each beer is scored by: the mean of its ratings, or with
+        recency weighting on, the recency-weighted mean its style's StyleStats
+        holds. The style is style_name, or else that of each beer's latest rating.
+        """
+        store = self.beer_store
+        beer_ids = np.asarray(beer_ids, dtype = int)
+        if self.rater.getRecencyHalfLife() is None:
+            return store.getAverageRatings()[beer_ids]
+
+        style_stats = self.style_stats
+        return np.array([
+            style_stats.getStats(style_name if style_name is not None else store.getStyleName(store.getLatestRow(beer_id))).getBeerRating(beer_id)
+            for beer_id in beer_ids.tolist()
+        ], dtype = float)
+
+    def _setBreweryScores(self, brewery_names, totals, brewery_indices):
+        numerators, denominators, lower_numerators, upper_numerators = totals
+
+        for brewery_index in brewery_indices:
+            brewery = self.breweries[brewery_names[brewery_index]]
+
+            if denominators[brewery_index] == 0:
+                brewery.score = None
+                brewery.confidence_interval = None
             else:
-                low_cardinality_styles.append(tup)
+                brewery.score = round(numerators[brewery_index] / denominators[brewery_index], 2)
+                brewery.confidence_interval = (
+                    round(lower_numerators[brewery_index] / denominators[brewery_index], 2),
+                    round(upper_numerators[brewery_index] / denominators[brewery_index], 2)
+                )
     
-        print('\n\nRankings for styles with too few ratings:')
+    def getStyleRatings(self, verbose = True, cardinality_threshold = 3):
+        ranked_styles, low_cardinality_styles = self.rankStyles(cardinality_threshold = cardinality_threshold)
 
-        for i in range(len(low_cardinality_styles)):
-            style, rating, count = low_cardinality_styles[i]
-            print(f'{i + 1}. {style} - {rating} ({count})')
+        print('Rankings:')
+        printLines(renderStyleRankings(self._styleRankings(ranked_styles)))
     
-    def _getRatingsListsByStyle(self):
-        style_ratings_lists = {}
-        
-        for style_name in self.styles:
-            style_beer_rating_arrays = {}
-            
-            for beer in self.styles[style_name].tagged_beers:
-                if beer.name in style_beer_rating_arrays:
-                    style_beer_rating_arrays[beer.name].append(beer.rating)
-                else:
-                    style_beer_rating_arrays[beer.name] = [beer.rating]
-
-            style_ratings_lists[style_name] = [
-                np.mean(style_beer_rating_arrays[beer_name])
-                for beer_name in style_beer_rating_arrays
+        print('\n\nRankings for styles with too few ratings:')
+        printLines(renderStyleRankings(self._styleRankings(low_cardinality_styles)))
+
+    def getStyleRankings(self, offset = 0, limit = None, cardinality_threshold = 3, low_cardinality = False):
+        """
+        One page of styles, best first, as StyleRanking tuples. low_cardinality
+        selects the styles with fewer than cardinality_threshold beers instead
+        """
+        if limit is not None:
+            styles = self.topStyles(offset + limit, cardinality_threshold = cardinality_threshold, low_cardinality = low_cardinality)
+            return self._styleRankings(styles[offset:], start = offset)
+
+        ranked_styles, low_cardinality_styles = self.rankStyles(cardinality_threshold = cardinality_threshold)
+        styles = low_cardinality_styles if low_cardinality else ranked_styles
+        return self._styleRankings(paginate(styles, offset, limit), start = offset)
+
+    def _styleRankings(self, styles, start = 0):
+        return [
+            StyleRanking(start + i + 1, style_name, float(rating), count)
+            for i, (style_name, rating, count) in enumerate(styles)
+        ]
+
+    def getStyleBeerRankings(self, style_name, offset = 0, limit = None):
+        """One page of the beers tagged to style_name, highest rated first, as BeerRanking tuples"""
+        if self.storage is not None and self.storage.supports_queries and len(self.pending_events) == 0:
+            beers = self.storage.getStyleBeers(self.name, style_name, offset = offset, limit = limit, half_life = self.rater.getRecencyHalfLife())
+            return [
+                BeerRanking(offset + i + 1, beer['name'], beer['brewery'], beer['rating'])
+                for i, beer in enumerate(beers)
             ]
 
-        return style_ratings_lists
+        # One entry per distinct beer, ranked by the mean of its ratings
+        store = self.beer_store
+        tagged_beer_ids = self.styles[style_name].tagged_beer_ids
+        ratings = dict(zip(tagged_beer_ids, self._getBeerRatings(tagged_beer_ids, style_name).tolist()))
+        beer_ids = sorted(tagged_beer_ids, key=ratings.get, reverse = True)
+        page = paginate(beer_ids, offset, limit)
+        return [
+            BeerRanking(offset + i + 1, store.getName(row), store.getBreweryName(row), ratings[beer_id])
+            for i, (beer_id, row) in enumerate(zip(page, map(store.getLatestRow, page)))
+        ]
+
+    @instrumented('User.rankStyles')
+    def rankStyles(self, cardinality_threshold = 3):
+        """
+        Returns (ranked_styles, low_cardinality_styles), each a list of
+        (style_name, mean rating, beer count) sorted by rating
+        """
+        sorted_ratings = sorted(self._getStyleMeans(), key=lambda tup: tup[1], reverse=True)
+
+        ranked_styles = [tup for tup in sorted_ratings if tup[2] >= cardinality_threshold]
+        low_cardinality_styles = [tup for tup in sorted_ratings if tup[2] < cardinality_threshold]
+        return (ranked_styles, low_cardinality_styles)
+
+    def topStyles(self, k, cardinality_threshold = 3, low_cardinality = False):
+        """The first k of rankStyles' ranked (or low cardinality) styles, selected with a heap"""
+        style_means = [
+            tup for tup in self._getStyleMeans()
+            if (tup[2] < cardinality_threshold) == low_cardinality
+        ]
+
+        # Ties keep style order, as in the stable sort of rankStyles
+        top = heapq.nsmallest(k, enumerate(style_means), key=lambda item: (-item[1][1], item[0]))
+        return [tup for _, tup in top]
+
+    def _getStyleMeans(self):
+        """(style_name, mean rating, beer count) for every style with ratings"""
+        style_stats = self._getStatsByStyle()
+        
+        style_means = []
+        for style_name in style_stats:
+            num_beers_for_style = len(style_stats[style_name])
+
+            if num_beers_for_style > 0:
+                style_means.append((
+                    style_name, np.round(style_stats[style_name].getMean(), 2), num_beers_for_style
+                ))
+
+        return style_means
+    
+    @instrumented('User._getRatingsListsByStyle')
+    def _getRatingsListsByStyle(self, style_names = None):
+        return {
+            style_name: self.style_stats.getRatings(style_name)
+            for style_name in (style_names if style_names is not None else self.styles)
+        }
+
+    def _getStatsByStyle(self, style_names = None):
+        return {
+            style_name: self.style_stats.getStats(style_name)
+            for style_name in (style_names if style_names is not None else self.styles)
+        }
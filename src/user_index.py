@@ -0,0 +1,144 @@
+import json
+import os
+import uuid
+
+INDEX_PATH = 'data/beer_data.index'
+
+class UserIndex:
+    """
+    Sidecar index of where each user's entry sits inside the beer_data.json
+    snapshot ({ user_name: [byte offset, byte length] }), so the user list can
+    be read and a single user deserialized without parsing everyone else.
+
+    The index records the snapshot's size and mtime; if the snapshot was changed
+    behind its back (e.g. edited by hand) the index is rebuilt from a full scan.
+    """
+    def __init__(self, snapshot_path, path = INDEX_PATH):
+        self.snapshot_path = snapshot_path
+        self.path = path
+        self._users = None
+
+    def getUserNames(self):
+        return list(self._getUsers().keys())
+
+    def readUser(self, user_name):
+        """Deserialize one user's snapshot entry, or None if they are not in it"""
+        users = self._getUsers()
+        if user_name not in users:
+            return None
+
+        offset, length = users[user_name]
+        with open(self.snapshot_path, 'rb') as f:
+            f.seek(offset)
+            return json.loads(f.read(length))
+
+    def write(self, users):
+        """Atomically save offsets for the snapshot that was just written"""
+        index = dict(self._snapshotSignature(), users = users)
+
+        # Readers rebuild a stale index too, so each writer needs its own temporary file
+        tmp_path = f'{self.path}.{uuid.uuid4().hex}.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(index, f)
+            f.flush()
+            os.fsync(f.fileno())
+
+        os.replace(tmp_path, self.path)
+        self._users = users
+
+    def _getUsers(self):
+        if self._users is None:
+            self._users = self._load()
+
+        return self._users
+
+    def _load(self):
+        if not os.path.exists(self.snapshot_path):
+            return {}
+
+        if os.path.exists(self.path):
+            with open(self.path) as f:
+                index = json.load(f)
+
+            signature = self._snapshotSignature()
+            if all(index.get(key) == signature[key] for key in signature):
+                return index['users']
+
+        users = self._scanSnapshot()
+        self.write(users)
+        return users
+
+    def _snapshotSignature(self):
+        stat = os.stat(self.snapshot_path)
+        return {'snapshot_size': stat.st_size, 'snapshot_mtime_ns': stat.st_mtime_ns}
+
+    def _scanSnapshot(self):
+        """Find each top-level user entry's byte span with a single pass over the file"""
+        with open(self.snapshot_path, 'rb') as f:
+            raw = f.read()
+
+        text = raw.decode('utf-8')
+        decoder = json.JSONDecoder()
+
+        users = {}
+        position = self._skipWhitespace(text, 0)
+        if text[position] != '{':
+            raise ValueError(f'{self.snapshot_path} is not a JSON object')
+        position = self._skipWhitespace(text, position + 1)
+
+        # Offsets are in bytes; only encode the stretch since the last entry
+        char_mark = position
+        byte_mark = len(text[:position].encode('utf-8'))
+        while text[position] != '}':
+            user_name, position = decoder.raw_decode(text, position)
+            position = self._skipWhitespace(text, position)
+            position = self._skipWhitespace(text, position + 1)  # ':'
+
+            _, end = decoder.raw_decode(text, position)
+
+            byte_start = byte_mark + len(text[char_mark:position].encode('utf-8'))
+            byte_length = len(text[position:end].encode('utf-8'))
+            users[user_name] = [byte_start, byte_length]
+
+            char_mark = end
+            byte_mark = byte_start + byte_length
+
+            position = self._skipWhitespace(text, end)
+            if text[position] == ',':
+                position = self._skipWhitespace(text, position + 1)
+
+        return users
+
+    def _skipWhitespace(self, text, position):
+        while text[position] in ' \t\n\r':
+            position += 1
+
+        return position
+
+
+def dumpSnapshot(entries, f):
+    """
+    Write (user_name, user_data) entries as one JSON object (byte-for-byte what
+    json.dump of the equivalent dict produces) and return each user's
+    [offset, length] within the written bytes. entries may be a generator, so
+    only one user needs to be in memory at a time.
+    """
+    users = {}
+    offset = 0
+
+    def write(chunk):
+        nonlocal offset
+        encoded = chunk.encode('utf-8')
+        f.write(encoded)
+        offset += len(encoded)
+
+    write('{')
+    for i, (user_name, user_data) in enumerate(entries):
+        write((', ' if i > 0 else '') + json.dumps(user_name) + ': ')
+
+        start = offset
+        write(json.dumps(user_data))
+        users[user_name] = [start, offset - start]
+    write('}')
+
+    return users
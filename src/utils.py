@@ -1,30 +1,165 @@
 import os
-from simple_term_menu import TerminalMenu
-import json
+import uuid
+
+from src.journal import RatingsJournal, applyEvents
+from src.stream import iterSnapshotEntries
+from src.user_index import UserIndex, dumpSnapshot
+from src.profiling import instrumented
+
+DATA_PATH = 'data/beer_data.json'
+
+# Pickers with more names than this ask what to search for instead of listing them all
+SEARCH_PAGE_SIZE = 15
+
+MORE_MATCHES = '[More matches]'
+SEARCH_AGAIN = '[Search again]'
 
 def getUserInput(prompt):
     return input(prompt).strip()
 
 def getInteractiveMenuResponse(title, options):
+    # Imported here so headless commands never load the terminal UI
+    from simple_term_menu import TerminalMenu
+
     print(title)
     menu = TerminalMenu(options)
     return options[menu.show()]
 
+def getSearchMenuResponse(title, search_index, extra_options = [], page_size = SEARCH_PAGE_SIZE):
+    """
+    Pick a name from a search.NameSearchIndex. Short lists are shown whole;
+    longer ones ask for part of a name and page through the best matches, so
+    the menu only ever renders one page.
+    """
+    names = search_index.search('', limit = page_size + 1)
+    if len(names) <= page_size:
+        return getInteractiveMenuResponse(title, names + extra_options)
+
+    while True:
+        query = getUserInput(f'{title} (type part of the name) ')
+
+        offset = 0
+        while True:
+            matches = search_index.search(query, offset = offset, limit = page_size + 1)
+            options = matches[:page_size] + ([MORE_MATCHES] if len(matches) > page_size else []) + [SEARCH_AGAIN] + extra_options
+
+            response = getInteractiveMenuResponse(title, options)
+            if response != MORE_MATCHES:
+                break
+
+            offset += page_size
+
+        if response != SEARCH_AGAIN:
+            return response
+
+def fileSignature(path):
+    """(mtime_ns, size) of path, or None if it does not exist"""
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+
+    return (stat.st_mtime_ns, stat.st_size)
+
 def clear_terminal():
     os.system('cls' if os.name == 'nt' else 'clear')
 
+@instrumented('open_beer_data')
 def open_beer_data():
-    try:
-        f = open('data/beer_data.json')
-        data = json.load(f)
-        f.close()
+    """
+    Every user's data, with journaled changes applied. A missing snapshot means
+    no users yet; a malformed one raises rather than being mistaken for empty,
+    which would let the next save erase it.
+    """
+    if not os.path.exists(DATA_PATH):
+        return RatingsJournal().replay({})
 
-        return data
+    return RatingsJournal().replay(dict(iterSnapshotEntries(DATA_PATH)))
 
-    except:
-        return {}
+def open_user_names():
+    """Names of every saved user, read from the snapshot index without parsing their data"""
+    user_names = UserIndex(DATA_PATH).getUserNames()
+    return user_names + [name for name in RatingsJournal().getUserNames() if name not in user_names]
 
+@instrumented('open_user_data')
+def open_user_data(user_name):
+    """Load a single user's entry from the snapshot, with their journaled changes applied"""
+    user_data = UserIndex(DATA_PATH).readUser(user_name)
+    if user_data is None:
+        user_data = {}
+
+    return RatingsJournal().replayUser(user_name, user_data)
+
+@instrumented('saveFile')
 def saveFile(data):
-    f = open('data/beer_data.json', 'w')
-    json.dump(data, f)
-    f.close()
\ No newline at end of file
+    """
+    Atomically write a fresh snapshot and its index holding exactly data. The
+    journal up to now is dropped with it; events journaled while the snapshot
+    is written are kept.
+    """
+    journal = RatingsJournal()
+    with journal.compacting():
+        journal.rotate()
+        saveEntries(data.items())
+        journal.discardRotated()
+
+def saveEntries(entries):
+    """Atomically write a snapshot and its index from a stream of (user_name, user_data) entries"""
+    # A temporary file per writer, so two writers never interleave in one
+    tmp_path = f'{DATA_PATH}.{uuid.uuid4().hex}.tmp'
+    with open(tmp_path, 'wb') as f:
+        user_offsets = dumpSnapshot(entries, f)
+        f.flush()
+        os.fsync(f.fileno())
+
+    os.replace(tmp_path, DATA_PATH)
+    UserIndex(DATA_PATH).write(user_offsets)
+
+@instrumented('saveUserChanges')
+def saveUserChanges(user):
+    """
+    Append the user's pending events to the journal, compacting everything into
+    a new snapshot once the journal has grown large
+    """
+    saveUserEvents(user, user.popPendingEvents())
+
+def saveUserEvents(user, events):
+    """saveUserChanges for events already taken from the user"""
+    journal = RatingsJournal()
+
+    # Only journal_seq is read and advanced, so the user's ratings are never re-serialized here
+    journal.appendMany({user.name: user.raw_data}, user.name, events, folded_seq = lambda: snapshotJournalSeq(user.name))
+
+    if journal.shouldCompact():
+        compactSnapshot()
+
+def snapshotJournalSeq(user_name):
+    """The last journal sequence folded into user_name's snapshot entry"""
+    user_data = UserIndex(DATA_PATH).readUser(user_name)
+    return user_data.get('journal_seq', 0) if user_data is not None else 0
+
+@instrumented('compactSnapshot')
+def compactSnapshot():
+    """
+    Fold the journal into a new snapshot, reading and writing one user at a
+    time. Events journaled while it runs go to a fresh journal and are kept;
+    other processes compacting wait their turn.
+    """
+    journal = RatingsJournal()
+    with journal.compacting():
+        _compactSnapshot(journal)
+
+def _compactSnapshot(journal):
+    events_by_user = journal.rotate()
+
+    def entries():
+        if os.path.exists(DATA_PATH):
+            for user_name, user_data in iterSnapshotEntries(DATA_PATH):
+                yield user_name, applyEvents(user_data, events_by_user.pop(user_name, []))
+
+        # Users who have only ever been journaled
+        for user_name in events_by_user:
+            yield user_name, applyEvents({}, events_by_user[user_name])
+
+    saveEntries(entries())
+    journal.discardRotated()
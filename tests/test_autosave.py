@@ -0,0 +1,71 @@
+import time
+
+import pytest
+
+from src.autosave import AutoSaver
+
+class FakeUser:
+    name = 'Sam'
+
+    def __init__(self):
+        self.change_listeners = []
+        self.pending_events = []
+
+    def popPendingEvents(self):
+        events = self.pending_events
+        self.pending_events = []
+        return events
+
+    def restorePendingEvents(self, events):
+        self.pending_events = events + self.pending_events
+
+
+class FlakyStorage:
+    """Raises on the first `failures` saves, then saves normally"""
+    def __init__(self, failures):
+        self.failures = failures
+        self.attempts = 0
+        self.saved = []
+
+    def saveEvents(self, user, events):
+        self.attempts += 1
+        if self.attempts <= self.failures:
+            raise OSError('disk full')
+
+        self.saved += events
+
+
+def waitFor(condition, timeout = 5.0):
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+def test_a_failed_save_is_retried_and_forgotten_once_it_succeeds():
+    user = FakeUser()
+    storage = FlakyStorage(failures = 1)
+    saver = AutoSaver(storage, user, delay = 0.01)
+
+    user.pending_events.append({'type': 'rate'})
+    saver.markDirty()
+    waitFor(lambda: saver.saves == 1)
+
+    assert storage.attempts == 2
+    assert storage.saved == [{'type': 'rate'}]
+    assert saver.error is None
+
+    # Nothing is left to report once the retry has saved everything
+    saver.close()
+
+def test_a_failure_not_yet_recovered_from_is_raised_by_close():
+    user = FakeUser()
+    storage = FlakyStorage(failures = 100)
+    saver = AutoSaver(storage, user, delay = 0.01)
+
+    user.pending_events.append({'type': 'rate'})
+    saver.markDirty()
+    waitFor(lambda: storage.attempts >= 1)
+
+    with pytest.raises(OSError):
+        saver.close()
+
+    assert user.pending_events == [{'type': 'rate'}]
@@ -0,0 +1,67 @@
+from src import batch
+from src.batch import CHUNKS_AHEAD_PER_WORKER, rankAllUsers, rankUser
+
+def userData(index):
+    breweries = {}
+    for i in range(8):
+        beer = {'name': f'Beer {i}', 'brewery': f'Brewery {i % 3}', 'style': f'Style {i % 2}', 'rating': 5.0 + (index + i) % 5}
+        breweries.setdefault(beer['brewery'], []).append(beer)
+
+    return {'styles': ['Style 0', 'Style 1'], 'breweries': breweries}
+
+
+class CountingStorage:
+    """Users built on demand, counting how many have been loaded"""
+    def __init__(self, count):
+        self.user_names = [f'User {i}' for i in range(count)]
+        self.loaded = 0
+
+    def getUserNames(self):
+        return list(self.user_names)
+
+    def loadUser(self, user_name):
+        self.loaded += 1
+        return userData(self.user_names.index(user_name))
+
+
+class InlineExecutor:
+    """Runs each chunk when its result is asked for, recording how many users were loaded by then"""
+    def __init__(self, storage, max_workers = None):
+        self.storage = storage
+        self.loaded_when_collected = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+    def submit(self, function, chunk):
+        executor = self
+
+        class Future:
+            def result(self):
+                executor.loaded_when_collected.append(executor.storage.loaded)
+                return function(chunk)
+
+        return Future()
+
+
+def test_results_match_ranking_each_user_in_order():
+    storage = CountingStorage(12)
+    results = rankAllUsers(storage, workers = 2, chunksize = 2)
+
+    assert [result['user'] for result in results] == storage.user_names
+    assert results == [rankUser(name, userData(i)) for i, name in enumerate(storage.user_names)]
+
+def test_users_are_loaded_in_a_bounded_window(monkeypatch):
+    storage = CountingStorage(40)
+    executor = InlineExecutor(storage)
+    monkeypatch.setattr(batch, 'ProcessPoolExecutor', lambda max_workers: executor)
+
+    results = rankAllUsers(storage, workers = 2, chunksize = 3)
+    assert [result['user'] for result in results] == storage.user_names
+
+    # Users loaded but not yet ranked never exceed the window of chunks in flight
+    window = 2 * (1 + CHUNKS_AHEAD_PER_WORKER) * 3
+    assert max(loaded - 3 * collected for collected, loaded in enumerate(executor.loaded_when_collected)) <= window
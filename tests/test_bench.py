@@ -0,0 +1,34 @@
+from bench.generate import generateDataset
+from bench.run import benchmarkSize, compareToBaseline
+
+def test_datasets_are_reproducible_and_sized_as_asked():
+    data = generateDataset(ratings = 1001, users = 3, breweries = 15, styles = 5, seed = 4)
+    assert data == generateDataset(ratings = 1001, users = 3, breweries = 15, styles = 5, seed = 4)
+    assert data != generateDataset(ratings = 1001, users = 3, breweries = 15, styles = 5, seed = 5)
+
+    assert list(data) == ['User 0', 'User 1', 'User 2']
+    assert [sum(len(beers) for beers in user_data['breweries'].values()) for user_data in data.values()] == [334, 334, 333]
+
+    for user_data in data.values():
+        assert user_data['styles'] == [f'Style {i}' for i in range(5)]
+        for brewery_name, beers in user_data['breweries'].items():
+            for beer in beers:
+                assert set(beer) == {'name', 'brewery', 'style', 'rating'}
+                assert beer['brewery'] == brewery_name
+                assert beer['style'] in user_data['styles']
+                assert 1 <= beer['rating'] <= 10
+
+    # Some beers are rated more than once
+    beers = [(beer['brewery'], beer['name']) for beers in data['User 0']['breweries'].values() for beer in beers]
+    assert len(set(beers)) < len(beers)
+
+def test_every_phase_is_measured_and_compared(capsys):
+    results = {'100': benchmarkSize(100, users = 2, seed = 0)}
+    for phase, result in results['100'].items():
+        assert result['seconds'] >= 0 and result['peak_mb'] >= 0, phase
+
+    assert {'load_all', 'rate', 'rerate', 'rank_breweries', 'top_breweries', 'recommend'} <= set(results['100'])
+
+    slower = {'100': {phase: dict(result, seconds = result['seconds'] * 2 + 1) for phase, result in results['100'].items()}}
+    assert compareToBaseline(results, slower) == []
+    assert compareToBaseline(slower, results) == [('100', phase) for phase in results['100']]
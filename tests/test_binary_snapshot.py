@@ -0,0 +1,63 @@
+import json
+
+from src.binary_snapshot import BinarySnapshot, BinaryStorage, binaryToJson, compactBinarySnapshot, jsonToBinary
+from src.storage import JsonStorage
+from src.utils import compactSnapshot
+
+def test_round_trip_keeps_int_and_null_fields(tmp_path):
+    data = {
+        'Sam': {
+            'styles': ['IPA', 'Stout'],
+            'breweries': {
+                'Brewery 1': [
+                    {'name': 'A', 'brewery': 'Brewery 1', 'style': 'IPA', 'rating': 7, 'rated_at': 1700000000},
+                    {'name': 'B', 'brewery': 'Brewery 1', 'style': 'IPA', 'rating': 6.5, 'rated_at': 1700000000.25},
+                    {'name': 'C', 'brewery': 'Brewery 1', 'style': 'Stout', 'rating': 8.0, 'rated_at': None}
+                ],
+                'Brewery 2': [
+                    {'name': 'D', 'brewery': 'Brewery 2', 'style': 'Stout', 'rating': 9},
+                    {'name': 'E', 'brewery': 'Brewery 2', 'style': 'IPA', 'rating': 4.0, 'rated_at': 1700000001.0}
+                ]
+            }
+        },
+        'Empty': {}
+    }
+
+    json_path = str(tmp_path / 'beer_data.json')
+    binary_path = str(tmp_path / 'beer_data.npy')
+    with open(json_path, 'w') as f:
+        json.dump(data, f)
+
+    jsonToBinary(json_path, binary_path)
+    assert dict(BinarySnapshot(binary_path).iterEntries()) == data
+
+    beers = BinarySnapshot(binary_path).getUserData('Sam')['breweries']['Brewery 1']
+    assert [type(beer['rating']) for beer in beers] == [int, float, float]
+    assert [type(beer['rated_at']) for beer in beers] == [int, float, type(None)]
+
+    round_trip_path = str(tmp_path / 'round_trip.json')
+    binaryToJson(binary_path, round_trip_path)
+    with open(json_path, 'rb') as original, open(round_trip_path, 'rb') as round_trip:
+        assert round_trip.read() == original.read()
+
+def test_backends_keep_separate_journals(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / 'data').mkdir()
+
+    binary_storage = BinaryStorage()
+    user = binary_storage.openUser('Sam')
+    user._save_new_beer('A', 'Brewery 1', 'IPA', 7.0)
+    binary_storage.saveUserChanges(user)
+
+    json_storage = JsonStorage()
+    user = json_storage.openUser('Sam')
+    user._save_new_beer('B', 'Brewery 1', 'IPA', 6.0)
+    json_storage.saveUserChanges(user)
+
+    # Compacting one backend must not drop what only the other has journaled
+    compactSnapshot()
+    assert [beer['name'] for beer in BinaryStorage().loadUser('Sam')['breweries']['Brewery 1']] == ['A']
+
+    compactBinarySnapshot()
+    assert [beer['name'] for beer in BinaryStorage().loadUser('Sam')['breweries']['Brewery 1']] == ['A']
+    assert [beer['name'] for beer in JsonStorage().loadUser('Sam')['breweries']['Brewery 1']] == ['B']
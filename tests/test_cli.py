@@ -0,0 +1,44 @@
+import json
+
+import cli
+from src.storage import JsonStorage
+from src.user import User
+
+def beer(name, brewery, style, rating):
+    return {'name': name, 'brewery': brewery, 'style': style, 'rating': rating}
+
+USER_DATA = {
+    'styles': ['IPA', 'Stout'],
+    'breweries': {
+        'Brewery 1': [beer('A', 'Brewery 1', 'IPA', 7.0), beer('B', 'Brewery 1', 'Stout', 8.5)],
+        'Brewery 2': [beer('C', 'Brewery 2', 'IPA', 6.0), beer('D', 'Brewery 2', 'Stout', 5.5)]
+    }
+}
+
+def test_import_skips_styles_the_user_does_not_have(tmp_path, monkeypatch, capsys):
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / 'data').mkdir()
+    (tmp_path / 'data' / 'beer_data.json').write_text(json.dumps({'Sam': USER_DATA}))
+    (tmp_path / 'ratings.csv').write_text('name,brewery,style,rating\nE,Brewery 1,Kolsch,9\nF,Brewery 2,IPA,7.5\n')
+
+    cli.main(['import', 'Sam', 'ratings.csv'])
+    assert 'Skipped 1 ratings' in capsys.readouterr().err
+
+    user = JsonStorage().openUser('Sam')
+    assert 'Kolsch' not in user.beer_store.style_names
+    assert user.beer_store.getBeerId('Brewery 2', 'F') is not None
+
+    cli.main(['rank', 'breweries', 'Sam'])
+    cli.main(['rank', 'breweries', 'Sam', '--limit', '1'])
+
+    cli.main(['import', 'Sam', 'ratings.csv', '--add-styles'])
+    assert 'Kolsch' in JsonStorage().openUser('Sam').styles
+
+def test_ratings_of_styles_missing_from_the_list_still_rank():
+    data = json.loads(json.dumps(USER_DATA))
+    data['breweries']['Brewery 1'].append(beer('E', 'Brewery 1', 'Kolsch', 9.0))
+    user = User('Sam', data)
+
+    rated, _ = user.rankBreweries()
+    assert [brewery.name for brewery in rated] == ['Brewery 1', 'Brewery 2']
+    assert [brewery.name for brewery in user.topBreweries(1)] == ['Brewery 1']
@@ -0,0 +1,48 @@
+import multiprocessing
+
+from src.storage import JsonStorage
+from src.utils import compactSnapshot, open_user_data
+
+RATINGS_PER_WRITER = 40
+
+def rateBeers(writer, compact_every):
+    user = JsonStorage().openUser('Sam')
+    for i in range(RATINGS_PER_WRITER):
+        user._save_new_beer(f'Beer {writer}-{i}', f'Brewery {writer}', 'IPA', 7.0)
+        JsonStorage().saveUserChanges(user)
+
+        if compact_every is not None and i % compact_every == compact_every - 1:
+            compactSnapshot()
+
+def runWriters(count, compact_every = None):
+    context = multiprocessing.get_context('fork')
+    writers = [context.Process(target = rateBeers, args = (writer, compact_every)) for writer in range(count)]
+    for process in writers:
+        process.start()
+    for process in writers:
+        process.join()
+        assert process.exitcode == 0
+
+def assertEveryRatingKept(writers):
+    user_data = open_user_data('Sam')
+    names = sorted(beer['name'] for beers in user_data['breweries'].values() for beer in beers)
+    assert names == sorted(f'Beer {writer}-{i}' for writer in range(writers) for i in range(RATINGS_PER_WRITER))
+    assert user_data['journal_seq'] == writers * RATINGS_PER_WRITER
+
+def test_concurrent_writers_never_lose_a_rating(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / 'data').mkdir()
+
+    runWriters(2)
+    assertEveryRatingKept(2)
+
+def test_concurrent_compactions_never_lose_a_rating(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / 'data').mkdir()
+
+    runWriters(3, compact_every = 5)
+    assertEveryRatingKept(3)
+
+    compactSnapshot()
+    assertEveryRatingKept(3)
+    assert list((tmp_path / 'data').glob('*.tmp')) == []
@@ -0,0 +1,21 @@
+from src.memo import ScaledScoreCache
+from src.ratings import BeerRater
+from src.stats import StyleStats
+
+RATINGS = [6.0, 7.5, 8.0, 5.5, 9.0, 7.0]
+
+def test_changing_the_rater_is_not_served_from_the_cache():
+    stats = StyleStats('IPA')
+    stats.addRatings(range(len(RATINGS)), RATINGS)
+    cache = ScaledScoreCache()
+    rater = BeerRater()
+
+    before, _ = cache.scale([9.0], stats, RATINGS, rater = rater)
+    again, _ = cache.scale([9.0], stats, RATINGS, rater = rater)
+    assert again.tolist() == before.tolist()
+    assert cache.hits == 1
+
+    rater.adjustment_strength = 0.1
+    after, _ = cache.scale([9.0], stats, RATINGS, rater = rater)
+    assert after.tolist() == rater.scale_batch([9.0], RATINGS, style_summary = stats.getSummary())[0].tolist()
+    assert after.tolist() != before.tolist()
@@ -0,0 +1,75 @@
+import json
+
+import pytest
+
+from bench.generate import generateDataset
+from src.recommend import RatingMatrix, Recommender
+from src.user import User
+
+def users():
+    data = generateDataset(ratings = 900, users = 6, breweries = 12, styles = 4, beers_per_brewery = 6, seed = 3)
+    return [User(user_name, json.loads(json.dumps(data[user_name]))) for user_name in data]
+
+def fromUsers(users):
+    recommender = Recommender(min_overlap = 2)
+    for user in users:
+        recommender.matrix.syncUser(user)
+
+    recommender.matrix.reindex()
+    return recommender
+
+def predictions(recommender, user_name):
+    beer_indices, predicted, raters = recommender.predictRatings(user_name)
+    beer_keys = recommender.matrix.beer_keys
+    return {beer_keys.getName(beer_index): (rating, rater_count) for beer_index, rating, rater_count in zip(beer_indices.tolist(), predicted.tolist(), raters.tolist())}
+
+def entries(matrix, user_name):
+    beer_indices, means = matrix.getUserEntries(matrix.user_names.getId(user_name))
+    return {matrix.beer_keys.getName(beer_index): mean for beer_index, mean in zip(beer_indices.tolist(), means.tolist())}
+
+def test_watched_ratings_match_a_rebuilt_matrix():
+    all_users = users()
+    user = all_users[0]
+    recommender = fromUsers(all_users)
+    recommender.watch(user)
+
+    # A beer only others have rated, and a re-rating of one the user has
+    untried = next(iter(predictions(recommender, user.name)))
+    brewery_name, name = untried
+    rerated = next(iter(entries(recommender.matrix, user.name)))
+    row = user.beer_store.getLatestRow(user.beer_store.getBeerId(*rerated))
+    rows_before = len(recommender.matrix)
+
+    user._save_new_beer(name, brewery_name, recommender.matrix.beer_styles[recommender.matrix.beer_keys.getId(untried)], 9.5)
+    user._save_new_beer(rerated[1], rerated[0], user.beer_store.getStyleName(row), 1.0)
+
+    # Only the new beer adds an entry; the re-rated one is updated in place
+    assert len(recommender.matrix) == rows_before + 1
+    watched = entries(recommender.matrix, user.name)
+    assert watched[untried] == 9.5
+    assert watched[rerated] == pytest.approx(user.beer_store.getAverageRating(user.beer_store.getBeerId(*rerated)))
+    assert untried not in predictions(recommender, user.name)
+
+    rebuilt = fromUsers(all_users)
+    assert watched == pytest.approx(entries(rebuilt.matrix, user.name))
+
+    watched_predictions = predictions(recommender, user.name)
+    rebuilt_predictions = predictions(rebuilt, user.name)
+    assert watched_predictions.keys() == rebuilt_predictions.keys()
+    for beer_key, (rating, rater_count) in watched_predictions.items():
+        assert rating == pytest.approx(rebuilt_predictions[beer_key][0])
+        assert rater_count == rebuilt_predictions[beer_key][1]
+
+    assert [(r.name, r.brewery) for r in recommender.recommend(user, limit = 5)] == [(r.name, r.brewery) for r in rebuilt.recommend(user, limit = 5)]
+
+def test_a_reloaded_user_is_resynced_in_full():
+    matrix = RatingMatrix()
+    user = users()[1]
+    matrix.syncUser(user)
+    before = entries(matrix, user.name)
+
+    # Same ratings in a new store: nothing changes, nothing is duplicated
+    reloaded = users()[1]
+    matrix.syncUser(reloaded)
+    assert len(matrix) == len(before)
+    assert entries(matrix, user.name) == before
@@ -0,0 +1,48 @@
+from src.search import NameSearchIndex, normalizeName
+from src.user import User
+
+NAMES = ['Pliny the Elder', 'Elder Brother', 'Elderflower Saison', 'Hop Elder', 'Heady Topper', 'Elder']
+
+def test_names_are_folded_for_matching():
+    assert normalizeName('  Brasserie   Dupont-Saison ') == 'brasserie dupont saison'
+    assert normalizeName('Köstritzer') == 'kostritzer'
+
+def test_tiers_rank_exact_then_prefix_then_word_prefix_then_fuzzy():
+    index = NameSearchIndex(NAMES)
+
+    # Exact, then prefixes shortest first, then names with a word starting with the query
+    assert index.search('elder') == ['Elder', 'Elder Brother', 'Elderflower Saison', 'Hop Elder', 'Pliny the Elder']
+
+    # A typo only matches on shared trigrams
+    assert index.search('heddy toper') == ['Heady Topper']
+    assert index.search('zzz') == []
+
+def test_an_empty_query_pages_through_every_name_in_order():
+    index = NameSearchIndex(NAMES)
+    assert index.search('') == NAMES
+    assert index.search('', offset = 2, limit = 3) == NAMES[2:5]
+    assert index.search('elder', offset = 1, limit = 2) == ['Elder Brother', 'Elderflower Saison']
+
+def test_added_names_are_searchable_and_duplicates_ignored():
+    index = NameSearchIndex(NAMES)
+    index.add('Elder Ale')
+    index.add('Elder')
+
+    assert len(index) == len(NAMES) + 1
+    assert index.search('elder a')[0] == 'Elder Ale'
+    assert index.search('elder')[:2] == ['Elder', 'Elder Ale']
+
+def test_beer_search_is_per_brewery_and_kept_up_to_date():
+    user = User('Sam', {
+        'styles': ['IPA'],
+        'breweries': {
+            'Brewery 1': [{'name': 'Elder', 'brewery': 'Brewery 1', 'style': 'IPA', 'rating': 7.0}],
+            'Brewery 2': [{'name': 'Elder Brother', 'brewery': 'Brewery 2', 'style': 'IPA', 'rating': 6.0}]
+        }
+    })
+
+    assert user.getBeerSearchIndex('Brewery 1').search('elder') == ['Elder']
+
+    user._save_new_beer('Elderflower Saison', 'Brewery 1', 'IPA', 8.0)
+    assert user.getBeerSearchIndex('Brewery 1').search('elder') == ['Elder', 'Elderflower Saison']
+    assert user.getBeerSearchIndex('Brewery 2').search('elder') == ['Elder Brother']
@@ -0,0 +1,25 @@
+import json
+
+from bench.generate import generateDataset
+from src.user import User
+
+def users():
+    data = generateDataset(ratings = 1500, users = 3, breweries = 60, styles = 8, seed = 7)
+    return [User(user_name, json.loads(json.dumps(data[user_name]))) for user_name in data]
+
+def test_top_breweries_are_the_head_of_the_full_ranking():
+    for user in users():
+        rated, _ = user.rankBreweries()
+        expected = [(brewery.name, brewery.score) for brewery in rated]
+
+        for k in (0, 1, 3, 10, len(rated), len(rated) + 5):
+            top = user.topBreweries(k)
+            assert [(brewery.name, brewery.score) for brewery in top] == expected[:k]
+
+def test_top_styles_are_the_head_of_the_full_ranking():
+    for user in users():
+        ranked, low_cardinality = user.rankStyles(cardinality_threshold = 20)
+
+        for k in (1, 3, len(ranked) + 1):
+            assert user.topStyles(k, cardinality_threshold = 20) == ranked[:k]
+            assert user.topStyles(k, cardinality_threshold = 20, low_cardinality = True) == low_cardinality[:k]
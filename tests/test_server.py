@@ -0,0 +1,106 @@
+import asyncio
+import json
+import threading
+
+from src.server import RankingCache, RankingServer
+from src.storage import JsonStorage
+from src.utils import saveFile
+
+def beer(name, brewery, style, rating):
+    return {'name': name, 'brewery': brewery, 'style': style, 'rating': rating}
+
+DATA = {
+    'Sam': {
+        'styles': ['IPA', 'Stout'],
+        'breweries': {
+            'Brewery 1': [beer('A', 'Brewery 1', 'IPA', 7.0), beer('B', 'Brewery 1', 'Stout', 8.5)],
+            'Brewery 2': [beer('C', 'Brewery 2', 'IPA', 6.0), beer('D', 'Brewery 2', 'Stout', 5.5)]
+        }
+    }
+}
+
+async def request(port, path, headers = {}):
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    lines = [f'GET {path} HTTP/1.1', 'Host: localhost', 'Connection: close'] + [f'{name}: {value}' for name, value in headers.items()]
+    writer.write(('\r\n'.join(lines) + '\r\n\r\n').encode('latin-1'))
+    await writer.drain()
+
+    response = await reader.read()
+    writer.close()
+
+    head, body = response.split(b'\r\n\r\n', 1)
+    status_line, *header_lines = head.decode('latin-1').split('\r\n')
+    response_headers = dict(line.split(': ', 1) for line in header_lines)
+    return int(status_line.split(' ')[1]), response_headers, body
+
+def serve(storage, scenario):
+    async def run():
+        server = RankingServer(storage, port = 0)
+        await server.start()
+        try:
+            await scenario(server.port, server)
+        finally:
+            await server.close()
+
+    asyncio.run(run())
+
+def test_etags_answer_304_until_the_user_changes(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / 'data').mkdir()
+    saveFile(json.loads(json.dumps(DATA)))
+    storage = JsonStorage()
+
+    async def scenario(port, server):
+        status, headers, body = await request(port, '/users/Sam/breweries')
+        assert status == 200
+        assert [ranking['name'] for ranking in json.loads(body)['breweries']] == ['Brewery 1', 'Brewery 2']
+        etag = headers['ETag']
+
+        status, headers, body = await request(port, '/users/Sam/breweries', {'If-None-Match': etag})
+        assert (status, headers['ETag'], body) == (304, etag, b'')
+
+        # A rating saved through the storage invalidates the cached response
+        user = storage.openUser('Sam')
+        user._save_new_beer('E', 'Brewery 2', 'IPA', 10.0)
+        user._save_new_beer('F', 'Brewery 2', 'Stout', 10.0)
+        storage.saveUserChanges(user)
+
+        status, headers, body = await request(port, '/users/Sam/breweries', {'If-None-Match': etag})
+        assert status == 200
+        assert headers['ETag'] != etag
+        assert [ranking['name'] for ranking in json.loads(body)['breweries']] == ['Brewery 2', 'Brewery 1']
+
+    serve(storage, scenario)
+
+def test_unknown_users_and_resources_are_404(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / 'data').mkdir()
+    saveFile(json.loads(json.dumps(DATA)))
+
+    async def scenario(port, server):
+        assert (await request(port, '/users/Nobody/breweries'))[0] == 404
+        assert (await request(port, '/users/Sam/styles/Lager/beers'))[0] == 404
+        assert (await request(port, '/users/Sam/breweries?limit=x'))[0] == 400
+
+    serve(JsonStorage(), scenario)
+
+def test_storage_is_only_touched_from_the_worker_thread(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / 'data').mkdir()
+    saveFile(json.loads(json.dumps(DATA)))
+
+    threads = set()
+    storage = JsonStorage()
+    for method in ('getChangeToken', 'getUserNames', 'getUserVersions', 'openUser'):
+        def recorded(*args, method = getattr(storage, method)):
+            threads.add(threading.current_thread().name)
+            return method(*args)
+        setattr(storage, method, recorded)
+
+    cache = RankingCache(storage)
+    try:
+        asyncio.run(cache.get('Sam', ('breweries', 0, None)))
+    finally:
+        cache.close()
+
+    assert len(threads) == 1 and threads.pop().startswith('rankings')
@@ -0,0 +1,64 @@
+import random
+
+import numpy as np
+
+from src.ratings import BeerRater
+from src.stats import SMALL_STYLE_SIZE, StyleStats, pairwiseSum, sortedMad, sortedMedian
+
+def test_summary_matches_numpy_over_ratings():
+    rng = random.Random(0)
+    for trial in range(200):
+        stats = StyleStats('IPA')
+        count = rng.randint(1, 40)
+        stats.addRatings(range(count), [round(rng.uniform(1, 10), 1) for _ in range(count)])
+
+        # Re-ratings and new beers go through the incremental path
+        for _ in range(rng.randint(0, 10)):
+            stats.addRating(rng.randint(0, count + 5), round(rng.uniform(1, 10), 1))
+
+        ratings = stats.getRatings()
+        summary = stats.getSummary()
+        assert summary['mean'] == np.mean(ratings)
+        assert summary['variance'] == np.var(ratings)
+        assert summary['std'] == np.std(ratings)
+        assert summary['median'] == np.median(ratings)
+
+def test_small_styles_summarize_without_numpy_to_the_same_bits():
+    rng = random.Random(1)
+    for count in list(range(1, SMALL_STYLE_SIZE + 1)) + [SMALL_STYLE_SIZE + 1, 200, 1000]:
+        values = [rng.uniform(1, 10) / rng.choice([1, 3, 7]) for _ in range(count)]
+        assert pairwiseSum(values) == np.sum(values)
+
+        stats = StyleStats('Stout')
+        stats.addRatings(range(count), values)
+
+        summary = stats.getSummary()
+        assert summary['mean'] == np.mean(values)
+        assert summary['variance'] == np.var(values)
+        assert summary['std'] == np.std(values)
+
+def test_sorted_median_and_mad_match_numpy():
+    rng = random.Random(2)
+    for trial in range(500):
+        count = rng.randint(1, 60)
+        # Coarse ratings make ties and deviations of equal size common
+        values = sorted(rng.choice([round(rng.uniform(1, 10), 1), float(rng.randint(1, 10))]) for _ in range(count))
+
+        median = sortedMedian(values)
+        assert median == np.median(values)
+        assert sortedMad(values, median) == np.median(np.abs(np.array(values) - median))
+
+def test_percentiles_average_the_rank_of_ties():
+    rng = random.Random(3)
+    rater = BeerRater()
+    for trial in range(100):
+        count = rng.randint(1, 50)
+        stats = StyleStats('IPA')
+        stats.addRatings(range(count), [float(rng.randint(1, 20)) / 2 for _ in range(count)])
+        ratings = stats.getRatings()
+        queries = ratings[:5] + [0.5, 5.25, 10.5]
+
+        # The unsorted single-rating formula the sorted lookups replaced
+        expected = [rater._calculatePercentile(rating, ratings) for rating in queries]
+        assert [stats.getPercentile(rating) for rating in queries] == expected
+        assert np.round(rater._calculatePercentiles(np.array(queries), stats.getSortedArray()), 1).tolist() == expected
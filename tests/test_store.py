@@ -0,0 +1,60 @@
+from array import array
+
+from src.store import BeerStore
+
+RATINGS = [
+    ('A', 'Brewery 1', 'IPA', 7.0),
+    ('B', 'Brewery 1', 'Stout', 8.5),
+    ('A', 'Brewery 2', 'IPA', 5.0),
+    ('A', 'Brewery 1', 'IPA', 8.0),
+    ('B', 'Brewery 1', 'Porter', 6.0),
+    ('A', 'Brewery 1', 'IPA', 9.5)
+]
+
+def buildStore():
+    store = BeerStore()
+    for rating in RATINGS:
+        store.append(*rating)
+
+    return store
+
+def assertAggregates(store):
+    a = store.getBeerId('Brewery 1', 'A')
+    b = store.getBeerId('Brewery 1', 'B')
+    other_a = store.getBeerId('Brewery 2', 'A')
+
+    # Re-ratings share the beer id; the same name at another brewery is another beer
+    assert (a, b, other_a) == (0, 1, 2)
+    assert store.getBeerId('Brewery 2', 'B') is None
+    assert store.countBeers() == 3
+    assert store.getBeerIds().tolist() == [a, b, other_a, a, b, a]
+
+    assert [store.getRatingCount(beer_id) for beer_id in (a, b, other_a)] == [3, 2, 1]
+    assert store.getRatingCounts().tolist() == [3, 2, 1]
+    assert store.getRatingSums().tolist() == [24.5, 14.5, 5.0]
+    assert store.getAverageRating(a) == 24.5 / 3
+
+    assert store.getLatestRows().tolist() == [5, 4, 2]
+    assert store.getPreviousRows().tolist() == [-1, -1, -1, 0, 1, 3]
+    assert store.getBeerRows(a) == [0, 3, 5]
+    assert store.getBeerRows(b) == [1, 4]
+    assert store.getStyleName(store.getLatestRow(b)) == 'Porter'
+
+def test_re_ratings_update_the_beer_aggregates():
+    assertAggregates(buildStore())
+
+def test_a_store_over_columns_rebuilds_the_same_aggregates():
+    store = buildStore()
+    mapped = BeerStore.fromColumns(
+        store.brewery_names.names, store.style_names.names, store.beer_names.names,
+        array('i', store.getBreweryIds().tolist()), array('i', store.getStyleIds().tolist()),
+        array('i', store.getNameIds().tolist()), array('d', store.getRatings().tolist()),
+        array('d', store.getRatedAts().tolist())
+    )
+    assertAggregates(mapped)
+
+    # Appending copies the borrowed columns and keeps aggregating
+    mapped.append('B', 'Brewery 1', 'Stout', 10.0)
+    assert mapped.getRatingCount(1) == 3
+    assert mapped.getBeerRows(1) == [1, 4, 6]
+    assert mapped.getRatingSums().tolist() == [24.5, 24.5, 5.0]
@@ -0,0 +1,62 @@
+import io
+import json
+
+import pytest
+
+from src.stream import JsonStreamReader, iterSnapshotEntries, iterSnapshotUsers, BREWERY, BEER, STYLE, FIELD
+
+SNAPSHOT = {
+    'Sam': {
+        'styles': ['IPA', 'Saison'],
+        'breweries': {
+            'Worthy Brewing': [
+                {'name': 'Strata', 'brewery': 'Worthy Brewing', 'style': 'IPA', 'rating': 9.5, 'rated_at': 1700000000.25},
+                {'name': 'Strata', 'brewery': 'Worthy Brewing', 'style': 'IPA', 'rating': 8, 'rated_at': 1.7e9}
+            ],
+            'Crux': [{'name': 'Saison', 'brewery': 'Crux', 'style': 'Saison', 'rating': -0.5e-1}]
+        },
+        'journal_seq': 12
+    },
+    'Alex': {}
+}
+
+def _readArray(reader):
+    reader.expect('[')
+    values = []
+    while True:
+        values.append(reader.readValue())
+        if not reader.nextItem(']'):
+            break
+
+    reader.expect(']')
+    reader.expectEnd()
+    return values
+
+@pytest.mark.parametrize('chunk_size', range(1, 17))
+def test_numbers_split_across_chunks(chunk_size):
+    text = '[9.5, 1e3, 2, -0.25E-2, 10, true, null, "a"]'
+    reader = JsonStreamReader(io.StringIO(text), chunk_size = chunk_size)
+
+    assert _readArray(reader) == json.loads(text)
+
+@pytest.mark.parametrize('chunk_size', range(1, 17))
+def test_snapshot_entries_at_every_chunk_size(tmp_path, chunk_size):
+    path = tmp_path / 'beer_data.json'
+    path.write_text(json.dumps(SNAPSHOT))
+
+    assert dict(iterSnapshotEntries(str(path), chunk_size = chunk_size)) == SNAPSHOT
+
+@pytest.mark.parametrize('chunk_size', range(1, 17))
+def test_snapshot_records_at_every_chunk_size(tmp_path, chunk_size):
+    path = tmp_path / 'beer_data.json'
+    path.write_text(json.dumps(SNAPSHOT))
+
+    users = {user_name: list(records) for user_name, records in iterSnapshotUsers(str(path), chunk_size = chunk_size)}
+
+    sam = SNAPSHOT['Sam']
+    assert users['Sam'] == (
+        [(STYLE, style_name) for style_name in sam['styles']]
+        + [record for brewery_name in sam['breweries'] for record in [(BREWERY, brewery_name)] + [(BEER, beer) for beer in sam['breweries'][brewery_name]]]
+        + [(FIELD, 'journal_seq', 12)]
+    )
+    assert users['Alex'] == []